@@ -0,0 +1,2 @@
+# The Celery app (config.celery) is imported by hymns.tasks and found by "celery -A config",
+# not loaded here, so web workers don't import Celery on boot.
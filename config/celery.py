@@ -0,0 +1,49 @@
+"""
+Celery application for background work (admin import jobs).
+
+Start a worker with: celery -A config worker -l info --pool=threads
+With CELERY_TASK_ALWAYS_EAGER (local development, tests), tasks run in the
+calling process instead. Code that queues tasks calls ``check_task_queue``
+first, so a deployment with neither fails there rather than at startup.
+"""
+import os
+
+from celery import Celery
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+def check_task_queue():
+    """Raise ImproperlyConfigured unless queued tasks will run: on a broker's workers, or eagerly"""
+    if not settings.CELERY_BROKER_URL and not settings.CELERY_TASK_ALWAYS_EAGER:
+        raise ImproperlyConfigured(
+            'Set CELERY_BROKER_URL and run a Celery worker, or CELERY_TASK_ALWAYS_EAGER=True for local development'
+        )
+
+
+# Replica pinning scopes of the running tasks (hymns.routers), by task id
+_pinning_scopes = {}
+
+
+@task_prerun.connect
+def _begin_pinning_scope(task_id=None, **kwargs):
+    """Each task reads from replicas until it writes itself, whatever earlier tasks in this worker wrote"""
+    from hymns import routers
+
+    _pinning_scopes[task_id] = routers.begin_scope()
+
+
+@task_postrun.connect
+def _end_pinning_scope(task_id=None, **kwargs):
+    from hymns import routers
+
+    token = _pinning_scopes.pop(task_id, None)
+    if token is not None:
+        routers.end_scope(token)
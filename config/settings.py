@@ -3,7 +3,9 @@ Django settings for Nova Hymnal Backend project.
 """
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -16,6 +18,8 @@ DEBUG = config('DEBUG', default=True, cast=bool)
 
 # Environment
 ENV = config('ENV', default='development')
+# Running "manage.py test"
+TESTING = sys.argv[1:2] == ['test']
 
 # Allowed hosts - supports comma-separated list
 ALLOWED_HOSTS_STR = config('ALLOWED_HOSTS', default='localhost,127.0.0.1,192.168.8.186')
@@ -34,13 +38,22 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'django_filters',
-    'drf_yasg',
     
     # Local apps
     'hymns',
 ]
 
+# Swagger/ReDoc at /swagger/, /redoc/ and /docs/. Off by default in production so API
+# workers don't import drf_yasg on boot.
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=DEBUG, cast=bool)
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+# Startup budget checked by "python manage.py importtime" (config.wsgi plus the URLconf)
+IMPORT_TIME_BUDGET_MS = config('IMPORT_TIME_BUDGET_MS', default=1500, cast=int)
+
 MIDDLEWARE = [
+    'hymns.middleware.PerformanceMiddleware',  # First, so its timings cover the other middleware
+    'hymns.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -48,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',  # Must come before CsrfViewMiddleware
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hymns.middleware.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +111,31 @@ if ENV == 'development' and not config('DB_HOST', default=None):
         }
     }
 
+# Read replicas (optional) - comma-separated hosts that share the primary's credentials.
+# Catalogue reads are routed to them by hymns.routers.CatalogueReplicaRouter;
+# tests mirror them onto the default database.
+DB_REPLICA_HOSTS = config(
+    'DB_REPLICA_HOSTS',
+    default='',
+    cast=lambda v: [host.strip() for host in v.split(',') if host.strip()]
+)
+for index, replica_host in enumerate(DB_REPLICA_HOSTS, 1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['hymns.routers.CatalogueReplicaRouter']
+if TESTING:
+    # A second local alias mirroring the test database; the router's own tests
+    # (hymns.tests.test_routers) switch it on, other tests read from default.
+    DATABASES.setdefault('replica_1', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+    DATABASE_ROUTERS = []
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=5, cast=int)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5, cast=int)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'hymns.User'
 
@@ -130,9 +169,110 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Media on S3 (django-storages) when a bucket is set. Import jobs need this when the Celery
+# worker runs on another host than the web service (as on Render), since they read the uploads
+# the web service saved. Credentials come from AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.
+AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME', default='')
+if AWS_STORAGE_BUCKET_NAME:
+    STORAGES = {
+        'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+    AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME', default=None)
+    AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default=None)
+    AWS_DEFAULT_ACL = None
+    AWS_QUERYSTRING_AUTH = True
+
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Premium media is linked through expiring signed URLs (hymns.signed_media). Links are valid
+# for MEDIA_URL_TTL seconds plus up to one MEDIA_URL_WINDOW, and identical within a window so a
+# CDN can cache them. MEDIA_SIGNING_KEY defaults to SECRET_KEY; set it to share with a CDN.
+MEDIA_SIGNING_KEY = config('MEDIA_SIGNING_KEY', default='')
+MEDIA_URL_TTL = config('MEDIA_URL_TTL', default=3600, cast=int)
+MEDIA_URL_WINDOW = config('MEDIA_URL_WINDOW', default=900, cast=int)
+# Base URL of a CDN in front of /signed-media/ and /api/v1/media/ (e.g. https://media.example.com); empty links to this app
+MEDIA_CDN_URL = config('MEDIA_CDN_URL', default='')
+# Media served by the app (hymns.media_serving) may be cached this long; files are never rewritten in place
+MEDIA_MAX_AGE = config('MEDIA_MAX_AGE', default=86400, cast=int)
+# Let the front proxy send local media files: "X-Accel-Redirect" (nginx) or "X-Sendfile" (Apache, lighttpd).
+# For nginx, MEDIA_ACCEL_REDIRECT_PREFIX must be an internal location aliased to MEDIA_ROOT.
+MEDIA_SENDFILE_HEADER = config('MEDIA_SENDFILE_HEADER', default='')
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+# How long a user's premium status is cached for media requests (hymns.entitlements)
+ENTITLEMENT_CACHE_SECONDS = config('ENTITLEMENT_CACHE_SECONDS', default=300, cast=int)
+
+# Celery (background import jobs), run by a worker: celery -A config worker -l info --pool=threads
+# CELERY_TASK_ALWAYS_EAGER runs tasks inside the web request instead (default: on with DEBUG and in
+# tests). Without either, queueing a task raises ImproperlyConfigured (config.celery.check_task_queue).
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='')
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=DEBUG or TESTING, cast=bool)
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Admin uploads are saved under this storage prefix until their import job finishes
+IMPORT_UPLOAD_PREFIX = 'imports'
+# Hymns (or media files) written per transaction by import jobs
+IMPORT_CHUNK_SIZE = config('IMPORT_CHUNK_SIZE', default=100, cast=int)
+# Processes used to parse uploaded Word/text files; 1 parses them in the worker itself.
+# Celery prefork workers can't start processes (they log a warning and parse in-process), so run
+# them with --pool=threads or solo, as render.yaml does.
+IMPORT_PARSE_WORKERS = config('IMPORT_PARSE_WORKERS', default=os.cpu_count() or 1, cast=int)
+# Threads copying bulk-uploaded media files to storage at once (hymns.media_ingest)
+MEDIA_UPLOAD_WORKERS = config('MEDIA_UPLOAD_WORKERS', default=8, cast=int)
+# Points in an AudioFile's waveform summary (hymns.audio_metadata)
+AUDIO_WAVEFORM_POINTS = config('AUDIO_WAVEFORM_POINTS', default=100, cast=int)
+# Seconds an external media tool (ffmpeg, pdftoppm) may run on one file
+MEDIA_TOOL_TIMEOUT = config('MEDIA_TOOL_TIMEOUT', default=300, cast=int)
+# Lower-bitrate renditions encoded with ffmpeg for each audio upload, as "quality:kbps" pairs
+# (names of up to 10 characters; "high" and "original" mean the original file). Clients pick one
+# with ?quality= or Save-Data (see hymns.renditions). They are AudioRendition.quality's choices.
+AUDIO_RENDITIONS = config(
+    'AUDIO_RENDITIONS',
+    default='low:48,medium:96',
+    cast=lambda v: {quality.strip(): int(kbps) for quality, kbps in (pair.split(':') for pair in v.split(',') if pair.strip())}
+)
+for quality in AUDIO_RENDITIONS:
+    if not 0 < len(quality) <= 10 or quality.lower() != quality or quality in ('high', 'original'):
+        raise ImproperlyConfigured(f'AUDIO_RENDITIONS: invalid quality name {quality!r}')
+# Sheet music page images (hymns.sheet_music_pages): "name:width" pairs, rendered for every page
+# ("all") or only the first ("first"). PDFs need pdftoppm from poppler-utils.
+SHEET_MUSIC_IMAGE_WIDTHS = config(
+    'SHEET_MUSIC_IMAGE_WIDTHS',
+    default='thumbnail:240,medium:800,large:1600',
+    cast=lambda v: {name.strip(): int(width) for name, width in (pair.split(':') for pair in v.split(',') if pair.strip())}
+)
+SHEET_MUSIC_IMAGE_QUALITY = config('SHEET_MUSIC_IMAGE_QUALITY', default=80, cast=int)
+SHEET_MUSIC_RENDER_PAGES = config('SHEET_MUSIC_RENDER_PAGES', default='all')
+
+# Per-request performance instrumentation (hymns.middleware.PerformanceMiddleware).
+# Requests at or above PERFORMANCE_SLOW_REQUEST_MS are logged at INFO on hymns.performance, others at DEBUG.
+PERFORMANCE_INSTRUMENTATION = config('PERFORMANCE_INSTRUMENTATION', default=True, cast=bool)
+PERFORMANCE_SLOW_REQUEST_MS = config('PERFORMANCE_SLOW_REQUEST_MS', default=500, cast=int)
+# Server-Timing response headers (browser dev tools show them); they reveal internal timings
+PERFORMANCE_SERVER_TIMING = config('PERFORMANCE_SERVER_TIMING', default=DEBUG, cast=bool)
+# Aggregate histograms per process and serve them at /metrics in the Prometheus text format.
+# With METRICS_TOKEN set, scrapers must send "Authorization: Bearer <token>".
+PERFORMANCE_METRICS = config('PERFORMANCE_METRICS', default=False, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# N+1 and slow query detector (hymns.query_detector), run on this share of requests (0 to 1).
+# It walks the stack for every query, so keep the rate low in production.
+QUERY_DETECTOR_SAMPLE_RATE = config('QUERY_DETECTOR_SAMPLE_RATE', default=1.0 if DEBUG else 0.0, cast=float)
+# A query shape repeated this many times in one request is reported as N+1
+QUERY_DETECTOR_THRESHOLD = config('QUERY_DETECTOR_THRESHOLD', default=5, cast=int)
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=100, cast=int)
+# Raise NPlusOneError instead of only logging (for test and CI settings)
+QUERY_DETECTOR_RAISE = config('QUERY_DETECTOR_RAISE', default=False, cast=bool)
+
+# Request profiling (hymns.profiling): a share of requests (0 to 1) and/or requests whose
+# X-Profile-Signature header is signed with PROFILING_SECRET. Off unless one of them is set.
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_SECRET = config('PROFILING_SECRET', default='')
+# "collapsed" (low-overhead stack sampling, for flame graphs) or "pstats" (cProfile)
+PROFILING_FORMAT = config('PROFILING_FORMAT', default='collapsed')
+PROFILING_INTERVAL_MS = config('PROFILING_INTERVAL_MS', default=5, cast=int)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -217,12 +357,19 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,
+    # The UI loads the prebuilt schema instead of generating it (see hymns.api_docs)
+    'SPEC_URL': '/swagger.json',
 }
 
 REDOC_SETTINGS = {
     'SPEC_URL': '/swagger.json',
 }
 
+# Written by "python manage.py build_api_schema" at deploy and served at /swagger.json
+API_SCHEMA_DIR = config('API_SCHEMA_DIR', default=str(BASE_DIR / 'api_schema'))
+# Browsers and proxies revalidate the schema with its ETag after this many seconds
+API_SCHEMA_MAX_AGE = config('API_SCHEMA_MAX_AGE', default=300, cast=int)
+
 # Security Settings for Production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -1,13 +1,14 @@
 from django.contrib import admin
-from django.urls import path
-from django.shortcuts import render, redirect
+from django.urls import path, reverse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from .models import (
-    Category, Author, Denomination, DenominationHymn, Hymn, Verse, SheetMusic, AudioFile,
-    User, Subscription, Favorite, Playlist, PlaylistHymn, HymnNote
+    Category, Author, Denomination, DenominationHymn, Hymn, Verse, SheetMusic, SheetMusicPage, AudioFile, AudioRendition,
+    User, Subscription, Favorite, Playlist, PlaylistHymn, HymnNote, ImportJob
 )
-from .admin_actions import bulk_upload_hymns, parse_word_document, parse_text_file
+from .admin_actions import bulk_upload_hymns
+from .import_jobs import apply_preview, create_import_job, discard_preview
 
 
 @admin.register(Category)
@@ -97,6 +98,18 @@ class DenominationHymnAdmin(admin.ModelAdmin):
         ]
         return custom_urls + urls
     
+    def _import_options(self, denomination, hymn_period, category, author, is_premium, start_number, dry_run=False):
+        """Form options stored on the import job"""
+        return {
+            'denomination': denomination.id,
+            'hymn_period': hymn_period,
+            'category': category.id if category else None,
+            'author': author.id if author else None,
+            'is_premium': is_premium,
+            'start_number': start_number or None,
+            'dry_run': dry_run,
+        }
+    
     def bulk_upload_view(self, request):
         """Bulk upload denomination hymns with verses"""
         if request.method == 'POST':
@@ -107,6 +120,8 @@ class DenominationHymnAdmin(admin.ModelAdmin):
             author_id = request.POST.get('author')
             is_premium = request.POST.get('is_premium') == 'on'
             start_number = request.POST.get('start_number', '').strip()
+            # "Preview Changes" submits the form as a dry run
+            dry_run = 'dry_run' in request.POST
             
             if not files:
                 messages.error(request, 'Please select at least one file')
@@ -133,147 +148,21 @@ class DenominationHymnAdmin(admin.ModelAdmin):
             category = Category.objects.get(id=category_id) if category_id else None
             author = Author.objects.get(id=author_id) if author_id else None
             
-            # Determine starting number
+            # Determine starting number (defaults to after the last number in this denomination/period)
             if start_number:
                 try:
-                    current_number = int(start_number)
+                    start_number = int(start_number)
                 except ValueError:
                     messages.error(request, 'Invalid starting number')
                     return redirect('admin:hymns_denominationhymn_bulk_upload')
-            else:
-                # Get the last number for this denomination/period
-                last_dh = DenominationHymn.objects.filter(
-                    denomination=denomination,
-                    hymn_period=hymn_period
-                ).order_by('-number').first()
-                current_number = (last_dh.number + 1) if last_dh else 1
-            
-            created_count = 0
-            error_count = 0
-            
-            from django.db import transaction
-            with transaction.atomic():
-                for file in files:
-                    try:
-                        file_extension = file.name.split('.')[-1].lower()
-                        
-                        if file_extension in ['docx', 'doc']:
-                            parsed_data = parse_word_document(file)
-                        elif file_extension in ['txt', 'text']:
-                            parsed_data = parse_text_file(file)
-                        else:
-                            messages.error(request, f'Unsupported file format: {file_extension}')
-                            error_count += 1
-                            continue
-                        
-                        # Handle both single hymn and list of hymns
-                        hymns_list = parsed_data if isinstance(parsed_data, list) else [parsed_data]
-                        
-                        for hymn_data in hymns_list:
-                            # Skip empty hymns
-                            if not hymn_data or (not hymn_data.get('number') and not hymn_data.get('verses')):
-                                continue
-                            
-                            # Get or create the Hymn (shared across denominations)
-                            hymn, hymn_created = Hymn.objects.get_or_create(
-                                title=hymn_data.get('title', 'Untitled Hymn'),
-                                defaults={
-                                    'category': category,
-                                    'author': author,
-                                    'language': hymn_data.get('language', 'English'),
-                                    'is_premium': is_premium,
-                                }
-                            )
-                            
-                            # Use hymn number from data if available, otherwise use current_number
-                            hymn_number = hymn_data.get('number') or current_number
-                            
-                            # Check if this number already exists for this denomination/period
-                            existing_dh = DenominationHymn.objects.filter(
-                                denomination=denomination,
-                                hymn_period=hymn_period,
-                                number=hymn_number
-                            ).exclude(hymn=hymn).first()
-                            
-                            if existing_dh:
-                                # Number conflict - use auto-increment instead
-                                messages.warning(
-                                    request, 
-                                    f'Hymn number {hymn_number} already exists for {denomination.name}. '
-                                    f'Using auto-incremented number {current_number} for "{hymn_data.get("title", "Untitled")}"'
-                                )
-                                hymn_number = current_number
-                            
-                            # Create or get DenominationHymn (match on hymn+denomination+period, not number)
-                            denomination_hymn, dh_created = DenominationHymn.objects.get_or_create(
-                                hymn=hymn,
-                                denomination=denomination,
-                                hymn_period=hymn_period,
-                                defaults={'number': hymn_number}
-                            )
-                            
-                            # Update number if it changed and doesn't conflict
-                            if not dh_created and denomination_hymn.number != hymn_number:
-                                # Check if the new number conflicts
-                                conflict = DenominationHymn.objects.filter(
-                                    denomination=denomination,
-                                    hymn_period=hymn_period,
-                                    number=hymn_number
-                                ).exclude(id=denomination_hymn.id).exists()
-                                
-                                if not conflict:
-                                    denomination_hymn.number = hymn_number
-                                    denomination_hymn.save()
-                                else:
-                                    messages.warning(
-                                        request,
-                                        f'Cannot update number for "{hymn.title}" to {hymn_number} - already exists. Keeping number {denomination_hymn.number}'
-                                    )
-                            
-                            # Add or update verses (use get_or_create to avoid duplicates)
-                            verses_added = 0
-                            verses_updated = 0
-                            for verse_data in hymn_data.get('verses', []):
-                                verse, verse_created = Verse.objects.get_or_create(
-                                    denomination_hymn=denomination_hymn,
-                                    verse_number=verse_data['verse_number'],
-                                    is_chorus=verse_data.get('is_chorus', False),
-                                    defaults={
-                                        'text': verse_data['text'],
-                                        'order': verse_data.get('order', verse_data['verse_number'])
-                                    }
-                                )
-                                # Update text if verse already exists (in case lyrics changed)
-                                if not verse_created:
-                                    if verse.text != verse_data['text']:
-                                        verse.text = verse_data['text']
-                                        verse.order = verse_data.get('order', verse_data['verse_number'])
-                                        verse.save()
-                                        verses_updated += 1
-                                else:
-                                    verses_added += 1
-                            
-                            if dh_created:
-                                created_count += 1
-                                if verses_added > 0:
-                                    messages.success(request, f'Created "{hymn.title}" #{hymn_number} with {verses_added} verses')
-                                current_number = hymn_number + 1
-                            else:
-                                if verses_added > 0:
-                                    messages.info(request, f'Denomination Hymn "{hymn.title}" #{hymn_number} already exists, but added {verses_added} new verses')
-                                elif verses_updated > 0:
-                                    messages.info(request, f'Denomination Hymn "{hymn.title}" #{hymn_number} already exists, updated {verses_updated} verses')
-                                else:
-                                    messages.warning(request, f'Denomination Hymn "{hymn.title}" #{hymn_number} already exists with all verses, skipped')
-                                # Update current_number to be after this hymn's number
-                                current_number = max(current_number, hymn_number + 1)
-                    
-                    except Exception as e:
-                        messages.error(request, f'Error processing {file.name}: {str(e)}')
-                        error_count += 1
             
-            messages.success(request, f'Successfully created {created_count} denomination hymns with verses. {error_count} errors.')
-            return redirect('admin:hymns_denominationhymn_changelist')
+            # Parsing and writing happen in a background import job
+            job = create_import_job(
+                ImportJob.KIND_DENOMINATION_HYMN_FILES, request.user, files=files,
+                options=self._import_options(denomination, hymn_period, category, author, is_premium, start_number, dry_run),
+            )
+            messages.info(request, f'Queued {len(files)} files for {"preview" if dry_run else "import"}')
+            return redirect('admin:hymns_importjob_status', job.pk)
         
         # GET request - show form
         denominations = Denomination.objects.filter(is_active=True)
@@ -298,6 +187,8 @@ class DenominationHymnAdmin(admin.ModelAdmin):
             author_id = request.POST.get('author')
             is_premium = request.POST.get('is_premium') == 'on'
             start_number = request.POST.get('start_number', '').strip()
+            # "Preview Changes" submits the form as a dry run
+            dry_run = 'dry_run' in request.POST
             
             if not json_data:
                 messages.error(request, 'Please paste JSON data')
@@ -324,23 +215,13 @@ class DenominationHymnAdmin(admin.ModelAdmin):
             category = Category.objects.get(id=category_id) if category_id else None
             author = Author.objects.get(id=author_id) if author_id else None
             
-            # Determine starting number
+            # Determine starting number (defaults to after the last number in this denomination/period)
             if start_number:
                 try:
-                    current_number = int(start_number)
+                    start_number = int(start_number)
                 except ValueError:
                     messages.error(request, 'Invalid starting number')
                     return redirect('admin:hymns_denominationhymn_json_upload')
-            else:
-                # Get the last number for this denomination/period
-                last_dh = DenominationHymn.objects.filter(
-                    denomination=denomination,
-                    hymn_period=hymn_period
-                ).order_by('-number').first()
-                current_number = (last_dh.number + 1) if last_dh else 1
-            
-            created_count = 0
-            error_count = 0
             
             try:
                 # Parse JSON - support both single object and array
@@ -354,125 +235,13 @@ class DenominationHymnAdmin(admin.ModelAdmin):
                 if not isinstance(hymns_data, list):
                     hymns_data = [hymns_data]
                 
-                from django.db import transaction
-                with transaction.atomic():
-                    for hymn_data in hymns_data:
-                        try:
-                            # Extract hymn information
-                            hymn_number = hymn_data.get('number') or current_number
-                            title = hymn_data.get('title', 'Untitled Hymn')
-                            verses_data = hymn_data.get('verses', [])
-                            
-                            # Check for number conflict
-                            existing_dh = DenominationHymn.objects.filter(
-                                denomination=denomination,
-                                hymn_period=hymn_period,
-                                number=hymn_number
-                            ).first()
-                            
-                            if existing_dh and existing_dh.hymn.title != title:
-                                # Number conflict - use auto-increment instead
-                                messages.warning(
-                                    request, 
-                                    f'Hymn number {hymn_number} already exists. Using auto-incremented number {current_number} for "{title}"'
-                                )
-                                hymn_number = current_number
-                            
-                            # Get or create the Hymn (shared across denominations)
-                            hymn, hymn_created = Hymn.objects.get_or_create(
-                                title=title,
-                                defaults={
-                                    'category': category,
-                                    'author': author,
-                                    'language': hymn_data.get('language', 'English'),
-                                    'is_premium': is_premium,
-                                }
-                            )
-                            
-                            # Create or get DenominationHymn
-                            denomination_hymn, dh_created = DenominationHymn.objects.get_or_create(
-                                hymn=hymn,
-                                denomination=denomination,
-                                hymn_period=hymn_period,
-                                defaults={'number': hymn_number}
-                            )
-                            
-                            # Update number if needed
-                            if not dh_created and denomination_hymn.number != hymn_number:
-                                conflict = DenominationHymn.objects.filter(
-                                    denomination=denomination,
-                                    hymn_period=hymn_period,
-                                    number=hymn_number
-                                ).exclude(id=denomination_hymn.id).exists()
-                                
-                                if not conflict:
-                                    denomination_hymn.number = hymn_number
-                                    denomination_hymn.save()
-                            
-                            # Process verses
-                            verses_added = 0
-                            verses_updated = 0
-                            
-                            for idx, verse_item in enumerate(verses_data, 1):
-                                # Support two formats:
-                                # 1. Simple string: "verse text"
-                                # 2. Object: {"verse_number": 1, "text": "...", "is_chorus": false}
-                                
-                                if isinstance(verse_item, str):
-                                    # Simple format - auto-number
-                                    verse_number = idx
-                                    verse_text = verse_item
-                                    is_chorus = False
-                                else:
-                                    # Object format
-                                    verse_number = verse_item.get('verse_number', idx)
-                                    verse_text = verse_item.get('text', '')
-                                    is_chorus = verse_item.get('is_chorus', False)
-                                
-                                if not verse_text:
-                                    continue
-                                
-                                verse, verse_created = Verse.objects.get_or_create(
-                                    denomination_hymn=denomination_hymn,
-                                    verse_number=verse_number,
-                                    is_chorus=is_chorus,
-                                    defaults={
-                                        'text': verse_text,
-                                        'order': verse_number
-                                    }
-                                )
-                                
-                                if not verse_created:
-                                    if verse.text != verse_text:
-                                        verse.text = verse_text
-                                        verse.order = verse_number
-                                        verse.save()
-                                        verses_updated += 1
-                                else:
-                                    verses_added += 1
-                            
-                            if dh_created:
-                                created_count += 1
-                                if verses_added > 0:
-                                    messages.success(request, f'Created "{title}" #{hymn_number} with {verses_added} verses')
-                                current_number = hymn_number + 1
-                            else:
-                                if verses_added > 0:
-                                    messages.info(request, f'Denomination Hymn "{title}" #{hymn_number} already exists, but added {verses_added} new verses')
-                                elif verses_updated > 0:
-                                    messages.info(request, f'Denomination Hymn "{title}" #{hymn_number} already exists, updated {verses_updated} verses')
-                                else:
-                                    messages.warning(request, f'Denomination Hymn "{title}" #{hymn_number} already exists with all verses, skipped')
-                                current_number = max(current_number, hymn_number + 1)
-                        
-                        except Exception as e:
-                            messages.error(request, f'Error processing hymn: {str(e)}')
-                            error_count += 1
-                            import traceback
-                            traceback.print_exc()
-                
-                messages.success(request, f'Successfully created {created_count} denomination hymns with verses. {error_count} errors.')
-                return redirect('admin:hymns_denominationhymn_changelist')
+                # Parsing and writing happen in a background import job
+                job = create_import_job(
+                    ImportJob.KIND_DENOMINATION_HYMN_JSON, request.user, text=json_data,
+                    options=self._import_options(denomination, hymn_period, category, author, is_premium, start_number, dry_run),
+                )
+                messages.info(request, f'Queued {len(hymns_data)} hymns for {"preview" if dry_run else "import"}')
+                return redirect('admin:hymns_importjob_status', job.pk)
             
             except Exception as e:
                 messages.error(request, f'Error processing JSON: {str(e)}')
@@ -505,12 +274,24 @@ class DenominationHymnInline(admin.TabularInline):
         return formset
 
 
+class SheetMusicPageInline(admin.TabularInline):
+    """Page images are rendered in the background after upload (see hymns.sheet_music_pages)"""
+    model = SheetMusicPage
+    extra = 0
+    fields = ['page_number', 'size', 'format', 'width', 'height', 'image']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(SheetMusic)
 class SheetMusicAdmin(admin.ModelAdmin):
     list_display = ['hymn', 'has_file', 'has_url', 'page_count', 'is_premium', 'created_at']
     list_filter = ['is_premium', 'created_at']
     search_fields = ['hymn__title']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [SheetMusicPageInline]
     fieldsets = (
         ('Hymn', {
             'fields': ('hymn',)
@@ -556,115 +337,17 @@ class SheetMusicAdmin(admin.ModelAdmin):
             hymns_data = request.POST.get('hymns_data', '').strip()
             is_premium = request.POST.get('is_premium') == 'on'
             
-            created_count = 0
-            error_count = 0
+            if not files and not hymns_data:
+                messages.error(request, 'Please select files or enter sheet music URLs')
+                return redirect('admin:hymns_sheetmusic_bulk_upload')
             
-            from django.db import transaction
-            with transaction.atomic():
-                # Handle file uploads
-                if files:
-                    for file in files:
-                        try:
-                            # Extract hymn number from filename
-                            import re
-                            filename = file.name
-                            numbers = re.findall(r'\d+', filename)
-                            
-                            if not numbers:
-                                messages.error(request, f'Could not extract hymn ID from filename: {filename}. Please use format: hymn-{id}.pdf')
-                                error_count += 1
-                                continue
-                            
-                            hymn_id = int(numbers[0])
-                            
-                            try:
-                                hymn = Hymn.objects.get(id=hymn_id)
-                            except Hymn.DoesNotExist:
-                                messages.error(request, f'Hymn ID {hymn_id} not found')
-                                error_count += 1
-                                continue
-                            
-                            sheet_music, created = SheetMusic.objects.get_or_create(
-                                hymn=hymn,
-                                defaults={
-                                    'file': file,
-                                    'page_count': 1,
-                                    'is_premium': is_premium,
-                                }
-                            )
-                            
-                            if created:
-                                created_count += 1
-                            else:
-                                # Update existing
-                                if not sheet_music.file:
-                                    sheet_music.file = file
-                                    sheet_music.save()
-                                    created_count += 1
-                                else:
-                                    messages.warning(request, f'Sheet music for hymn "{hymn.title}" already has a file')
-                        
-                        except Exception as e:
-                            messages.error(request, f'Error processing {file.name}: {str(e)}')
-                            error_count += 1
-                
-                # Handle URL-based entries
-                if hymns_data:
-                    for line in hymns_data.split('\n'):
-                        line = line.strip()
-                        if not line or line.startswith('#'):
-                            continue
-                        
-                        try:
-                            # Parse format: hymn_id|url|thumbnail_url|page_count
-                            parts = line.split('|')
-                            if len(parts) < 2:
-                                continue
-                            
-                            hymn_id = parts[0].strip()
-                            file_url = parts[1].strip()
-                            thumbnail_url = parts[2].strip() if len(parts) > 2 else ''
-                            page_count = int(parts[3].strip()) if len(parts) > 3 and parts[3].strip() else 1
-                            
-                            if not file_url.startswith('http'):
-                                continue  # Skip non-URL entries (handled by file upload)
-                            
-                            try:
-                                hymn = Hymn.objects.get(id=hymn_id)
-                            except Hymn.DoesNotExist:
-                                messages.error(request, f'Hymn ID {hymn_id} not found')
-                                error_count += 1
-                                continue
-                            
-                            sheet_music, created = SheetMusic.objects.get_or_create(
-                                hymn=hymn,
-                                defaults={
-                                    'url': file_url,
-                                    'thumbnail_url': thumbnail_url if thumbnail_url.startswith('http') else None,
-                                    'page_count': page_count,
-                                    'is_premium': is_premium,
-                                }
-                            )
-                            
-                            if created:
-                                created_count += 1
-                            else:
-                                # Update existing if no URL
-                                if not sheet_music.url:
-                                    sheet_music.url = file_url
-                                    if thumbnail_url.startswith('http'):
-                                        sheet_music.thumbnail_url = thumbnail_url
-                                    sheet_music.save()
-                                    created_count += 1
-                                else:
-                                    messages.warning(request, f'Sheet music for hymn "{hymn.title}" already has a URL')
-                        
-                        except Exception as e:
-                            messages.error(request, f'Error processing line: {str(e)}')
-                            error_count += 1
-            
-            messages.success(request, f'Successfully created/updated {created_count} sheet music entries. {error_count} errors.')
-            return redirect('admin:hymns_sheetmusic_changelist')
+            # Files and URL lines are stored and processed in a background import job
+            job = create_import_job(
+                ImportJob.KIND_SHEET_MUSIC, request.user, files=files, text=hymns_data, text_name='urls.txt',
+                options={'is_premium': is_premium},
+            )
+            messages.info(request, 'Queued sheet music for import')
+            return redirect('admin:hymns_importjob_status', job.pk)
         
         hymns = Hymn.objects.all().order_by('title')[:100]  # Limit for display
         return render(request, 'admin/bulk_upload_sheetmusic.html', {
@@ -673,12 +356,24 @@ class SheetMusicAdmin(admin.ModelAdmin):
         })
 
 
+class AudioRenditionInline(admin.TabularInline):
+    """Renditions are encoded in the background after upload (see hymns.renditions)"""
+    model = AudioRendition
+    extra = 0
+    fields = ['quality', 'codec', 'bitrate', 'size', 'file', 'created_at']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(AudioFile)
 class AudioFileAdmin(admin.ModelAdmin):
     list_display = ['hymn', 'audio_type', 'duration', 'bitrate', 'is_premium', 'created_at']
     list_filter = ['audio_type', 'is_premium', 'created_at']
     search_fields = ['hymn__title']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [AudioRenditionInline]
     fieldsets = (
         ('Hymn', {
             'fields': ('hymn', 'audio_type')
@@ -713,52 +408,13 @@ class AudioFileAdmin(admin.ModelAdmin):
                 messages.error(request, 'Please select files and audio type')
                 return redirect('admin:hymns_audiofile_bulk_upload')
             
-            created_count = 0
-            error_count = 0
-            
-            from django.db import transaction
-            with transaction.atomic():
-                for file in files:
-                    try:
-                        # Extract hymn number from filename (e.g., "101-piano.mp3" or "hymn_101_piano.mp3")
-                        import re
-                        filename = file.name
-                        numbers = re.findall(r'\d+', filename)
-                        
-                        if not numbers:
-                            messages.error(request, f'Could not extract hymn ID from filename: {filename}. Please use format: hymn-{id}-{type}.mp3')
-                            error_count += 1
-                            continue
-                        
-                        hymn_id = int(numbers[0])
-                        
-                        try:
-                            hymn = Hymn.objects.get(id=hymn_id)
-                        except Hymn.DoesNotExist:
-                            messages.error(request, f'Hymn ID {hymn_id} not found')
-                            error_count += 1
-                            continue
-                        
-                        audio_file, created = AudioFile.objects.get_or_create(
-                            hymn=hymn,
-                            audio_type=audio_type,
-                            defaults={
-                                'file': file,
-                                'is_premium': is_premium,
-                            }
-                        )
-                        
-                        if created:
-                            created_count += 1
-                        else:
-                            messages.warning(request, f'Audio file for hymn "{hymn.title}" ({audio_type}) already exists')
-                    
-                    except Exception as e:
-                        messages.error(request, f'Error processing {file.name}: {str(e)}')
-                        error_count += 1
-            
-            messages.success(request, f'Successfully uploaded {created_count} audio files. {error_count} errors.')
-            return redirect('admin:hymns_audiofile_changelist')
+            # Files are stored and processed in a background import job
+            job = create_import_job(
+                ImportJob.KIND_AUDIO, request.user, files=files,
+                options={'audio_type': audio_type, 'is_premium': is_premium},
+            )
+            messages.info(request, f'Queued {len(files)} audio files for import')
+            return redirect('admin:hymns_importjob_status', job.pk)
         
         hymns = Hymn.objects.all().order_by('title')
         from .models import AudioFile
@@ -930,49 +586,17 @@ class HymnAdmin(admin.ModelAdmin):
             category = Category.objects.get(id=category_id) if category_id else None
             author = Author.objects.get(id=author_id) if author_id else None
             
-            created_count = 0
-            error_count = 0
-            
-            from django.db import transaction
-            with transaction.atomic():
-                for file in files:
-                    try:
-                        file_extension = file.name.split('.')[-1].lower()
-                        
-                        if file_extension in ['docx', 'doc']:
-                            hymn_data = parse_word_document(file)
-                        elif file_extension in ['txt', 'text']:
-                            hymn_data = parse_text_file(file)
-                        else:
-                            messages.error(request, f'Unsupported file format: {file_extension}')
-                            error_count += 1
-                            continue
-                        
-                        # Create hymn (without number - numbers are denomination-specific)
-                        hymn, created = Hymn.objects.get_or_create(
-                            title=hymn_data.get('title', 'Untitled Hymn'),
-                            defaults={
-                                'category': category,
-                                'author': author,
-                                'language': hymn_data.get('language', 'English'),
-                                'is_premium': is_premium,
-                            }
-                        )
-                        
-                        if created:
-                            # Note: Verses and denomination associations must be added separately
-                            # through the admin interface or API
-                            messages.info(request, f'Hymn "{hymn.title}" created. Please add denomination associations and verses manually.')
-                            created_count += 1
-                        else:
-                            messages.warning(request, f'Hymn "{hymn.title}" already exists, skipped')
-                    
-                    except Exception as e:
-                        messages.error(request, f'Error processing {file.name}: {str(e)}')
-                        error_count += 1
-            
-            messages.success(request, f'Successfully created {created_count} hymns. {error_count} errors.')
-            return redirect('admin:hymns_hymn_changelist')
+            # Parsing and writing happen in a background import job
+            job = create_import_job(
+                ImportJob.KIND_HYMN_FILES, request.user, files=files,
+                options={
+                    'category': category.id if category else None,
+                    'author': author.id if author else None,
+                    'is_premium': is_premium,
+                },
+            )
+            messages.info(request, f'Queued {len(files)} files for import')
+            return redirect('admin:hymns_importjob_status', job.pk)
         
         categories = Category.objects.all()
         authors = Author.objects.all()
@@ -982,3 +606,92 @@ class HymnAdmin(admin.ModelAdmin):
             'title': 'Bulk Upload Hymns',
         })
 
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """Progress and results of background upload imports"""
+    list_display = ['id', 'kind', 'status', 'progress_display', 'created_count', 'error_count', 'created_by', 'created_at']
+    list_filter = ['kind', 'status', 'created_at']
+    readonly_fields = [
+        'kind', 'status', 'options', 'files', 'total', 'processed', 'created_count', 'error_count',
+        'messages', 'error', 'report', 'created_by', 'created_at', 'started_at', 'finished_at', 'updated_at'
+    ]
+    
+    def progress_display(self, obj):
+        return f'{obj.processed}/{obj.total} ({obj.progress}%)'
+    progress_display.short_description = 'Progress'
+    
+    def has_add_permission(self, request):
+        # Jobs are created by the upload views
+        return False
+    
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:job_id>/status/', self.admin_site.admin_view(self.status_view), name='hymns_importjob_status'),
+            path('<int:job_id>/progress/', self.admin_site.admin_view(self.progress_view), name='hymns_importjob_progress'),
+            path('<int:job_id>/apply/', self.admin_site.admin_view(self.apply_view), name='hymns_importjob_apply'),
+        ]
+        return custom_urls + urls
+    
+    def status_view(self, request, job_id):
+        """Page that polls an import job until it finishes"""
+        job = get_object_or_404(ImportJob, pk=job_id)
+        return render(request, 'admin/import_job_status.html', {
+            'job': job,
+            'title': f'Import job #{job.pk}',
+            'changelist_url': reverse(self.changelist_url_for(job)),
+        })
+    
+    def progress_view(self, request, job_id):
+        """JSON progress for an import job; ``since`` skips messages the page already shows"""
+        job = get_object_or_404(ImportJob, pk=job_id)
+        try:
+            since = max(int(request.GET.get('since', 0)), 0)
+        except ValueError:
+            since = 0
+        return JsonResponse({
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'finished': job.is_finished,
+            'progress': job.progress,
+            'processed': job.processed,
+            'total': job.total,
+            'created_count': job.created_count,
+            'error_count': job.error_count,
+            'error': job.error,
+            'messages': job.messages[since:],
+            'message_count': len(job.messages),
+            'has_report': job.report is not None,
+        })
+    
+    def apply_view(self, request, job_id):
+        """Apply or discard the changes previewed by a dry run"""
+        if request.method != 'POST':
+            return redirect('admin:hymns_importjob_status', job_id)
+        try:
+            if 'discard' in request.POST:
+                discard_preview(job_id)
+                messages.info(request, 'Dry run discarded')
+                return redirect('admin:hymns_importjob_status', job_id)
+            job = apply_preview(job_id, request.user)
+        except ImportJob.DoesNotExist:
+            messages.error(request, f'Import job {job_id} not found')
+            return redirect('admin:hymns_importjob_changelist')
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('admin:hymns_importjob_status', job_id)
+        messages.info(request, 'Applying the previewed changes')
+        return redirect('admin:hymns_importjob_status', job.pk)
+    
+    def changelist_url_for(self, job):
+        """Where to go once the job has finished"""
+        return {
+            ImportJob.KIND_DENOMINATION_HYMN_FILES: 'admin:hymns_denominationhymn_changelist',
+            ImportJob.KIND_DENOMINATION_HYMN_JSON: 'admin:hymns_denominationhymn_changelist',
+            ImportJob.KIND_HYMN_FILES: 'admin:hymns_hymn_changelist',
+            ImportJob.KIND_SHEET_MUSIC: 'admin:hymns_sheetmusic_changelist',
+            ImportJob.KIND_AUDIO: 'admin:hymns_audiofile_changelist',
+            ImportJob.KIND_HYMNAL_FILE: 'admin:hymns_denominationhymn_changelist',
+        }[job.kind]
@@ -0,0 +1,239 @@
+"""
+Swagger/OpenAPI documentation for the API.
+
+Only imported when API_DOCS_ENABLED is set (see config/urls.py), so API
+workers that don't serve the docs never load drf_yasg. The per-view schema
+overrides live here rather than as decorators in hymns.views for the same
+reason; ``swagger_auto_schema`` only annotates the view, so applying it here
+has the same effect.
+
+Generating the schema introspects every viewset and serializer, so it is done
+once per deploy: ``python manage.py build_api_schema`` writes swagger.json and
+swagger.yaml, plain and gzipped, to API_SCHEMA_DIR, and ``schema_file`` serves
+them with an ETag. Without those files the schema is generated on the first
+request and kept in memory. The Swagger UI and ReDoc pages only render the HTML
+that loads /swagger.json.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import path, re_path
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from django.test import RequestFactory
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions, serializers
+from rest_framework.request import Request
+
+from .serializers import SubscriptionSerializer, UserRegistrationSerializer, UserSerializer
+from .views import SubscriptionViewSet, register_user, user_profile
+
+logger = logging.getLogger(__name__)
+
+# URL suffix: (file name in API_SCHEMA_DIR, codec, content type)
+SCHEMA_FORMATS = {
+    '.json': ('swagger.json', OpenAPICodecJson, 'application/json'),
+    '.yaml': ('swagger.yaml', OpenAPICodecYaml, 'application/yaml'),
+}
+
+API_INFO = openapi.Info(
+    title="Nova Hymnal Premium API",
+    default_version='v1',
+    description="""
+        Complete REST API for Nova Hymnal Premium mobile application.
+
+        ## Features
+        - **Authentication**: JWT-based authentication for secure access
+        - **Hymns**: Browse, search, and filter hymns with full details
+        - **Premium Content**: Sheet music and audio files (premium subscription required)
+        - **User Features**: Favorites, playlists, and notes
+        - **Subscriptions**: Manage premium subscriptions
+
+        ## Authentication
+        To authenticate, use the `/api/v1/auth/login/` endpoint to get JWT tokens.
+        Then include the token in the Authorization header:
+        ```
+        Authorization: Bearer {your_token_here}
+        ```
+
+        ## Premium Features
+        Premium features require an active subscription. Free users have limited access:
+        - Free: 10 favorites maximum
+        - Premium: Unlimited favorites, sheet music, audio files, and more
+        """,
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@novahymnal.com"),
+    license=openapi.License(name="Private License"),
+)
+
+# Swagger Schema View
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+
+class SubscriptionStatusSerializer(serializers.Serializer):
+    """Response of SubscriptionViewSet.status, for the schema only"""
+    has_premium = serializers.BooleanField()
+    subscription = SubscriptionSerializer(allow_null=True)
+
+
+swagger_auto_schema(
+    method='post',
+    request_body=UserRegistrationSerializer,
+    responses={
+        201: openapi.Response('User created successfully', UserSerializer),
+        400: 'Bad request - validation errors'
+    },
+    operation_description='Register a new user account',
+    tags=['Authentication']
+)(register_user)
+
+swagger_auto_schema(
+    method='get',
+    responses={
+        200: openapi.Response('User profile', UserSerializer),
+        401: 'Unauthorized - authentication required'
+    },
+    operation_description='Get the current authenticated user profile',
+    tags=['Authentication'],
+    security=[{'Bearer': []}]
+)(user_profile)
+
+swagger_auto_schema(
+    method='post',
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['transaction_id', 'product_id', 'receipt_data', 'platform'],
+        properties={
+            'transaction_id': openapi.Schema(type=openapi.TYPE_STRING, description='Transaction ID from app store'),
+            'product_id': openapi.Schema(type=openapi.TYPE_STRING, description='Product ID (e.g., com.novahymnal.premium.monthly)'),
+            'receipt_data': openapi.Schema(type=openapi.TYPE_STRING, description='Receipt data from app store'),
+            'platform': openapi.Schema(type=openapi.TYPE_STRING, enum=['ios', 'android'], description='Platform (ios or android)'),
+        }
+    ),
+    responses={
+        200: openapi.Response('Subscription verified', SubscriptionSerializer),
+        201: openapi.Response('Subscription created', SubscriptionSerializer),
+        400: 'Bad request - missing required fields'
+    },
+    operation_description='Verify and create/update subscription from app store purchase receipt',
+    tags=['Subscriptions'],
+    security=[{'Bearer': []}]
+)(SubscriptionViewSet.verify)
+
+swagger_auto_schema(
+    method='get',
+    responses={
+        200: openapi.Response('Subscription status', SubscriptionStatusSerializer)
+    },
+    operation_description='Get the current user\'s subscription status',
+    tags=['Subscriptions'],
+    security=[{'Bearer': []}]
+)(SubscriptionViewSet.status)
+
+
+def generate_schema():
+    """
+    The full schema as drf_yasg's schema view builds it for an anonymous visitor.
+    Host and schemes are left out, so the docs use whichever host serves them.
+    """
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    request = Request(RequestFactory().get('/swagger.json', HTTP_HOST=host))
+    request.user = AnonymousUser()
+    schema = swagger_settings.DEFAULT_GENERATOR_CLASS(API_INFO).get_schema(request=request, public=True)
+    schema.pop('host', None)
+    schema.pop('schemes', None)
+    return schema
+
+
+def encode_schema(schema, extension):
+    return SCHEMA_FORMATS[extension][1](validators=[]).encode(schema)
+
+
+def write_schema_files(directory):
+    """Write every format, plain and gzipped, to ``directory``; returns [(path, bytes, gzipped bytes)]"""
+    os.makedirs(directory, exist_ok=True)
+    schema = generate_schema()
+    written = []
+    for extension, (name, _, _) in SCHEMA_FORMATS.items():
+        content = encode_schema(schema, extension)
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        path = os.path.join(directory, name)
+        for target, data in ((path, content), (f'{path}.gz', compressed)):
+            # Replace atomically so a running worker never reads half a file
+            with open(f'{target}.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(f'{target}.tmp', target)
+        written.append((path, len(content), len(compressed)))
+    return written
+
+
+_schema_files = {}
+_schema_lock = threading.Lock()
+
+
+def load_schema_file(extension):
+    """(content, gzipped content, etag) for a format, read from API_SCHEMA_DIR once per process"""
+    cached = _schema_files.get(extension)
+    if cached is not None:
+        return cached
+    with _schema_lock:
+        if extension not in _schema_files:
+            path = os.path.join(str(settings.API_SCHEMA_DIR), SCHEMA_FORMATS[extension][0])
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                with open(f'{path}.gz', 'rb') as f:
+                    compressed = f.read()
+            except FileNotFoundError:
+                logger.warning('%s has not been built; generating it. Run: python manage.py build_api_schema', path)
+                content = encode_schema(generate_schema(), extension)
+                compressed = gzip.compress(content, mtime=0)
+            _schema_files[extension] = (content, compressed, hashlib.sha256(content).hexdigest()[:32])
+        return _schema_files[extension]
+
+
+@require_safe
+def schema_file(request, format):
+    """/swagger.json and /swagger.yaml from the prebuilt files, gzipped when accepted, with an ETag"""
+    content, compressed, etag = load_schema_file(format)
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    # Each encoding is a different representation, so it needs its own ETag
+    etag = f'"{etag}-gzip"' if use_gzip else f'"{etag}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(compressed if use_gzip else content, content_type=SCHEMA_FORMATS[format][2])
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=settings.API_SCHEMA_MAX_AGE)
+    return response
+
+
+# The UI views only render their HTML shell (their generator has no endpoints). Without the
+# spec renderers, "?format=openapi" can't make them build the full schema either.
+swagger_ui = schema_view.as_view(renderer_classes=(SwaggerUIRenderer,))
+
+urlpatterns = [
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_file, name='schema-json'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', schema_view.as_view(renderer_classes=(ReDocRenderer,)), name='schema-redoc'),
+    path('docs/', swagger_ui, name='api-docs'),  # Alias for convenience
+]
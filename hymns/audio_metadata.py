@@ -0,0 +1,401 @@
+"""
+Duration, bitrate and waveform extraction for audio uploads.
+
+``read_audio_info`` parses the container headers of MP3, MP4/M4A and Ogg
+(Vorbis or Opus) files in pure Python. It reads the first HEADER_BYTES (past
+any ID3v2 tag), MP4 box headers and, for Ogg, the last page. It never decodes
+audio and never reads the whole file:
+
+- MP3: the first frame header, and the Xing/Info or VBRI header that VBR
+  encoders write into it. Files without one are CBR, so the audio size gives
+  the duration.
+- MP4: ``moov/mvhd`` (timescale and duration); the ``mdat`` size gives the
+  bitrate.
+- Ogg: the Vorbis or Opus identification header, and the granule position of
+  the last page.
+
+``waveform`` summarises the loudness over time as WAVEFORM_POINTS values from
+0 to 255 (stored base64-encoded on AudioFile.waveform, a few hundred bytes).
+It decodes the audio with ffmpeg when that is installed. Otherwise it reads
+the ``global_gain`` of every MP3 frame's side information: the encoder's
+per-granule scale, which follows the loudness closely enough to draw. Either
+way the file is streamed, HEADER_BYTES at a time, never read whole.
+
+``update_audio_file`` fills in an AudioFile; the hymns.tasks
+extract_audio_metadata task runs it after uploads.
+"""
+import base64
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from array import array
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER_BYTES = 64 * 1024
+# An Ogg page is at most 65307 bytes, so the last one starts within this many bytes of the end
+OGG_TAIL_BYTES = 65307
+
+_MP3_BITRATES = {
+    # (MPEG-1?, layer): kbps by bitrate index
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+class AudioInfo:
+    """What the headers say about a file; any attribute may be None"""
+
+    def __init__(self, format, duration=None, bitrate=None, sample_rate=None, channels=None):
+        self.format = format
+        self.duration = duration
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    def __repr__(self):
+        return (
+            f'AudioInfo({self.format}, duration={self.duration}, bitrate={self.bitrate}, '
+            f'sample_rate={self.sample_rate}, channels={self.channels})'
+        )
+
+
+class UnsupportedAudio(ValueError):
+    pass
+
+
+def _file_size(f):
+    position = f.tell()
+    size = f.seek(0, os.SEEK_END)
+    f.seek(position)
+    return size
+
+
+def _id3v2_size(head):
+    """Bytes taken by an ID3v2 tag at the start of ``head`` (0 without one)"""
+    if head[:3] != b'ID3' or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+class MP3Frame:
+    """A parsed MPEG audio frame header"""
+
+    def __init__(self, header):
+        b1, b2, b3 = header[1], header[2], header[3]
+        version = (b1 >> 3) & 3
+        self.layer = 4 - ((b1 >> 1) & 3)
+        bitrate_index = b2 >> 4
+        sample_rate_index = (b2 >> 2) & 3
+        if version == 1 or self.layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+            # Reserved values, or free format, which nothing we'd be given uses
+            raise UnsupportedAudio('Not an MPEG audio frame header')
+        self.mpeg1 = version == 3
+        self.bitrate = _MP3_BITRATES[(self.mpeg1, self.layer)][bitrate_index]
+        self.sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+        self.protected = not b1 & 1
+        padding = (b2 >> 1) & 1
+        self.channels = 1 if b3 >> 6 == 3 else 2
+
+        if self.layer == 1:
+            self.samples = 384
+            self.length = (12 * self.bitrate * 1000 // self.sample_rate + padding) * 4
+        else:
+            self.samples = 1152 if self.mpeg1 or self.layer == 2 else 576
+            self.length = self.samples // 8 * self.bitrate * 1000 // self.sample_rate + padding
+
+    @property
+    def side_info_size(self):
+        if self.mpeg1:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+    def global_gain(self, frame):
+        """``global_gain`` of the first granule and channel of a Layer III frame"""
+        offset = 4 + (2 if self.protected else 0)
+        side_info = int.from_bytes(frame[offset:offset + self.side_info_size], 'big')
+        if self.mpeg1:
+            skip = 9 + (5 if self.channels == 1 else 3) + 4 * self.channels + 21
+        else:
+            skip = 8 + (1 if self.channels == 1 else 2) + 21
+        return (side_info >> (self.side_info_size * 8 - skip - 8)) & 0xFF
+
+
+def _is_sync(data, i):
+    return data[i] == 0xFF and data[i + 1] & 0xE0 == 0xE0
+
+
+def _first_mp3_frame(data):
+    """(offset, MP3Frame) of the first frame in ``data`` that is followed by another frame"""
+    for i in range(len(data) - 4):
+        if not _is_sync(data, i):
+            continue
+        try:
+            frame = MP3Frame(data[i:i + 4])
+        except UnsupportedAudio:
+            continue
+        following = i + frame.length
+        # A false sync inside a tag or the audio rarely lines up with a second header
+        if following + 2 > len(data) or _is_sync(data, following):
+            return i, frame
+    raise UnsupportedAudio('No MPEG audio frames found')
+
+
+def _read_mp3(f, size):
+    head = f.read(10)
+    start = _id3v2_size(head)
+    f.seek(start)
+    data = f.read(HEADER_BYTES)
+    offset, frame = _first_mp3_frame(data)
+    header = data[offset:offset + frame.length]
+
+    frames = audio_bytes = None
+    xing = 4 + frame.side_info_size
+    if header[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(header[xing + 4:xing + 8], 'big')
+        position = xing + 8
+        if flags & 1:
+            frames = int.from_bytes(header[position:position + 4], 'big')
+            position += 4
+        if flags & 2:
+            audio_bytes = int.from_bytes(header[position:position + 4], 'big')
+    elif header[36:40] == b'VBRI':
+        audio_bytes = int.from_bytes(header[46:50], 'big')
+        frames = int.from_bytes(header[50:54], 'big')
+
+    if audio_bytes is None:
+        f.seek(max(size - 128, 0))
+        id3v1 = 128 if f.read(3) == b'TAG' else 0
+        audio_bytes = size - start - offset - id3v1
+
+    info = AudioInfo('mp3', sample_rate=frame.sample_rate, channels=frame.channels)
+    if frames:
+        info.duration = frames * frame.samples / frame.sample_rate
+        info.bitrate = round(audio_bytes * 8 / info.duration / 1000) if info.duration else None
+    else:
+        info.bitrate = frame.bitrate
+        info.duration = audio_bytes * 8 / (frame.bitrate * 1000)
+    return info
+
+
+def _mp4_boxes(f, start, end):
+    """(type, payload offset, payload size) of the boxes between two offsets, without reading payloads"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size = int.from_bytes(header[:4], 'big')
+        box_type = header[4:].decode('latin-1')
+        header_size = 8
+        if size == 1:
+            size = int.from_bytes(f.read(8), 'big')
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+        yield box_type, position + header_size, size - header_size
+        position += size
+
+
+def _read_mp4(f, size):
+    info = AudioInfo('mp4')
+    media_bytes = None
+    for box_type, offset, length in _mp4_boxes(f, 0, size):
+        if box_type == 'mdat':
+            media_bytes = (media_bytes or 0) + length
+        elif box_type == 'moov':
+            for child, child_offset, _ in _mp4_boxes(f, offset, offset + length):
+                if child == 'mvhd':
+                    f.seek(child_offset)
+                    mvhd = f.read(32)
+                    # Version 1 has 64-bit times and duration, version 0 32-bit ones
+                    if len(mvhd) < (32 if mvhd[:1] == b'\x01' else 20):
+                        raise UnsupportedAudio('Truncated movie header (mvhd)')
+                    if mvhd[0] == 1:
+                        timescale = int.from_bytes(mvhd[20:24], 'big')
+                        duration = int.from_bytes(mvhd[24:32], 'big')
+                    else:
+                        timescale = int.from_bytes(mvhd[12:16], 'big')
+                        duration = int.from_bytes(mvhd[16:20], 'big')
+                    if timescale:
+                        info.duration = duration / timescale
+                    break
+    if info.duration is None:
+        raise UnsupportedAudio('No movie header (moov/mvhd) found')
+    if info.duration:
+        info.bitrate = round((media_bytes or size) * 8 / info.duration / 1000)
+    return info
+
+
+def _read_ogg(f, size):
+    page = f.read(HEADER_BYTES)
+    if len(page) < 27 or len(page) < 27 + page[26]:
+        raise UnsupportedAudio('Truncated Ogg page')
+    segments = page[26]
+    packet = page[27 + segments:]
+    serial = page[14:18]
+    if packet[:7] == b'\x01vorbis' and len(packet) >= 24:
+        info = AudioInfo('vorbis', channels=packet[11], sample_rate=int.from_bytes(packet[12:16], 'little'))
+        nominal = int.from_bytes(packet[20:24], 'little', signed=True)
+        granule_rate, pre_skip = info.sample_rate, 0
+    elif packet[:8] == b'OpusHead' and len(packet) >= 12:
+        info = AudioInfo('opus', channels=packet[9], sample_rate=48000)
+        nominal = 0
+        # Opus granule positions always count 48 kHz samples, including the encoder delay
+        granule_rate, pre_skip = 48000, int.from_bytes(packet[10:12], 'little')
+    else:
+        raise UnsupportedAudio('Unsupported Ogg codec')
+
+    f.seek(max(size - OGG_TAIL_BYTES, 0))
+    tail = f.read()
+    last = tail.rfind(b'OggS')
+    while last >= 0 and tail[last + 14:last + 18] != serial:
+        last = tail.rfind(b'OggS', 0, last)
+    if last >= 0 and granule_rate:
+        granule = int.from_bytes(tail[last + 6:last + 14], 'little')
+        info.duration = max(granule - pre_skip, 0) / granule_rate
+    if nominal > 0:
+        info.bitrate = round(nominal / 1000)
+    elif info.duration:
+        info.bitrate = round(size * 8 / info.duration / 1000)
+    return info
+
+
+def read_audio_info(f):
+    """AudioInfo from the headers of an open, seekable binary file"""
+    size = _file_size(f)
+    f.seek(0)
+    head = f.read(12)
+    f.seek(0)
+    if head[:4] == b'OggS':
+        return _read_ogg(f, size)
+    if head[4:8] == b'ftyp':
+        return _read_mp4(f, size)
+    return _read_mp3(f, size)
+
+
+def _buckets(values, points):
+    """The largest value in each of ``points`` equal slices of ``values``"""
+    count = len(values)
+    if not count:
+        return []
+    points = min(points, count)
+    return [max(values[i * count // points:(i + 1) * count // points]) for i in range(points)]
+
+
+def _scale(values):
+    low, high = min(values), max(values)
+    if high == low:
+        return bytes(128 if high else 0 for _ in values)
+    return bytes(round((value - low) * 255 / (high - low)) for value in values)
+
+
+def _ffmpeg_peaks(path, points):
+    command = [
+        shutil.which('ffmpeg'), '-v', 'error', '-i', path,
+        '-ac', '1', '-ar', '8000', '-f', 's16le', 'pipe:1',
+    ]
+    result = subprocess.run(command, capture_output=True, timeout=settings.MEDIA_TOOL_TIMEOUT)
+    if result.returncode:
+        raise UnsupportedAudio(result.stderr.decode('utf-8', 'replace').strip() or 'ffmpeg failed')
+    samples = array('h')
+    samples.frombytes(result.stdout[:len(result.stdout) // 2 * 2])
+    peaks = _buckets([abs(sample) for sample in samples], points)
+    # Absolute scale, so quiet recordings look quiet
+    return bytes(min(peak * 255 // 32767, 255) for peak in peaks)
+
+
+def _mp3_gain_envelope(f, points):
+    f.seek(0)
+    start = _id3v2_size(f.read(10))
+    f.seek(start)
+    data = f.read(HEADER_BYTES)
+    offset, frame = _first_mp3_frame(data)
+    if frame.layer != 3:
+        raise UnsupportedAudio('Gain envelopes need MPEG Layer III')
+    gains = []
+    while True:
+        # Only a frame's header and side information are read; refill from the
+        # next frame on once fewer than that are buffered
+        if len(data) - offset < 4 + 2 + 32:
+            start += offset
+            f.seek(start)
+            data = f.read(HEADER_BYTES)
+            offset = 0
+        if offset + 4 > len(data) or not _is_sync(data, offset):
+            break
+        try:
+            frame = MP3Frame(data[offset:offset + 4])
+        except UnsupportedAudio:
+            break
+        gains.append(frame.global_gain(data[offset:offset + 4 + 2 + frame.side_info_size]))
+        offset += frame.length
+    if not gains:
+        raise UnsupportedAudio('No MPEG audio frames found')
+    return _scale(_buckets(gains, points))
+
+
+def waveform(f, path=None, points=None):
+    """Loudness summary of an open audio file as bytes (0 to 255); ``path`` lets ffmpeg read it directly"""
+    points = points or settings.AUDIO_WAVEFORM_POINTS
+    if not shutil.which('ffmpeg'):
+        return _mp3_gain_envelope(f, points)
+    if path:
+        return _ffmpeg_peaks(path, points)
+    # ffmpeg needs a path; stream the file out of storage (S3) to a temporary one
+    with tempfile.NamedTemporaryFile(prefix='hymns-audio-') as local:
+        f.seek(0)
+        shutil.copyfileobj(f, local, HEADER_BYTES)
+        local.flush()
+        return _ffmpeg_peaks(local.name, points)
+
+
+def encode_waveform(peaks):
+    return base64.b64encode(peaks).decode('ascii')
+
+
+def decode_waveform(value):
+    return list(base64.b64decode(value)) if value else None
+
+
+def update_audio_file(audio_file):
+    """Fill in an AudioFile's duration, bitrate and waveform from its file; returns the AudioInfo"""
+    storage = audio_file.file.storage
+    try:
+        path = storage.path(audio_file.file.name)
+    except NotImplementedError:
+        path = None
+    with storage.open(audio_file.file.name, 'rb') as f:
+        info = read_audio_info(f)
+        try:
+            peaks = waveform(f, path)
+        except (UnsupportedAudio, OSError, subprocess.SubprocessError) as e:
+            logger.warning(f'No waveform for audio file {audio_file.pk}: {e}')
+            peaks = None
+
+    fields = ['updated_at']
+    if info.duration is not None:
+        audio_file.duration = round(info.duration)
+        fields.append('duration')
+    if info.bitrate:
+        audio_file.bitrate = info.bitrate
+        fields.append('bitrate')
+    if peaks:
+        audio_file.waveform = encode_waveform(peaks)
+        fields.append('waveform')
+    audio_file.save(update_fields=fields)
+    return info
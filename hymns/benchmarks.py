@@ -0,0 +1,342 @@
+"""
+Shared helpers for query analysis and benchmarks.
+
+The endpoint query mix replays what the API viewsets actually send to the
+database (filters, search and ordering included) so that EXPLAIN output and
+timings reflect real traffic rather than hand-written approximations.
+
+Benchmark suites are registered in ``SUITES`` and run with
+``python manage.py benchmark <suite>``. Suites that need data build a synthetic
+catalogue inside a transaction that is rolled back afterwards.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef, Subquery
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .catalogue import generate_catalogue
+from .models import Category, Author, Denomination, DenominationHymn, Favorite, Hymn, User
+from .views import (
+    HymnViewSet, DenominationHymnViewSet, CategoryViewSet,
+    FavoriteViewSet, PlaylistViewSet, HymnNoteViewSet
+)
+
+# (label, viewset, query params, needs an authenticated user)
+# Placeholders in braces are filled from sample rows in the current database.
+ENDPOINT_QUERY_MIX = [
+    ('hymns: list', HymnViewSet, {}, False),
+    ('hymns: by category', HymnViewSet, {'category': '{category}'}, False),
+    ('hymns: by author', HymnViewSet, {'author': '{author}'}, False),
+    ('hymns: by language', HymnViewSet, {'language': 'English'}, False),
+    ('hymns: premium only', HymnViewSet, {'is_premium': 'true'}, False),
+    ('hymns: featured', HymnViewSet, {'is_featured': 'true'}, False),
+    ('hymns: newest', HymnViewSet, {'ordering': '-created_at'}, False),
+    ('hymns: most viewed', HymnViewSet, {'ordering': '-view_count'}, False),
+    ('hymns: by denomination', HymnViewSet, {'denomination': '{denomination}'}, False),
+    ('hymns: by denomination/period', HymnViewSet, {'denomination': '{denomination}', 'hymn_period': '{hymn_period}'}, False),
+    ('hymns: search', HymnViewSet, {'search': 'grace'}, False),
+    ('denomination-hymns: book', DenominationHymnViewSet, {'denomination': '{denomination}'}, False),
+    ('categories: list', CategoryViewSet, {}, False),
+    ('notes: public', HymnNoteViewSet, {}, False),
+    ('favorites: mine', FavoriteViewSet, {}, True),
+    ('playlists: mine', PlaylistViewSet, {}, True),
+    ('notes: mine', HymnNoteViewSet, {}, True),
+]
+
+
+def sample_parameters():
+    """Pick representative ids from the current database for the query mix"""
+    denomination_hymn = DenominationHymn.objects.order_by('id').first()
+    category = Category.objects.order_by('id').first()
+    author = Author.objects.order_by('id').first()
+    denomination = Denomination.objects.order_by('id').first()
+    return {
+        'category': category.id if category else 0,
+        'author': author.id if author else 0,
+        'denomination': denomination_hymn.denomination_id if denomination_hymn else (denomination.id if denomination else 0),
+        'hymn_period': (denomination_hymn.hymn_period if denomination_hymn else None) or 'new',
+    }
+
+
+def sample_user():
+    """A user with favorites if there is one, so user-scoped queries have data"""
+    favorite = Favorite.objects.order_by('id').first()
+    if favorite:
+        return favorite.user
+    return User.objects.order_by('id').first()
+
+
+def build_list_queryset(viewset_class, params, user=None):
+    """Return the queryset a list request to ``viewset_class`` would evaluate for one page"""
+    factory = APIRequestFactory()
+    django_request = factory.get('/', params)
+    if user is not None:
+        force_authenticate(django_request, user=user)
+    view = viewset_class()
+    view.action_map = {'get': 'list'}
+    view.action = 'list'
+    view.format_kwarg = None
+    view.args, view.kwargs = (), {}
+    view.request = Request(django_request, authenticators=view.get_authenticators())
+    view.headers = {}
+    queryset = view.filter_queryset(view.get_queryset())
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    return queryset[:page_size]
+
+
+def endpoint_queries(include_user_queries=True):
+    """Yield ``(label, queryset)`` pairs for the endpoint query mix"""
+    params = sample_parameters()
+    user = sample_user()
+    for label, viewset_class, query, needs_user in ENDPOINT_QUERY_MIX:
+        if needs_user and (not include_user_queries or user is None):
+            continue
+        filled = {key: str(value).format(**params) for key, value in query.items()}
+        yield label, build_list_queryset(viewset_class, filled, user if needs_user else None)
+
+
+def time_call(func, repeat=5):
+    """Run ``func`` ``repeat`` times and return timing statistics in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+class _Rollback(Exception):
+    pass
+
+
+def build_catalogue(hymn_count, verses_per_hymn=3, seed=1):
+    """
+    Bulk insert a synthetic catalogue with ``catalogue.generate_catalogue``:
+    every hymn is in a Catholic-style book (alternating old/new periods) and
+    every third hymn also in a second book. Returns the two denominations.
+    """
+    catalogue = generate_catalogue(
+        hymn_count, denomination_count=2, verses_per_hymn=verses_per_hymn, prefix='benchmark', seed=seed
+    )
+    return tuple(catalogue.denominations)
+
+
+@contextmanager
+def temporary_catalogue(hymn_count, **kwargs):
+    """Build a synthetic catalogue for the duration of a block, then roll it back"""
+    try:
+        with transaction.atomic():
+            yield build_catalogue(hymn_count, **kwargs)
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def denomination_queryset(strategy, denomination_id, hymn_period=None):
+    """
+    Hymns in one denomination/period, built with one of the filter strategies:
+    ``distinct`` (the original JOIN + DISTINCT, title order), ``exists`` (correlated
+    EXISTS) or ``semi-join`` (uncorrelated IN driven from DenominationHymn, which
+    HymnViewSet uses). The last two are in book order.
+    """
+    book_entries = DenominationHymn.objects.filter(denomination_id=denomination_id)
+    if hymn_period:
+        book_entries = book_entries.filter(hymn_period=hymn_period)
+
+    if strategy == 'distinct':
+        queryset = Hymn.objects.filter(denomination_hymns__denomination_id=denomination_id)
+        if hymn_period:
+            queryset = queryset.filter(denomination_hymns__hymn_period=hymn_period)
+        return queryset.distinct().order_by('title')
+
+    correlated = book_entries.filter(hymn=OuterRef('pk'))
+    hymn_numbers = correlated.order_by().values('hymn').annotate(number=Min('number')).values('number')
+    if strategy == 'exists':
+        queryset = Hymn.objects.filter(Exists(correlated))
+    else:
+        queryset = Hymn.objects.filter(pk__in=book_entries.values('hymn_id'))
+    return queryset.annotate(denomination_number=Subquery(hymn_numbers)).order_by('denomination_number', 'title')
+
+
+def bench_denomination_filter(sizes=(1000, 5000, 20000), repeat=5):
+    """Compare denomination filter strategies for a paginated listing as the catalogue grows"""
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    results = []
+    for size in sizes:
+        with temporary_catalogue(size) as (periodic, plain):
+            for label, denomination, period in [('periodic/new', periodic, 'new'), ('plain', plain, None)]:
+                for strategy in ('distinct', 'exists', 'semi-join'):
+                    queryset = denomination_queryset(strategy, denomination.id, period)
+
+                    # What the list endpoint does: count for pagination, then fetch one page
+                    def run():
+                        queryset.count()
+                        list(queryset[:page_size])
+
+                    results.append({'size': size, 'case': label, 'strategy': strategy, **time_call(run, repeat)})
+    return results
+
+
+def bench_book_paging(sizes=(1000, 5000, 20000), repeat=5):
+    """
+    Cost of fetching one page of a book in number order at increasing depth:
+    page-number pagination (OFFSET over the book-ordered semi-join) against the
+    keyset cursor HymnViewSet uses for ``ordering=number``.
+    """
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    results = []
+    for size in sizes:
+        with temporary_catalogue(size) as (periodic, plain):
+            book = DenominationHymn.objects.filter(denomination=periodic, hymn_period='new')
+            book_length = book.count()
+            offset_queryset = denomination_queryset('semi-join', periodic.id, 'new')
+            for depth in (0.0, 0.5, 1.0):
+                offset = max(min(int(book_length * depth), book_length - page_size), 0)
+                last_number = book.order_by('number').values_list('number', flat=True)[offset] if offset else 0
+
+                def run_offset():
+                    offset_queryset.count()
+                    list(offset_queryset[offset:offset + page_size])
+
+                def run_keyset():
+                    entries = list(
+                        book.only('id', 'number', 'hymn_id').order_by('number', 'id')
+                        .filter(number__gt=last_number)[:page_size + 1]
+                    )
+                    Hymn.objects.in_bulk([entry.hymn_id for entry in entries[:page_size]])
+
+                for strategy, run in (('offset', run_offset), ('keyset', run_keyset)):
+                    results.append({
+                        'size': size, 'depth': f'{depth:.0%}', 'strategy': strategy, **time_call(run, repeat)
+                    })
+    return results
+
+
+def sample_hymnal_lines(hymn_count, verses_per_hymn=4, seed=1):
+    """
+    Lines of a synthetic hymnal in the upload format: a header, then per hymn a
+    "NCH n" line, a title, blank-separated verses and a chorus.
+    """
+    rng = random.Random(seed)
+    words = ['grace', 'light', 'lord', 'sing', 'praise', 'holy', 'love', 'heaven', 'glory', 'peace', 'joy', 'king']
+    lines = ['THE NEW CATHOLIC HYMNAL, 2021', '']
+    for number in range(1, hymn_count + 1):
+        lines += [f'NCH {number}', ' '.join(rng.choice(words) for _ in range(3)).title(), '']
+        for verse in range(verses_per_hymn):
+            lines += [' '.join(rng.choice(words) for _ in range(6)).capitalize() for _ in range(4)]
+            lines.append('')
+            if verse == 0:
+                lines += ['Chorus:'] + [' '.join(rng.choice(words) for _ in range(5)).capitalize() for _ in range(2)] + ['']
+        lines.append('')
+    return lines
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def sample_docx(lines):
+    """
+    A minimal Word document with one paragraph per line. Written directly rather
+    than with python-docx, whose add_paragraph() is slow on large documents.
+    """
+    import io
+    import zipfile
+    from xml.sax.saxutils import escape
+
+    paragraphs = ''.join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' if line else '<w:p/>'
+        for line in lines
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{paragraphs}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        package.writestr('_rels/.rels', DOCX_RELS)
+        package.writestr('word/document.xml', document)
+    return buffer.getvalue()
+
+
+def bench_hymnal_parser(sizes=(1000,), repeat=5):
+    """Parse a synthetic hymnal as a text upload and as a Word upload"""
+    import io
+    from .hymnal_parser import parse_word_document, parse_text_file
+
+    results = []
+    for size in sizes:
+        lines = sample_hymnal_lines(size)
+        uploads = (
+            ('text', parse_text_file, '\n'.join(lines).encode('utf-8')),
+            ('docx', parse_word_document, sample_docx(lines)),
+        )
+        for label, parse, data in uploads:
+            hymns = parse(io.BytesIO(data))
+            assert len(hymns) == size, f'{label}: parsed {len(hymns)} of {size} hymns'
+            timing = time_call(lambda: parse(io.BytesIO(data)), repeat)
+            results.append({
+                'size': size, 'format': label, 'bytes': len(data),
+                'hymns_per_sec': round(size / (timing['median_ms'] / 1000)),
+                **timing,
+            })
+    return results
+
+
+def bench_parallel_parse(sizes=(5000,), repeat=3, file_count=50):
+    """Parse a synthetic hymnal split into ``file_count`` Word files with 1, 2, 4... worker processes"""
+    import os
+    from .hymnal_parser import parse_files
+
+    results = []
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cpus} | ({cpus * 2} if cpus > 4 else set()))
+    for size in sizes:
+        per_file = size // file_count
+        files = [
+            (f'hymnal-{index + 1}.docx', sample_docx(sample_hymnal_lines(per_file, seed=index)))
+            for index in range(file_count)
+        ]
+        for workers in worker_counts:
+            parsed = sum(len(hymns) for hymns, error in parse_files(files, workers=workers))
+            assert parsed == per_file * file_count, f'parsed {parsed} of {per_file * file_count} hymns'
+            results.append({
+                'size': size, 'files': file_count, 'workers': workers, 'cpus': cpus,
+                **time_call(lambda: list(parse_files(files, workers=workers)), repeat),
+            })
+    return results
+
+
+SUITES = {
+    'book-paging': bench_book_paging,
+    'denomination-filter': bench_denomination_filter,
+    'hymnal-parser': bench_hymnal_parser,
+    'parallel-parse': bench_parallel_parse,
+}
@@ -0,0 +1,286 @@
+"""
+Deterministic synthetic catalogue for load testing and benchmarks.
+
+``generate_catalogue`` bulk inserts denominations (the first one is a
+Catholic-style book with old and new periods), hymns with verses, audio and
+sheet music rows, and users with favorites, playlists and notes. The same
+arguments and seed always produce the same rows, so timings from different
+runs and machines can be compared.
+
+Rows are written in chunks of hymns and users so memory stays flat for large
+catalogues. Models whose primary keys are needed later go through
+``bulk_create``; the rest (verses above all) are inserted with ``executemany``,
+which skips the ORM's per-field work and is several times faster. Nothing here opens a transaction; callers decide whether the
+catalogue is committed (``generate_catalogue`` command) or rolled back
+(``benchmarks.temporary_catalogue``).
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import (
+    Author, AudioFile, Category, Denomination, DenominationHymn, Favorite, Hymn, HymnNote,
+    Playlist, PlaylistHymn, SheetMusic, User, Verse, verse_text_hash
+)
+
+# Password of every generated user, so load tests can log in as any of them
+SYNTHETIC_PASSWORD = 'synthetic-password'
+
+HYMN_CHUNK_SIZE = 2000
+USER_CHUNK_SIZE = 1000
+
+LYRIC_WORDS = [
+    'grace', 'light', 'lord', 'sing', 'praise', 'holy', 'love', 'heaven', 'glory', 'peace', 'joy', 'king',
+    'thou', 'art', 'my', 'soul', 'shepherd', 'mercy', 'morning', 'cross', 'faithful', 'rejoice', 'spirit',
+    'come', 'all', 'ye', 'and', 'the', 'of', 'to', 'in', 'is', 'we', 'our', 'thy', 'name', 'forever',
+]
+CATEGORY_NAMES = ['Worship', 'Praise', 'Advent', 'Christmas', 'Lent', 'Easter', 'Pentecost', 'Communion', 'Marian', 'Evening']
+LANGUAGES = ['English'] * 8 + ['Latin', 'French']
+METERS = ['CM', 'LM', 'SM', '8.7.8.7', '7.6.7.6 D', '10.10.10.10']
+KEYS = ['C', 'D', 'E♭', 'F', 'G', 'A♭', 'B♭']
+AUDIO_TYPES = [audio_type for audio_type, _ in AudioFile.AUDIO_TYPES]
+
+
+class Catalogue:
+    """What ``generate_catalogue`` created: its denominations and row counts per model"""
+
+    def __init__(self, denominations):
+        # The Catholic-style book with periods is first
+        self.denominations = denominations
+        self.counts = {}
+
+    def add(self, model, rows):
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(rows)
+        return rows
+
+
+def lyric_line(rng, length):
+    return ' '.join(rng.choices(LYRIC_WORDS, k=length)).capitalize()
+
+
+def generate_catalogue(
+    hymn_count, denomination_count=2, verses_per_hymn=4, audio_ratio=0.5, sheet_music_ratio=0.3,
+    user_count=0, favorites_per_user=20, playlists_per_user=2, hymns_per_playlist=10, notes_per_user=5,
+    prefix='synthetic', catholic=None, seed=1, progress=None,
+):
+    """
+    Bulk insert a synthetic catalogue and return a ``Catalogue``.
+
+    Every hymn is in the Catholic-style book (alternating old/new periods) and
+    each further denomination holds every third hymn, offset per denomination,
+    with "thou" lyrics modernised to "you". Names and slugs start with
+    ``prefix`` so several catalogues can live side by side.
+
+    The Catholic-style book is a new prefixed denomination unless ``catholic``
+    is given, in which case hymns are appended to that book after its highest
+    numbers. Only the real ``catholic`` denomination passes model validation
+    for periods, so pass it when the catalogue will be edited through the admin.
+    ``progress`` is called with ``(label, done, total)`` after each chunk.
+    """
+    rng = random.Random(seed)
+    label = prefix.replace('-', ' ').title()
+
+    catalogue = Catalogue(catalogue_denominations(label, denomination_count, catholic))
+    categories = catalogue.add(Category, Category.objects.bulk_create([
+        Category(name=f'{label} {name}', slug=slugify(f'{prefix} {name}')) for name in CATEGORY_NAMES
+    ]))
+    authors = catalogue.add(Author, Author.objects.bulk_create([
+        Author(name=f'{label} author {i}', slug=slugify(f'{prefix} author {i}'), birth_year=rng.randrange(1600, 1950))
+        for i in range(max(hymn_count // 50, 1))
+    ], batch_size=1000))
+
+    catholic, *books = catalogue.denominations
+    numbers = {
+        (catholic.pk, row['hymn_period']): row['last']
+        for row in catholic.hymns.values('hymn_period').annotate(last=Max('number'))
+    }
+    slug_prefix = slugify(prefix)
+    no_references = Hymn._meta.get_field('scripture_references').get_db_prep_save([], connection)
+    # Hymns were added a minute apart, so "newest" ordering has something to sort
+    first_added = timezone.now() - timedelta(minutes=hymn_count)
+    hymn_ids = []
+    for start in range(0, hymn_count, HYMN_CHUNK_SIZE):
+        stop = min(start + HYMN_CHUNK_SIZE, hymn_count)
+        now = timestamp()
+        slugs = [f'{slug_prefix}-hymn-{i}' for i in range(start, stop)]
+        catalogue.add(Hymn, insert_rows(Hymn, [
+            'title', 'slug', 'author', 'category', 'language', 'scripture_references', 'meter', 'key_signature',
+            'is_premium', 'is_featured', 'view_count', 'created_at', 'updated_at',
+        ], [
+            (
+                ' '.join(rng.choices(LYRIC_WORDS, k=rng.randint(2, 5))).title(),
+                slug,
+                rng.choice(authors).pk if rng.random() < 0.8 else None,
+                rng.choice(categories).pk,
+                rng.choice(LANGUAGES),
+                no_references,
+                rng.choice(METERS),
+                rng.choice(KEYS),
+                rng.random() < 0.2,
+                rng.random() < 0.02,
+                rng.randrange(10000),
+                timestamp(first_added + timedelta(minutes=i)),
+                now,
+            )
+            for i, slug in enumerate(slugs, start)
+        ]))
+        hymn_pks = dict(Hymn.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+        hymns = [(hymn_pks[slug], slug) for slug in slugs]
+        hymn_ids.extend(hymn_pks[slug] for slug in slugs)
+
+        entries = []
+        lyrics = {}
+        for i, hymn in enumerate(hymns, start):
+            lyrics[hymn[0]] = [
+                '\n'.join(lyric_line(rng, rng.randint(5, 8)) for _ in range(4)) for _ in range(verses_per_hymn)
+            ]
+            period = 'new' if i % 2 else 'old'
+            entries.append(_book_entry(numbers, hymn, catholic, period, now))
+            for offset, book in enumerate(books):
+                if (i + offset) % 3 == 0:
+                    entries.append(_book_entry(numbers, hymn, book, None, now))
+        catalogue.add(DenominationHymn, insert_rows(
+            DenominationHymn, ['hymn', 'denomination', 'hymn_period', 'number', 'created_at', 'updated_at'], entries
+        ))
+
+        verses = []
+        # The chunk's hymns are all new, so these are exactly the entries inserted above
+        entries = DenominationHymn.objects.filter(hymn__in=hymn_ids[start:]).values_list('pk', 'hymn_id', 'denomination_id')
+        for entry_id, hymn_id, denomination_id in entries:
+            for n, text in enumerate(lyrics[hymn_id], 1):
+                if denomination_id != catholic.pk:
+                    text = text.replace('thou', 'you').replace('Thou', 'You')
+                verses.append((entry_id, n, False, text, verse_text_hash(text), n))
+        catalogue.add(Verse, insert_rows(
+            Verse, ['denomination_hymn', 'verse_number', 'is_chorus', 'text', 'text_hash', 'order'], verses
+        ))
+
+        audio_files = []
+        sheet_music = []
+        for hymn_id, slug in hymns:
+            if rng.random() < audio_ratio:
+                for audio_type in rng.sample(AUDIO_TYPES, rng.randint(1, 3)):
+                    audio_files.append((
+                        hymn_id, audio_type, f'audio/{slug_prefix}/{slug}-{audio_type}.mp3',
+                        rng.randrange(90, 360), rng.choice([96, 128, 192]), audio_type != 'full', now, now,
+                    ))
+            if rng.random() < sheet_music_ratio:
+                sheet_music.append((
+                    hymn_id, f'sheet_music/{slug_prefix}/{slug}.pdf', rng.randint(1, 4), True, now, now
+                ))
+        catalogue.add(AudioFile, insert_rows(
+            AudioFile,
+            ['hymn', 'audio_type', 'file', 'duration', 'bitrate', 'is_premium', 'created_at', 'updated_at'],
+            audio_files,
+        ))
+        catalogue.add(SheetMusic, insert_rows(
+            SheetMusic, ['hymn', 'file', 'page_count', 'is_premium', 'created_at', 'updated_at'], sheet_music
+        ))
+        if progress:
+            progress('hymns', stop, hymn_count)
+
+    if user_count and hymn_ids:
+        _generate_users(
+            catalogue, rng, prefix, user_count, hymn_ids,
+            favorites_per_user, playlists_per_user, hymns_per_playlist, notes_per_user, progress,
+        )
+    return catalogue
+
+
+def catalogue_denominations(label, count, catholic=None):
+    """The Catholic-style book with periods, then plain books up to ``count`` denominations"""
+    names = [] if catholic else [f'{label} Catholic']
+    names += [f'{label} denomination {n}' for n in range(1, count)]
+    denominations = Denomination.objects.bulk_create([
+        Denomination(name=name, slug=slugify(name), display_order=n) for n, name in enumerate(names, 1)
+    ])
+    return [catholic, *denominations] if catholic else denominations
+
+
+def timestamp(value=None):
+    """A datetime (by default the current time) as the database expects it in raw inserts"""
+    return connection.ops.adapt_datetimefield_value(value or timezone.now())
+
+
+def insert_rows(model, fields, rows):
+    """
+    Insert tuples of ``fields`` values with one ``executemany``. Unlike
+    ``bulk_create`` this does not set primary keys or auto_now fields, so
+    timestamps must be in ``rows``.
+    """
+    if rows:
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+    return rows
+
+
+def _book_entry(numbers, hymn, denomination, period, now):
+    # Books are numbered from 1 in catalogue order, separately per period
+    key = (denomination.pk, period)
+    numbers[key] = numbers.get(key, 0) + 1
+    return (hymn[0], denomination.pk, period, numbers[key], now, now)
+
+
+def _popular_hymns(rng, hymn_ids, count):
+    """Distinct hymn ids, skewed towards the start of the catalogue like real listening"""
+    count = min(count, len(hymn_ids))
+    chosen = {}
+    while len(chosen) < count:
+        chosen.setdefault(hymn_ids[int(len(hymn_ids) * rng.random() ** 2)], None)
+    return list(chosen)
+
+
+def _generate_users(
+    catalogue, rng, prefix, user_count, hymn_ids,
+    favorites_per_user, playlists_per_user, hymns_per_playlist, notes_per_user, progress,
+):
+    # Hashing once keeps this fast; every user shares SYNTHETIC_PASSWORD
+    password = make_password(SYNTHETIC_PASSWORD)
+    slug_prefix = slugify(prefix)
+    for start in range(0, user_count, USER_CHUNK_SIZE):
+        stop = min(start + USER_CHUNK_SIZE, user_count)
+        users = catalogue.add(User, User.objects.bulk_create([
+            User(
+                username=f'{slug_prefix}-user-{i}',
+                email=f'{slug_prefix}-user-{i}@example.com',
+                password=password,
+                platform=rng.choice(['ios', 'android', 'web']),
+                is_premium=rng.random() < 0.1,
+            )
+            for i in range(start, stop)
+        ], batch_size=1000))
+
+        now = timestamp()
+        favorites = []
+        playlists = []
+        notes = []
+        for user in users:
+            favorites += [(user.pk, hymn_id, now) for hymn_id in _popular_hymns(rng, hymn_ids, favorites_per_user)]
+            playlists += [
+                Playlist(user=user, name=f'Playlist {n}', is_public=rng.random() < 0.3)
+                for n in range(1, playlists_per_user + 1)
+            ]
+            notes += [
+                (user.pk, hymn_id, lyric_line(rng, 3), lyric_line(rng, rng.randint(10, 40)), rng.random() < 0.25, now, now)
+                for hymn_id in _popular_hymns(rng, hymn_ids, notes_per_user)
+            ]
+        catalogue.add(Favorite, insert_rows(Favorite, ['user', 'hymn', 'created_at'], favorites))
+        catalogue.add(HymnNote, insert_rows(
+            HymnNote, ['user', 'hymn', 'title', 'content', 'is_public', 'created_at', 'updated_at'], notes
+        ))
+        playlists = catalogue.add(Playlist, Playlist.objects.bulk_create(playlists, batch_size=1000))
+        catalogue.add(PlaylistHymn, insert_rows(PlaylistHymn, ['playlist', 'hymn', 'order', 'added_at'], [
+            (playlist.pk, hymn_id, order, now)
+            for playlist in playlists
+            for order, hymn_id in enumerate(_popular_hymns(rng, hymn_ids, hymns_per_playlist))
+        ]))
+        if progress:
+            progress('users', stop, user_count)
@@ -0,0 +1,62 @@
+"""
+Cached premium entitlements.
+
+Media requests (hymns.media_serving) check premium access on every range
+request while a player seeks, so they don't load the user. The user id comes
+from the JWT access token (or the session), and the user's premium status and
+expiry are cached for ENTITLEMENT_CACHE_SECONDS. ``User.save()`` drops the
+cached entry, so subscription changes apply on the next request in this
+process; other processes (with a per-process cache) catch up within the
+timeout.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+_CACHE_PREFIX = 'hymns:entitlement:'
+
+
+def request_user_id(request):
+    """The user id from a valid JWT access token, else from the session; None for anonymous requests"""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is not None:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is not None:
+            try:
+                token = authentication.get_validated_token(raw_token)
+            except InvalidToken:
+                return None
+            return token.get(api_settings.USER_ID_CLAIM)
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def entitlement(user_id):
+    """(is_premium, premium expiry as a timestamp or None) for a user, cached"""
+    key = f'{_CACHE_PREFIX}{user_id}'
+    cached = cache.get(key)
+    if cached is None:
+        from .models import User
+
+        row = User.objects.filter(pk=user_id, is_active=True).values_list('is_premium', 'premium_expires_at').first()
+        is_premium, expires_at = row or (False, None)
+        cached = (is_premium, expires_at.timestamp() if expires_at else None)
+        cache.set(key, cached, getattr(settings, 'ENTITLEMENT_CACHE_SECONDS', 300))
+    return cached
+
+
+def has_active_premium(user_id):
+    """Same rule as User.has_active_premium, from the cached entitlement"""
+    if user_id is None:
+        return False
+    is_premium, expires = entitlement(user_id)
+    return is_premium and (expires is None or expires >= time.time())
+
+
+def forget_entitlement(user_id):
+    cache.delete(f'{_CACHE_PREFIX}{user_id}')
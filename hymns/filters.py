@@ -0,0 +1,36 @@
+"""
+Custom filter backends for the hymns API
+"""
+from rest_framework.filters import OrderingFilter
+
+
+class HymnOrderingFilter(OrderingFilter):
+    """
+    Ordering filter that defaults to book order when a denomination is selected.
+
+    HymnViewSet annotates ``denomination_number`` when listing one denomination's
+    hymns; without an explicit ``ordering`` param the results come back in the
+    order they appear in that hymnal instead of alphabetically.
+
+    ``ordering=number`` (or ``-number``) asks for book order explicitly. It is only
+    valid when a denomination is selected and is ignored otherwise, like any other
+    unknown ordering field.
+    """
+    book_ordering = ['denomination_number', 'title']
+    number_field = 'number'
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and 'denomination_number' in queryset.query.annotations:
+            return self.book_ordering
+        return super().get_ordering(request, queryset, view)
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        in_book = 'denomination_number' in queryset.query.annotations
+        ordering = []
+        for term in fields:
+            if term.lstrip('-') == self.number_field:
+                if in_book:
+                    ordering.append(term.replace(self.number_field, 'denomination_number'))
+            else:
+                ordering.extend(super().remove_invalid_fields(queryset, [term], view, request))
+        return ordering
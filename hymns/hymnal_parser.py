@@ -0,0 +1,475 @@
+"""
+Line-oriented hymnal parser shared by the Word and text uploads.
+
+``iter_hymns`` takes any iterable of lines (text file lines or Word paragraphs)
+and yields each hymn as soon as it is complete, so callers never need the whole
+document or the whole hymnal in memory. The rules are those of the original
+admin parsers; see BULK_UPLOAD_FORMAT_GUIDE.md for the accepted formats.
+``iter_json_items`` and ``iter_json_lines`` stream JSON and JSON Lines hymnals
+the same way.
+
+This module has no Django dependencies, so ``parse_files`` can run uploads
+through it in worker processes.
+"""
+import codecs
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree as ET
+
+# Header lines to skip, like "THE NEW CATHOLIC HYMNAL, 2021"
+HEADER_RE = re.compile(r'^THE\s+NEW\s+CATHOLIC\s+HYMNAL', re.IGNORECASE)
+# "NCH 1", "OCH 2", etc. (prefix + number)
+PREFIX_NUMBER_RE = re.compile(r'^[A-Z]{2,}\s+(\d+)$')
+# "101. Amazing Grace"
+NUMBER_TITLE_RE = re.compile(r'^(\d+)\.\s*(.+)$')
+# Just a number: "101"
+NUMBER_ONLY_RE = re.compile(r'^(\d+)$')
+# Verse number; the match end is where the verse text starts
+VERSE_RE = re.compile(r'^(\d+)\.\s*')
+# Chorus marker; the match end is where the chorus text starts
+CHORUS_RE = re.compile(r'^(Chorus|Refrain):?\s*', re.IGNORECASE)
+
+TEXT_CHUNK_SIZE = 64 * 1024
+# Characters that can follow a complete item of a JSON array
+JSON_DELIMITERS = ' \t\r\n,]'
+
+logger = logging.getLogger(__name__)
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_BODY = f'{W_NS}body'
+W_P = f'{W_NS}p'
+W_R = f'{W_NS}r'
+W_HYPERLINK = f'{W_NS}hyperlink'
+W_T = f'{W_NS}t'
+W_BR = f'{W_NS}br'
+W_TYPE = f'{W_NS}type'
+# Other run elements that stand for text
+RUN_TEXT = {
+    f'{W_NS}tab': '\t',
+    f'{W_NS}ptab': '\t',
+    f'{W_NS}cr': '\n',
+    f'{W_NS}noBreakHyphen': '-',
+}
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+
+def new_hymn(number=None, title=''):
+    return {
+        'title': title,
+        'number': number,
+        'verses': [],
+        'author': '',
+        'category': '',
+        'language': 'English',
+    }
+
+
+def _finish(hymn, verse):
+    """Close ``hymn`` (adding its last verse) and return it, or None if it has no data"""
+    if hymn is not None and (hymn['number'] is not None or hymn['verses']):
+        if verse:
+            hymn['verses'].append(verse)
+        if hymn['verses'] or hymn['number']:
+            return hymn
+    return None
+
+
+def iter_hymns(lines):
+    """
+    Yield hymn dicts from ``lines`` as each one is completed.
+
+    A hymn starts at a "PREFIX N", "N. Title" or bare number line, and ends at
+    the next hymn start or after two blank lines. The first other line becomes
+    the title if there isn't one. "N." starts verse N, "Chorus:"/"Refrain:" starts
+    a chorus, and other lines continue the current verse.
+    """
+    hymn = None
+    verse = None
+    verse_number = 1
+    title_found = False
+    number_found = False
+    blank_lines_count = 0
+
+    for line in lines:
+        text = line.strip()
+
+        # Two blank lines after some verses end the hymn
+        if not text:
+            blank_lines_count += 1
+            if blank_lines_count >= 2 and hymn is not None and hymn['verses']:
+                finished = _finish(hymn, verse)
+                if finished:
+                    yield finished
+                hymn = new_hymn()
+                verse = None
+                verse_number = 1
+                title_found = number_found = False
+                blank_lines_count = 0
+            continue
+        blank_lines_count = 0
+
+        first = text[0]
+        starts_with_digit = first.isdigit()
+        if first in 'Tt' and HEADER_RE.match(text):
+            continue
+
+        # Is this the start of a new hymn?
+        new_number = None
+        new_title = None
+        if 'A' <= first <= 'Z':
+            match = PREFIX_NUMBER_RE.match(text)
+            if match:
+                new_number = int(match.group(1))
+        elif starts_with_digit:
+            match = NUMBER_TITLE_RE.match(text)
+            if match:
+                new_number, new_title = int(match.group(1)), match.group(2)
+            else:
+                match = NUMBER_ONLY_RE.match(text)
+                # A bare number only starts a hymn when the current one is finished or numbered differently
+                if match:
+                    number = int(match.group(1))
+                    if hymn is None or hymn['verses'] or (hymn['number'] and number != hymn['number']):
+                        new_number = number
+
+        if new_number is not None:
+            # Save previous hymn if it has verses
+            if hymn is not None and hymn['verses']:
+                finished = _finish(hymn, verse)
+                if finished:
+                    yield finished
+            hymn = new_hymn(new_number, new_title or '')
+            number_found = True
+            title_found = new_title is not None
+            verse = None
+            verse_number = 1
+            continue
+
+        if hymn is None:
+            hymn = new_hymn()
+
+        verse_match = VERSE_RE.match(text) if starts_with_digit else None
+
+        # The first non-verse line is the title; failing that, the start of the first verse
+        if not title_found:
+            title_found = True
+            if not verse_match:
+                hymn['title'] = text
+                continue
+            verse_text = text[verse_match.end():]
+            hymn['title'] = verse_text[:50].strip()
+            if len(verse_text) > 50:
+                hymn['title'] += '...'
+
+        chorus_match = CHORUS_RE.match(text) if not verse_match and first in 'CcRr' else None
+        if verse_match:
+            if verse:
+                hymn['verses'].append(verse)
+            verse_number = int(verse_match.group(1))
+            verse = {
+                'verse_number': verse_number,
+                'is_chorus': False,
+                'text': text[verse_match.end():],
+                'order': verse_number
+            }
+        elif chorus_match:
+            if verse:
+                hymn['verses'].append(verse)
+            verse = {
+                'verse_number': verse_number,
+                'is_chorus': True,
+                'text': text[chorus_match.end():],
+                'order': verse_number + 100  # Put chorus after verses
+            }
+        elif verse:
+            # Continue current verse
+            verse['text'] += '\n' + text
+        else:
+            # New verse without number
+            verse = {
+                'verse_number': verse_number,
+                'is_chorus': False,
+                'text': text,
+                'order': verse_number
+            }
+            verse_number += 1
+
+    finished = _finish(hymn, verse)
+    if finished:
+        yield finished
+
+
+def collect_hymns(hymns):
+    """
+    Materialise ``iter_hymns`` output in the shape the upload code expects: a
+    single hymn dict when there is one hymn (or an empty one when there are
+    none), otherwise a list.
+    """
+    all_hymns = list(hymns)
+    if not all_hymns:
+        return new_hymn()
+    if len(all_hymns) == 1:
+        return all_hymns[0]
+    return all_hymns
+
+
+def iter_text_lines(file, encoding='utf-8', chunk_size=TEXT_CHUNK_SIZE):
+    """
+    Yield the lines of a binary file split on '\\n', decoding it incrementally
+    a chunk at a time. Yields exactly what ``file.read().decode().split('\\n')``
+    would, including a final empty line after a trailing newline.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    while True:
+        chunk = file.read(chunk_size)
+        pending += decoder.decode(chunk or b'', final=not chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        yield from lines
+        if not chunk:
+            break
+    yield pending
+
+
+def _decoded_chunks(file, encoding, chunk_size):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = file.read(chunk_size)
+        yield decoder.decode(chunk or b'', final=not chunk)
+        if not chunk:
+            return
+
+
+def iter_json_items(file, encoding='utf-8-sig', chunk_size=TEXT_CHUNK_SIZE):
+    """
+    Yield the items of a JSON array from a binary file, decoding one item at a
+    time so only the current item is held in memory. A document that isn't an
+    array is yielded as a single item.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _decoded_chunks(file, encoding, chunk_size)
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer = buffer[position:] + chunk
+            position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if position >= len(buffer) or buffer[position] != '[':
+        # Not an array: decode the whole document
+        while not eof:
+            fill()
+        yield json.loads(buffer[position:])
+        return
+    position += 1
+
+    # 'first': an item or "]"; 'item': an item (after a comma); 'next': "," or "]"
+    expecting = 'first'
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ValueError('Invalid JSON: unterminated array')
+        char = buffer[position]
+        if char == ']' and expecting != 'item':
+            return
+        if expecting == 'next':
+            if char != ',':
+                raise ValueError(f'Invalid JSON: expected "," or "]" but found {char!r}')
+            position += 1
+            expecting = 'item'
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f'Invalid JSON: {e.msg}')
+            fill()
+            continue
+        if not eof and (end == len(buffer) or buffer[end] not in JSON_DELIMITERS):
+            # A number may continue in the next chunk ("-25" of "-25.0")
+            fill()
+            continue
+        yield item
+        position = end
+        expecting = 'next'
+
+
+def iter_json_lines(file, encoding='utf-8-sig', chunk_size=TEXT_CHUNK_SIZE):
+    """Yield the value on each non-blank line of a JSON Lines file"""
+    for line_number, line in enumerate(iter_text_lines(file, encoding, chunk_size), 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON on line {line_number}: {e.msg}')
+
+
+def _document_part_name(package):
+    """Name of the main document part, from the package relationships"""
+    try:
+        relationships = ET.fromstring(package.read('_rels/.rels'))
+    except KeyError:
+        return 'word/document.xml'
+    for relationship in relationships:
+        if relationship.get('Type') == OFFICE_DOCUMENT_REL:
+            return relationship.get('Target').lstrip('/')
+    return 'word/document.xml'
+
+
+def _paragraph_text(paragraph):
+    """Text of a w:p element, read the same way as python-docx's Paragraph.text"""
+    parts = []
+    for child in paragraph:
+        if child.tag == W_R:
+            runs = (child,)
+        elif child.tag == W_HYPERLINK:
+            runs = child.iterfind(W_R)
+        else:
+            continue
+        for run in runs:
+            for item in run:
+                tag = item.tag
+                if tag == W_T:
+                    parts.append(item.text or '')
+                elif tag == W_BR:
+                    # Page and column breaks have no text
+                    if item.get(W_TYPE, 'textWrapping') == 'textWrapping':
+                        parts.append('\n')
+                elif tag in RUN_TEXT:
+                    parts.append(RUN_TEXT[tag])
+    return ''.join(parts)
+
+
+def iter_docx_paragraphs(file):
+    """
+    Yield the text of each body paragraph of a Word document.
+
+    ``word/document.xml`` is parsed incrementally straight from the zip, and each
+    top-level block is discarded once read, so memory use doesn't grow with the
+    size of the document. Like python-docx's ``Document.paragraphs``, paragraphs
+    inside tables, text boxes and tracked insertions are not included.
+    """
+    with zipfile.ZipFile(file) as package:
+        with package.open(_document_part_name(package)) as document:
+            body = None
+            depth = 0
+            for event, element in ET.iterparse(document, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 2 and element.tag == W_BODY:
+                        body = element
+                    continue
+                depth -= 1
+                if depth == 2 and body is not None:
+                    # A top-level block of the body is complete
+                    if element.tag == W_P:
+                        yield _paragraph_text(element)
+                    body.clear()
+
+
+def parse_word_document(file):
+    """Parse Word document and extract hymn data - supports multiple hymns in one document"""
+    try:
+        return collect_hymns(iter_hymns(iter_docx_paragraphs(file)))
+    except Exception as e:
+        raise Exception(f"Error parsing Word document: {str(e)}")
+
+
+def parse_text_file(file):
+    """Parse plain text file and extract hymn data - supports multiple hymns in one document"""
+    try:
+        # Reset file pointer in case it was read before
+        file.seek(0)
+        return collect_hymns(iter_hymns(iter_text_lines(file)))
+    except Exception as e:
+        raise Exception(f"Error parsing text file: {str(e)}")
+
+
+def _open_upload(content):
+    """A binary file for ``content``: a local path (streamed from disk) or bytes"""
+    if isinstance(content, (str, os.PathLike)):
+        return open(content, 'rb')
+    return io.BytesIO(content)
+
+
+def parse_upload(name, content):
+    """
+    Parse an uploaded Word/text file named ``name``, given as a local path
+    (opened and streamed here, so a worker process reads its own file) or as
+    bytes. Returns ``(hymns, error)``: the list of hymn dicts, or the error
+    message if the file couldn't be parsed.
+    """
+    file_extension = name.split('.')[-1].lower()
+    try:
+        if file_extension in ['docx', 'doc']:
+            with _open_upload(content) as f:
+                parsed_data = parse_word_document(f)
+        elif file_extension in ['txt', 'text']:
+            with _open_upload(content) as f:
+                parsed_data = parse_text_file(f)
+        else:
+            raise ValueError(f'Unsupported file format: {file_extension}')
+    except Exception as e:
+        return [], str(e)
+    # Handle both single hymn and list of hymns
+    return (parsed_data if isinstance(parsed_data, list) else [parsed_data]), None
+
+
+def _pool_context():
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def parse_files(files, workers=1):
+    """
+    Parse ``(name, path or bytes)`` pairs with ``parse_upload``, spread over up to
+    ``workers`` processes, and yield their ``(hymns, error)`` results in the
+    order of ``files``. Parses in this process when there is a single file or
+    worker, or when this process can't have children (a daemonic process such
+    as a Celery prefork worker; run those with --pool=threads or solo).
+
+    The processes are started by a forkserver (spawn where there is none),
+    never forked from this one: a threaded Celery worker or web server may be
+    holding locks (logging, the import lock, a database driver's) in other
+    threads, and forked children would inherit them locked.
+    """
+    files = list(files)
+    workers = min(workers, len(files))
+    if workers > 1 and multiprocessing.current_process().daemon:
+        logger.warning(
+            'Parsing %d files in this process instead of %d worker processes: daemonic processes '
+            "can't have children (run the Celery worker with --pool=threads or solo)",
+            len(files), workers,
+        )
+        workers = 1
+    if workers <= 1:
+        for name, content in files:
+            yield parse_upload(name, content)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+        yield from executor.map(parse_upload, *zip(*files))
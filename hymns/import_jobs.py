@@ -0,0 +1,545 @@
+"""
+Background import jobs for admin uploads.
+
+The admin upload views validate the form, persist the uploaded files to storage
+and create an ImportJob; the hymns.tasks.run_import_job Celery task then parses
+and writes them here, committing every IMPORT_CHUNK_SIZE items and recording
+progress and messages on the job for the admin to poll. Word/text files are
+parsed in parallel across IMPORT_PARSE_WORKERS processes before anything is
+written.
+
+Sheet music and audio uploads resolve every filename's hymn in one query,
+copy the files to their final storage paths concurrently (hymns.media_ingest)
+and create the rows in bulk, a chunk at a time.
+
+Denomination hymn uploads can also be run as a dry run, which only plans the
+import and stores a report of the changes on the job; apply_preview() then
+imports the same files as a single transaction.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .importers import HymnalImport, normalize_verses
+from .media_ingest import copy_files, hymn_id_from_filename, save_files
+from .models import Category, Author, Denomination, Hymn, SheetMusic, AudioFile, ImportJob
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _save_uploads(directory, uploads):
+    """Persist ``(name, content)`` uploads under the import prefix concurrently; returns the job's file records"""
+    paths = save_files([
+        (f'{settings.IMPORT_UPLOAD_PREFIX}/{directory}/{os.path.basename(name)}', content)
+        for name, content in uploads
+    ])
+    for path in paths:
+        if isinstance(path, Exception):
+            raise path
+    return [{'name': name, 'path': path} for (name, content), path in zip(uploads, paths)]
+
+
+def create_import_job(kind, user=None, files=(), options=None, text=None, text_name='upload.json'):
+    """
+    Persist uploaded files (and/or pasted text) and queue an ImportJob for them.
+    The task is sent once the surrounding transaction commits.
+    """
+    from config.celery import check_task_queue
+    from .tasks import run_import_job
+
+    check_task_queue()
+    directory = uuid.uuid4().hex
+    stored = _save_uploads(directory, [(uploaded.name, uploaded) for uploaded in files])
+    if text:
+        stored.append({**_save_uploads(directory, [(text_name, ContentFile(text.encode('utf-8')))])[0], 'pasted': True})
+
+    job = ImportJob.objects.create(
+        kind=kind,
+        options=options or {},
+        files=stored,
+        total=len(stored),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    transaction.on_commit(lambda: run_import_job.delay(job.pk))
+    logger.info(f'Queued import job {job.pk} ({kind}, {len(stored)} files)')
+    return job
+
+
+def _finished_preview(job_id):
+    """Lock a dry-run job whose changes haven't been applied or discarded yet"""
+    job = ImportJob.objects.select_for_update().get(pk=job_id)
+    if not (job.is_dry_run and job.status == ImportJob.STATUS_SUCCEEDED and job.report):
+        raise ValueError(f'Import job {job.pk} is not a finished dry run')
+    if job.report.get('applied_job') or job.report.get('discarded'):
+        raise ValueError(f'Import job {job.pk} has already been applied or discarded')
+    return job
+
+
+@transaction.atomic
+def apply_preview(job_id, user=None):
+    """Queue a real import of a dry run's files with the same options, written in one transaction"""
+    from config.celery import check_task_queue
+    from .tasks import run_import_job
+
+    check_task_queue()
+    preview = _finished_preview(job_id)
+    job = ImportJob.objects.create(
+        kind=preview.kind,
+        options={**preview.options, 'dry_run': False, 'preview_job': preview.pk},
+        files=preview.files,
+        total=len(preview.files),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    preview.report['applied_job'] = job.pk
+    preview.save(update_fields=['report', 'updated_at'])
+    transaction.on_commit(lambda: run_import_job.delay(job.pk))
+    logger.info(f'Queued import job {job.pk} to apply dry run {preview.pk}')
+    return job
+
+
+@transaction.atomic
+def discard_preview(job_id):
+    """Drop a dry run without applying it, deleting its stored files"""
+    preview = _finished_preview(job_id)
+    preview.report['discarded'] = True
+    preview.save(update_fields=['report', 'updated_at'])
+    _delete_files(preview)
+    return preview
+
+
+def _delete_files(job):
+    for upload in job.files:
+        default_storage.delete(upload['path'])
+
+
+def run_job(job_id):
+    """Run a pending job to completion, recording success or failure on it"""
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.STATUS_PENDING).update(
+        status=ImportJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        logger.warning(f'Import job {job_id} is not pending, skipping')
+        return
+    job = ImportJob.objects.get(pk=job_id)
+
+    try:
+        RUNNERS[job.kind](job)
+        job.status = ImportJob.STATUS_SUCCEEDED
+    except Exception as e:
+        logger.exception(f'Import job {job.pk} failed')
+        job.status = ImportJob.STATUS_FAILED
+        job.error = str(e)
+        job.add_message('error', f'Import stopped after {job.processed} of {job.total} items: {str(e)}')
+    finally:
+        job.finished_at = timezone.now()
+        job.save()
+        # A successful dry run keeps its files until it is applied or discarded
+        if not (job.is_dry_run and job.status == ImportJob.STATUS_SUCCEEDED):
+            _delete_files(job)
+
+    logger.info(
+        f'Import job {job.pk} {job.status}: {job.created_count} created, {job.error_count} errors '
+        f'in {(job.finished_at - job.started_at).total_seconds():.1f}s'
+    )
+
+
+def _save_progress(job):
+    job.save(update_fields=['total', 'processed', 'created_count', 'error_count', 'messages', 'updated_at'])
+
+
+def _storage_progress(job):
+    """Callback counting stored files into job.processed, saved at most once a second"""
+    start = job.processed
+    last_saved = time.monotonic()
+
+    def progress(done):
+        nonlocal last_saved
+        job.processed = start + done
+        if time.monotonic() - last_saved >= 1:
+            _save_progress(job)
+            last_saved = time.monotonic()
+
+    return progress
+
+
+def _parse_uploads(uploads):
+    """
+    Parse stored Word/text uploads, IMPORT_PARSE_WORKERS files at a time, and
+    yield ``(upload, hymns, error)`` in upload order. The parser gets each
+    file's local path and streams it, so no upload is held in memory whole.
+    """
+    # The parser and its process pool are only needed by import jobs, not on every worker boot
+    from .hymnal_parser import parse_files
+
+    with tempfile.TemporaryDirectory(prefix='hymns-import-') as directory:
+        files = []
+        for index, upload in enumerate(uploads):
+            try:
+                path = default_storage.path(upload['path'])
+            except NotImplementedError:
+                path = None
+            if path is None or not os.path.isfile(path):
+                # Not on the local disk (S3): stream it to a local file for the parser
+                path = os.path.join(directory, f'{index}-{os.path.basename(upload["path"])}')
+                with default_storage.open(upload['path'], 'rb') as source, open(path, 'wb') as f:
+                    shutil.copyfileobj(source, f)
+            files.append((upload['name'], path))
+        results = parse_files(files, workers=settings.IMPORT_PARSE_WORKERS)
+        for upload, (hymns, error) in zip(uploads, results):
+            yield upload, hymns, error
+
+
+def _hymnal_import(job):
+    options = job.options
+    return HymnalImport(
+        Denomination.objects.get(pk=options['denomination']),
+        options.get('hymn_period') or None,
+        category=Category.objects.get(pk=options['category']) if options.get('category') else None,
+        author=Author.objects.get(pk=options['author']) if options.get('author') else None,
+        is_premium=options.get('is_premium', False),
+        start_number=options.get('start_number') or None,
+    )
+
+
+def _import_hymns_in_chunks(job, importer, hymns_data, skip_empty=True, chunk_size=None):
+    """Plan and apply ``hymns_data`` one chunk (and one transaction) at a time"""
+    job.total = len(hymns_data)
+    job.processed = 0
+    _save_progress(job)
+    for chunk in _chunks(hymns_data, chunk_size or settings.IMPORT_CHUNK_SIZE):
+        plan = importer.plan(chunk, skip_empty=skip_empty)
+        importer.apply(plan)
+        importer.start_number = plan.next_number
+        job.messages.extend([level, text] for level, text in plan.messages)
+        job.created_count += plan.created_count
+        job.error_count += plan.error_count
+        job.processed += len(chunk)
+        _save_progress(job)
+
+
+def _preview_hymns(job, importer, hymns_data, skip_empty=True):
+    """Plan ``hymns_data`` as a whole and record the report, without writing anything"""
+    job.total = len(hymns_data)
+    plan = importer.plan(hymns_data, skip_empty=skip_empty)
+    job.report = plan.report()
+    job.messages.extend([level, text] for level, text in plan.messages)
+    job.error_count += plan.error_count
+    job.processed = len(hymns_data)
+    job.add_message('info', 'Dry run: nothing was written. Review the changes below, then apply or discard them.')
+
+
+def _import_hymnal(job, importer, hymns_data, skip_empty=True):
+    if job.is_dry_run:
+        _preview_hymns(job, importer, hymns_data, skip_empty)
+        return
+    # Changes reviewed in a dry run are applied as a whole or not at all
+    chunk_size = len(hymns_data) if job.options.get('preview_job') else settings.IMPORT_CHUNK_SIZE
+    _import_hymns_in_chunks(job, importer, hymns_data, skip_empty, chunk_size)
+
+
+def run_denomination_hymn_files(job):
+    """Word/text files for one denomination/period (DenominationHymnAdmin bulk upload)"""
+    importer = _hymnal_import(job)
+    hymns_data = []
+    for upload, hymns, error in _parse_uploads(job.files):
+        if error:
+            job.add_message('error', f'Error processing {upload["name"]}: {error}')
+            job.error_count += 1
+        hymns_data.extend(hymns)
+    _import_hymnal(job, importer, hymns_data)
+    if not job.is_dry_run:
+        job.add_message('success', f'Successfully created {job.created_count} denomination hymns with verses. {job.error_count} errors.')
+
+
+def run_denomination_hymn_json(job):
+    """Pasted JSON for one denomination/period (DenominationHymnAdmin JSON upload)"""
+    importer = _hymnal_import(job)
+    with default_storage.open(job.files[0]['path'], 'rb') as f:
+        hymns_data = json.loads(f.read().decode('utf-8'))
+    # Convert single object to list
+    if not isinstance(hymns_data, list):
+        hymns_data = [hymns_data]
+    # Verses may be plain strings or objects
+    hymns_data = [
+        {**hymn_data, 'verses': normalize_verses(hymn_data.get('verses', []))}
+        for hymn_data in hymns_data
+    ]
+    _import_hymnal(job, importer, hymns_data, skip_empty=False)
+    if not job.is_dry_run:
+        job.add_message('success', f'Successfully created {job.created_count} denomination hymns with verses. {job.error_count} errors.')
+
+
+def run_hymn_files(job):
+    """Word/text files creating hymns only (HymnAdmin bulk upload)"""
+    options = job.options
+    category = Category.objects.get(pk=options['category']) if options.get('category') else None
+    author = Author.objects.get(pk=options['author']) if options.get('author') else None
+
+    for chunk in _chunks(job.files, settings.IMPORT_CHUNK_SIZE):
+        # Parse before opening the transaction
+        parsed = list(_parse_uploads(chunk))
+        with transaction.atomic():
+            for upload, hymns, error in parsed:
+                if error:
+                    job.add_message('error', f'Error processing {upload["name"]}: {error}')
+                    job.error_count += 1
+                    continue
+                try:
+                    for hymn_data in hymns:
+                        # Create hymn (without number - numbers are denomination-specific)
+                        hymn, created = Hymn.objects.get_or_create(
+                            title=hymn_data.get('title', 'Untitled Hymn'),
+                            defaults={
+                                'category': category,
+                                'author': author,
+                                'language': hymn_data.get('language', 'English'),
+                                'is_premium': options.get('is_premium', False),
+                            }
+                        )
+                        if created:
+                            # Verses and denomination associations are added separately
+                            job.add_message('info', f'Hymn "{hymn.title}" created. Please add denomination associations and verses manually.')
+                            job.created_count += 1
+                        else:
+                            job.add_message('warning', f'Hymn "{hymn.title}" already exists, skipped')
+                except Exception as e:
+                    job.add_message('error', f'Error processing {upload["name"]}: {str(e)}')
+                    job.error_count += 1
+        job.processed += len(chunk)
+        _save_progress(job)
+    job.add_message('success', f'Successfully created {job.created_count} hymns. {job.error_count} errors.')
+
+
+def _resolve_hymns(job, uploads, example):
+    """
+    Pair each upload with the hymn whose id is the first number in its
+    filename, looking them all up in one query. Uploads without a hymn are
+    recorded as errors, counted as processed and left out.
+    """
+    hymn_ids = [hymn_id_from_filename(upload['name']) for upload in uploads]
+    hymns = Hymn.objects.only('id', 'title').in_bulk({hymn_id for hymn_id in hymn_ids if hymn_id is not None})
+    resolved = []
+    for upload, hymn_id in zip(uploads, hymn_ids):
+        if hymn_id is None:
+            job.add_message('error', f'Could not extract hymn ID from filename: {upload["name"]}. Please use format: {example}')
+            job.error_count += 1
+        elif hymn_id not in hymns:
+            job.add_message('error', f'Hymn ID {hymn_id} not found')
+            job.error_count += 1
+        else:
+            resolved.append((upload, hymns[hymn_id]))
+    job.processed += len(uploads) - len(resolved)
+    return resolved
+
+
+def _store_media(job, pending):
+    """
+    Copy the uploads of ``(upload, instance)`` pairs to their instances' file
+    fields concurrently; returns the instances whose file was stored
+    """
+    copies = [
+        (upload['path'], instance.file.field.generate_filename(instance, upload['name']))
+        for upload, instance in pending
+    ]
+    stored = []
+    for (upload, instance), name in zip(pending, copy_files(copies, progress=_storage_progress(job))):
+        if isinstance(name, Exception):
+            job.add_message('error', f'Error processing {upload["name"]}: {str(name)}')
+            job.error_count += 1
+            continue
+        instance.file = name
+        stored.append(instance)
+    return stored
+
+
+def _discard_media(job, instances, error):
+    """Delete files copied for rows that could not be written"""
+    for instance in instances:
+        default_storage.delete(instance.file.name)
+        job.add_message('error', f'Error processing {os.path.basename(instance.file.name)}: {str(error)}')
+    job.error_count += len(instances)
+
+
+def _queue_sheet_music_pages(sheet_music_id):
+    """Render page images and count pages in their own task once the sheet music is committed"""
+    from .tasks import render_sheet_music_pages
+
+    transaction.on_commit(lambda: render_sheet_music_pages.delay(sheet_music_id))
+
+
+def run_sheet_music(job):
+    """Sheet music PDFs named by hymn id, plus hymn_id|url|thumbnail_url|page_count lines (SheetMusicAdmin)"""
+    is_premium = job.options.get('is_premium', False)
+    uploads = [upload for upload in job.files if not upload.get('pasted')]
+    url_lists = [upload for upload in job.files if upload.get('pasted')]
+
+    resolved = _resolve_hymns(job, uploads, 'hymn-{id}.pdf')
+    existing = {
+        sheet_music.hymn_id: sheet_music
+        for sheet_music in SheetMusic.objects.filter(hymn__in=[hymn for upload, hymn in resolved]).only('id', 'hymn', 'file', 'url')
+    }
+    pending = []
+    claimed = set()
+    for upload, hymn in resolved:
+        sheet_music = existing.get(hymn.pk)
+        # A second upload for the same hymn counts as an existing file
+        if hymn.pk in claimed or (sheet_music and sheet_music.file):
+            job.add_message('warning', f'Sheet music for hymn "{hymn.title}" already has a file')
+            job.processed += 1
+        elif sheet_music and sheet_music.url:
+            job.add_message('warning', f'Sheet music for hymn "{hymn.title}" already has a URL')
+            job.processed += 1
+        else:
+            # Update existing sheet music without a file, or create it
+            claimed.add(hymn.pk)
+            pending.append((upload, sheet_music or SheetMusic(hymn=hymn, page_count=1, is_premium=is_premium)))
+    _save_progress(job)
+
+    for chunk in _chunks(pending, settings.IMPORT_CHUNK_SIZE):
+        stored = _store_media(job, chunk)
+        created = [sheet_music for sheet_music in stored if sheet_music.pk is None]
+        updated = [sheet_music for sheet_music in stored if sheet_music.pk is not None]
+        try:
+            with transaction.atomic():
+                SheetMusic.objects.bulk_create(created)
+                now = timezone.now()
+                for sheet_music in updated:
+                    sheet_music.updated_at = now
+                SheetMusic.objects.bulk_update(updated, ['file', 'updated_at'])
+                for sheet_music in stored:
+                    _queue_sheet_music_pages(sheet_music.pk)
+        except DatabaseError as e:
+            _discard_media(job, stored, e)
+        else:
+            job.created_count += len(stored)
+        _save_progress(job)
+
+    for upload in url_lists:
+        with default_storage.open(upload['path'], 'rb') as f:
+            lines = f.read().decode('utf-8').split('\n')
+        for chunk in _chunks(lines, settings.IMPORT_CHUNK_SIZE):
+            with transaction.atomic():
+                for line in chunk:
+                    _import_sheet_music_url(job, line, is_premium)
+        job.processed += 1
+        _save_progress(job)
+
+    job.add_message('success', f'Successfully created/updated {job.created_count} sheet music entries. {job.error_count} errors.')
+
+
+def _import_sheet_music_url(job, line, is_premium):
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return
+    try:
+        # Parse format: hymn_id|url|thumbnail_url|page_count
+        parts = line.split('|')
+        if len(parts) < 2:
+            return
+
+        hymn_id = parts[0].strip()
+        file_url = parts[1].strip()
+        thumbnail_url = parts[2].strip() if len(parts) > 2 else ''
+        page_count = int(parts[3].strip()) if len(parts) > 3 and parts[3].strip() else 1
+
+        if not file_url.startswith('http'):
+            return  # Skip non-URL entries (handled by file upload)
+
+        try:
+            hymn = Hymn.objects.get(id=hymn_id)
+        except Hymn.DoesNotExist:
+            job.add_message('error', f'Hymn ID {hymn_id} not found')
+            job.error_count += 1
+            return
+
+        sheet_music, created = SheetMusic.objects.get_or_create(
+            hymn=hymn,
+            defaults={
+                'url': file_url,
+                'thumbnail_url': thumbnail_url if thumbnail_url.startswith('http') else None,
+                'page_count': page_count,
+                'is_premium': is_premium,
+            }
+        )
+        if created:
+            job.created_count += 1
+        elif not sheet_music.url:
+            # Update existing if no URL
+            sheet_music.url = file_url
+            if thumbnail_url.startswith('http'):
+                sheet_music.thumbnail_url = thumbnail_url
+            sheet_music.save()
+            job.created_count += 1
+        else:
+            job.add_message('warning', f'Sheet music for hymn "{hymn.title}" already has a URL')
+    except Exception as e:
+        job.add_message('error', f'Error processing line: {str(e)}')
+        job.error_count += 1
+
+
+def _queue_audio_metadata(audio_file_id):
+    """Read duration, bitrate and waveform in their own task once the audio file is committed"""
+    from .tasks import extract_audio_metadata
+
+    transaction.on_commit(lambda: extract_audio_metadata.delay(audio_file_id))
+
+
+def run_audio(job):
+    """Audio files named by hymn id for one audio type (AudioFileAdmin)"""
+    audio_type = job.options['audio_type']
+    is_premium = job.options.get('is_premium', False)
+
+    # Hymn id from filename (e.g., "101-piano.mp3" or "hymn_101_piano.mp3")
+    resolved = _resolve_hymns(job, job.files, 'hymn-{id}-{type}.mp3')
+    existing = set(
+        AudioFile.objects.filter(hymn__in=[hymn for upload, hymn in resolved], audio_type=audio_type)
+        .values_list('hymn_id', flat=True)
+    )
+    pending = []
+    for upload, hymn in resolved:
+        if hymn.pk in existing:
+            job.add_message('warning', f'Audio file for hymn "{hymn.title}" ({audio_type}) already exists')
+            job.processed += 1
+            continue
+        # A second upload for the same hymn counts as existing too
+        existing.add(hymn.pk)
+        pending.append((upload, AudioFile(hymn=hymn, audio_type=audio_type, is_premium=is_premium)))
+    _save_progress(job)
+
+    for chunk in _chunks(pending, settings.IMPORT_CHUNK_SIZE):
+        stored = _store_media(job, chunk)
+        try:
+            with transaction.atomic():
+                AudioFile.objects.bulk_create(stored)
+                for audio_file in stored:
+                    _queue_audio_metadata(audio_file.pk)
+        except DatabaseError as e:
+            _discard_media(job, stored, e)
+        else:
+            job.created_count += len(stored)
+        _save_progress(job)
+    job.add_message('success', f'Successfully uploaded {job.created_count} audio files. {job.error_count} errors.')
+
+
+RUNNERS = {
+    ImportJob.KIND_DENOMINATION_HYMN_FILES: run_denomination_hymn_files,
+    ImportJob.KIND_DENOMINATION_HYMN_JSON: run_denomination_hymn_json,
+    ImportJob.KIND_HYMN_FILES: run_hymn_files,
+    ImportJob.KIND_SHEET_MUSIC: run_sheet_music,
+    ImportJob.KIND_AUDIO: run_audio,
+}
@@ -0,0 +1,359 @@
+"""
+Bulk import of hymnal content into one denomination/period.
+
+HymnalImport works in two steps. ``plan()`` loads the book's existing numbers,
+the matching hymns and their verses up front (a handful of queries for the whole
+upload) and resolves every number conflict in memory. ``apply()`` then writes
+the plan with batched bulk inserts and a verse upsert, instead of several
+queries per hymn and per verse. Verses are compared by ``Verse.text_hash``, so
+only the hashes of existing verses are loaded and unchanged verses are skipped.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Hymn, DenominationHymn, Verse, verse_text_hash
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of values in a single ``__in`` lookup
+LOOKUP_CHUNK_SIZE = 500
+# Rows kept per section of a dry-run report
+REPORT_ROW_LIMIT = 500
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def positive_number(value, name='Number'):
+    """A hymn or verse number from parsed data ("5", 5 or 5.0) as an int, or ValueError"""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{name} must be a whole number, got {value!r}')
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a whole number, got {value!r}')
+    if number < 1:
+        raise ValueError(f'{name} must be at least 1, got {value!r}')
+    return number
+
+
+def normalize_verses(verses_data):
+    """
+    Convert JSON upload verses to verse dicts. Each item is either a plain string
+    (numbered by position) or an object with verse_number/text/is_chorus.
+    Verses without text are dropped.
+    """
+    verses = []
+    for idx, verse_item in enumerate(verses_data, 1):
+        if isinstance(verse_item, str):
+            verse_number, verse_text, is_chorus = idx, verse_item, False
+        else:
+            verse_number = verse_item.get('verse_number', idx)
+            verse_text = verse_item.get('text', '')
+            is_chorus = verse_item.get('is_chorus', False)
+        if not verse_text:
+            continue
+        verses.append({'verse_number': verse_number, 'text': verse_text, 'is_chorus': is_chorus, 'order': verse_number})
+    return verses
+
+
+class ImportPlan:
+    """Rows an import will write, and the messages to report, computed without writing anything"""
+
+    def __init__(self):
+        self.new_hymns = []
+        self.new_entries = []
+        # (entry id, old number, new number), in the order they must be applied
+        self.renumbers = []
+        # (hymn key, verse_number, is_chorus) -> Verse to insert or update
+        self.verses = {}
+        # (level, text); level is a django.contrib.messages function name
+        self.messages = []
+        self.created_count = 0
+        self.error_count = 0
+        # Auto-increment number to continue from when importing in several chunks
+        self.next_number = None
+        # What the plan changes, for dry runs
+        self.added = []  # (number, title, verse count, whether the hymn itself is new)
+        self.renumbered = []  # (title, old number, new number)
+        self.changed_verses = []  # (title, number, verse_number, is_chorus, id of the current verse or None, new text)
+        self.conflicts = []  # (title, requested number, outcome)
+        self.unchanged_count = 0
+
+    def add_message(self, level, text):
+        self.messages.append((level, text))
+
+    def report(self, limit=REPORT_ROW_LIMIT):
+        """JSON-serialisable summary of the changes, keeping the first ``limit`` rows of each section"""
+        # Current text of the changed verses that are listed
+        verse_ids = [verse_id for *_, verse_id, new_text in self.changed_verses[:limit] if verse_id is not None]
+        old_texts = Verse.objects.in_bulk(verse_ids) if verse_ids else {}
+        sections = {
+            'added': [
+                {'number': number, 'title': title, 'verses': verses, 'new_hymn': new_hymn}
+                for number, title, verses, new_hymn in self.added
+            ],
+            'renumbered': [
+                {'title': title, 'old_number': old, 'new_number': new} for title, old, new in self.renumbered
+            ],
+            'changed_verses': [
+                {'title': title, 'number': number, 'verse_number': verse_number, 'is_chorus': is_chorus,
+                 'old_text': old_texts[verse_id].text if verse_id in old_texts else None, 'new_text': new_text}
+                for title, number, verse_number, is_chorus, verse_id, new_text in self.changed_verses
+            ],
+            'conflicts': [
+                {'title': title, 'number': number, 'outcome': outcome} for title, number, outcome in self.conflicts
+            ],
+        }
+        report = {name: {'count': len(rows), 'rows': rows[:limit]} for name, rows in sections.items()}
+        report['new_hymn_count'] = len(self.new_hymns)
+        report['unchanged_count'] = self.unchanged_count
+        report['error_count'] = self.error_count
+        report['row_limit'] = limit
+        return report
+
+
+class HymnalImport:
+    """
+    Import parsed hymns into one denomination/period.
+
+    Follows the rules of the original admin uploads. Hymns are matched by title
+    and created with the given defaults. A hymn keeps the number from its data
+    unless another hymn already holds it, in which case it gets the next free
+    auto-incremented number. An existing entry is renumbered only when the new
+    number is free. Verses are matched on (verse_number, is_chorus) and their
+    text is updated when it changed.
+    """
+
+    def __init__(self, denomination, hymn_period=None, category=None, author=None,
+                 is_premium=False, start_number=None, batch_size=500):
+        DenominationHymn(denomination=denomination, hymn_period=hymn_period).clean()
+        self.denomination = denomination
+        self.hymn_period = hymn_period
+        self.category = category
+        self.author = author
+        self.is_premium = is_premium
+        self.start_number = start_number
+        self.batch_size = batch_size
+
+    def plan(self, hymns_data, skip_empty=True):
+        """
+        Work out what importing ``hymns_data`` (a list of parsed hymn dicts) would
+        write. With ``skip_empty``, hymns with neither a number nor verses are ignored.
+        """
+        started = time.perf_counter()
+        hymns_data = [
+            hymn_data for hymn_data in hymns_data
+            if hymn_data and not (skip_empty and not hymn_data.get('number') and not hymn_data.get('verses'))
+        ]
+        self._load(hymns_data)
+
+        plan = ImportPlan()
+        current_number = self.start_number or max(self.number_owners, default=0) + 1
+        for hymn_data in hymns_data:
+            try:
+                current_number = self._plan_hymn(plan, hymn_data, current_number)
+            except Exception as e:
+                plan.add_message('error', f'Error processing hymn "{hymn_data.get("title", "Untitled")}": {str(e)}')
+                plan.error_count += 1
+        plan.next_number = current_number
+
+        logger.info(
+            f'Planned import of {len(hymns_data)} hymns into {self.denomination.name} '
+            f'({self.hymn_period or "no period"}) in {time.perf_counter() - started:.2f}s'
+        )
+        return plan
+
+    @transaction.atomic
+    def apply(self, plan):
+        """Write a plan. Renumbers go before inserts so freed numbers can be reused."""
+        started = time.perf_counter()
+        Hymn.objects.bulk_create(plan.new_hymns, batch_size=self.batch_size)
+        for entry_id, old_number, new_number in plan.renumbers:
+            DenominationHymn.objects.filter(pk=entry_id).update(number=new_number, updated_at=timezone.now())
+        DenominationHymn.objects.bulk_create(plan.new_entries, batch_size=self.batch_size)
+        Verse.objects.bulk_create(
+            list(plan.verses.values()),
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['denomination_hymn', 'verse_number', 'is_chorus'],
+            update_fields=['text', 'text_hash', 'order'],
+        )
+        logger.info(
+            f'Imported {len(plan.new_hymns)} hymns, {len(plan.new_entries)} entries, '
+            f'{len(plan.renumbers)} renumbers and {len(plan.verses)} verses in {time.perf_counter() - started:.2f}s'
+        )
+
+    def run(self, hymns_data, skip_empty=True):
+        """Plan and apply in one go"""
+        plan = self.plan(hymns_data, skip_empty=skip_empty)
+        self.apply(plan)
+        return plan
+
+    def _load(self, hymns_data):
+        """Pre-load the book, the hymns named in the upload, and their verses in this book"""
+        # Hymns are keyed by id when they exist and by ('new', title) when the import creates them
+        self.number_owners = {}
+        self.entries = {}
+        for entry in DenominationHymn.objects.filter(
+            denomination=self.denomination, hymn_period=self.hymn_period
+        ).only('id', 'hymn_id', 'number'):
+            self.number_owners[entry.number] = entry.hymn_id
+            self.entries[entry.hymn_id] = entry
+
+        titles = {hymn_data.get('title', 'Untitled Hymn') for hymn_data in hymns_data}
+        self.hymns_by_title = {}
+        for chunk in _chunks(titles):
+            for hymn_id, title in Hymn.objects.filter(title__in=chunk).order_by('id').values_list('id', 'title'):
+                self.hymns_by_title.setdefault(title, hymn_id)
+        self.new_hymns = {}
+        self.taken_slugs = self._taken_slugs(titles - set(self.hymns_by_title))
+
+        # (verse_number, is_chorus) -> (verse id, text hash) per hymn key; the id is None for planned verses
+        self.verse_hashes = {}
+        entry_hymns = {
+            self.entries[hymn_id].pk: hymn_id for hymn_id in self.hymns_by_title.values() if hymn_id in self.entries
+        }
+        for chunk in _chunks(entry_hymns):
+            for entry_id, verse_number, is_chorus, verse_id, text_hash in Verse.objects.filter(
+                denomination_hymn_id__in=chunk
+            ).values_list('denomination_hymn_id', 'verse_number', 'is_chorus', 'id', 'text_hash'):
+                self.verse_hashes.setdefault(entry_hymns[entry_id], {})[(verse_number, is_chorus)] = (verse_id, text_hash)
+
+    def _taken_slugs(self, titles):
+        """Existing slugs that new hymns' slugs could collide with"""
+        bases = {slugify(title) or 'hymn' for title in titles}
+        taken = set()
+        for chunk in _chunks(bases):
+            taken.update(Hymn.objects.filter(slug__in=chunk).values_list('slug', flat=True))
+        for base in {slug for slug in taken if slug in bases}:
+            taken.update(Hymn.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True))
+        return taken
+
+    def _unique_slug(self, title):
+        base = slugify(title) or 'hymn'
+        slug, suffix = base[:200], 2
+        while slug in self.taken_slugs:
+            slug = f'{base[:200 - len(str(suffix)) - 1]}-{suffix}'
+            suffix += 1
+        self.taken_slugs.add(slug)
+        return slug
+
+    def _hymn_key(self, plan, title, hymn_data):
+        """Find the hymn with this title, or plan to create it"""
+        if title in self.hymns_by_title:
+            return self.hymns_by_title[title]
+        key = ('new', title)
+        if key not in self.new_hymns:
+            hymn = Hymn(
+                title=title,
+                slug=self._unique_slug(title),
+                category=self.category,
+                author=self.author,
+                language=hymn_data.get('language', 'English'),
+                is_premium=self.is_premium,
+            )
+            self.new_hymns[key] = hymn
+            plan.new_hymns.append(hymn)
+        return key
+
+    def _next_free_number(self, number):
+        while number in self.number_owners:
+            number += 1
+        return number
+
+    def _plan_hymn(self, plan, hymn_data, current_number):
+        """Plan one hymn and return the next auto-increment number"""
+        title = hymn_data.get('title', 'Untitled Hymn')
+        # Validate the number and verses first so bad data leaves nothing half-planned
+        hymn_number = positive_number(hymn_data['number'], 'Hymn number') if hymn_data.get('number') else current_number
+        verses = {}
+        for verse_data in hymn_data.get('verses', []):
+            verse_number = positive_number(verse_data['verse_number'], 'Verse number')
+            key = (verse_number, verse_data.get('is_chorus', False))
+            verses[key] = (verse_data['text'], verse_data.get('order', verse_number))
+
+        hymn_key = self._hymn_key(plan, title, hymn_data)
+
+        owner = self.number_owners.get(hymn_number)
+        if owner is not None and owner != hymn_key:
+            # Number conflict - use auto-increment instead
+            taken_number, hymn_number = hymn_number, self._next_free_number(current_number)
+            plan.conflicts.append((title, taken_number, f'Numbered {hymn_number} instead'))
+            plan.add_message(
+                'warning',
+                f'Hymn number {taken_number} already exists for {self.denomination.name}. '
+                f'Using auto-incremented number {hymn_number} for "{title}"'
+            )
+
+        entry = self.entries.get(hymn_key)
+        created = entry is None
+        renumbered = False
+        if created:
+            entry = DenominationHymn(denomination=self.denomination, hymn_period=self.hymn_period, number=hymn_number)
+            if isinstance(hymn_key, tuple):
+                entry.hymn = self.new_hymns[hymn_key]
+            else:
+                entry.hymn_id = hymn_key
+            self.entries[hymn_key] = entry
+            self.number_owners[hymn_number] = hymn_key
+            plan.new_entries.append(entry)
+        elif entry.number != hymn_number:
+            if hymn_number in self.number_owners:
+                plan.conflicts.append((title, hymn_number, f'Keeps number {entry.number}'))
+                plan.add_message(
+                    'warning',
+                    f'Cannot update number for "{title}" to {hymn_number} - already exists. Keeping number {entry.number}'
+                )
+            else:
+                del self.number_owners[entry.number]
+                self.number_owners[hymn_number] = hymn_key
+                if entry.pk:
+                    plan.renumbers.append((entry.pk, entry.number, hymn_number))
+                    plan.renumbered.append((title, entry.number, hymn_number))
+                    renumbered = True
+                entry.number = hymn_number
+
+        verses_added = 0
+        verses_updated = 0
+        verse_hashes = self.verse_hashes.setdefault(hymn_key, {})
+        for (verse_number, is_chorus), (text, order) in verses.items():
+            text_hash = verse_text_hash(text)
+            verse_id, existing_hash = verse_hashes.get((verse_number, is_chorus), (None, None))
+            if existing_hash is None:
+                verses_added += 1
+            elif existing_hash != text_hash:
+                verses_updated += 1
+            else:
+                continue
+            if not created:
+                plan.changed_verses.append((title, hymn_number, verse_number, is_chorus, verse_id, text))
+            verse_hashes[(verse_number, is_chorus)] = (verse_id, text_hash)
+            plan.verses[(hymn_key, verse_number, is_chorus)] = Verse(
+                denomination_hymn=entry, verse_number=verse_number, is_chorus=is_chorus,
+                text=text, text_hash=text_hash, order=order
+            )
+
+        if created:
+            plan.created_count += 1
+            plan.added.append((hymn_number, title, verses_added, isinstance(hymn_key, tuple)))
+            if verses_added > 0:
+                plan.add_message('success', f'Created "{title}" #{hymn_number} with {verses_added} verses')
+            return hymn_number + 1
+
+        if verses_added > 0:
+            plan.add_message('info', f'Denomination Hymn "{title}" #{hymn_number} already exists, but added {verses_added} new verses')
+        elif verses_updated > 0:
+            plan.add_message('info', f'Denomination Hymn "{title}" #{hymn_number} already exists, updated {verses_updated} verses')
+        else:
+            if not renumbered:
+                plan.unchanged_count += 1
+            plan.add_message('warning', f'Denomination Hymn "{title}" #{hymn_number} already exists with all verses, skipped')
+        return max(current_number, hymn_number + 1)
@@ -0,0 +1,212 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` (hymns.middleware) opens a ``RequestMetrics`` for each
+request. SQL is recorded through ``connection.execute_wrapper`` on every
+database alias, serializer time by ``TimedSerializerMixin`` and render time
+around DRF's deferred rendering. The middleware turns the result into a
+``Server-Timing`` header, a structured log line and, with PERFORMANCE_METRICS,
+into the in-process ``REGISTRY`` that ``/metrics`` renders in the Prometheus
+text format.
+
+Phases overlap: queries a serializer triggers count towards both ``sql`` and
+``serialize``.
+"""
+import contextvars
+import math
+import threading
+import time
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+# Histogram bucket upper bounds: seconds for durations, counts for queries
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestMetrics:
+    """Timings and counters for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        # Outermost serializer call in progress; nested serializers are not timed separately
+        self.serializer_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """For ``connection.execute_wrapper``: count and time every query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response=None):
+        if self.render_started is not None:
+            self.render_time += time.perf_counter() - self.render_started
+            self.render_started = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """``Server-Timing`` header value; durations in milliseconds"""
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def current_metrics():
+    """The ``RequestMetrics`` of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def start_request():
+    """Begin recording a request; returns the metrics and a token for ``end_request``"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+class TimedSerializerMixin:
+    """
+    Adds the time spent in the outermost ``to_representation`` to the current
+    request's serializer time. For ``many=True`` each item is timed and summed.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None:
+            return super().to_representation(instance)
+        outermost = not metrics.serializer_depth
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_depth -= 1
+            if outermost:
+                metrics.serialize_time += time.perf_counter() - started
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['buckets'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            label_text = _labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series['buckets']):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{_number(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {_number(series["sum"])}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """A monotonically increasing total per label set"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {_number(value)}')
+        return lines
+
+
+class MetricsRegistry:
+    """Request metrics aggregated in this process (each gunicorn worker has its own)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.duration = Histogram(
+                'hymns_http_request_duration_seconds', 'Request duration.', ('view', 'method', 'status'), DURATION_BUCKETS
+            )
+            self.queries = Histogram(
+                'hymns_http_request_sql_queries', 'SQL queries per request.', ('view',), QUERY_COUNT_BUCKETS
+            )
+            self.phase_seconds = Counter(
+                'hymns_http_request_phase_seconds_total', 'Time spent per request phase.', ('view', 'phase')
+            )
+            self.response_bytes = Counter(
+                'hymns_http_response_size_bytes_total', 'Response body bytes sent.', ('view',)
+            )
+
+    def observe(self, view, method, status, metrics, total, size):
+        with self.lock:
+            self.duration.observe((view, method, str(status)), total)
+            self.queries.observe((view,), metrics.sql_count)
+            self.phase_seconds.inc((view, 'sql'), metrics.sql_time)
+            self.phase_seconds.inc((view, 'serialize'), metrics.serialize_time)
+            self.phase_seconds.inc((view, 'render'), metrics.render_time)
+            if size is not None:
+                self.response_bytes.inc((view,), size)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            lines = []
+            for metric in (self.duration, self.queries, self.phase_seconds, self.response_bytes):
+                lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,353 @@
+"""
+HTTP load test against a running server.
+
+Worker threads loop over weighted scenarios that mimic the mobile app:
+anonymous browsing, jumps to a hymn number in a book, search, favorites and
+playlists for logged-in users, and bursts of RevenueCat webhooks. Each request
+is recorded under an endpoint label; ``summarize`` turns the recordings into
+p50/p95/p99 latency and throughput per endpoint.
+
+Scenarios pick their hymns, books and users from a catalogue built by
+``manage.py generate_catalogue`` (see ``sample_load_data``). Query counts are
+not visible over HTTP, so ``count_queries`` replays one recorded request per
+endpoint in-process and rolls it back.
+
+Run it with ``python manage.py loadtest``.
+"""
+import base64
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import ExitStack
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .catalogue import LYRIC_WORDS
+from .models import DenominationHymn, Hymn, User
+from .webhooks import REVENUECAT_WEBHOOK_SECRET
+
+API = '/api/v1'
+# Webhook subscriptions are created with this transaction id prefix and removed after the run
+WEBHOOK_TRANSACTION_PREFIX = 'loadtest-'
+WEBHOOK_BURST = 10
+PERCENTILES = (50, 95, 99)
+
+
+class LoadData:
+    """Ids the scenarios pick from, sampled from the synthetic catalogue"""
+
+    def __init__(self, hymn_ids, books, users, webhook_users):
+        self.hymn_ids = hymn_ids
+        # dicts with denomination, hymn_period, last (highest number) and count
+        self.books = books
+        # (user id, is premium, access token); filled in by the command after logging in
+        self.users = users
+        self.webhook_users = webhook_users
+
+
+def sample_load_data(prefix, user_count, seed=1, hymn_sample=5000):
+    """
+    Sample hymns, books and users from the catalogue generated with ``prefix``.
+    About a tenth of the users (at least one) receive webhooks; their premium
+    status changes during the run, so they are kept apart from the users that
+    browse favorites and playlists. Returns ``(LoadData, users to log in)``.
+    """
+    rng = random.Random(seed)
+    hymn_ids = list(Hymn.objects.filter(slug__startswith=f'{prefix}-hymn-').values_list('pk', flat=True))
+    if not hymn_ids:
+        return None, []
+    hymn_ids = sorted(rng.sample(hymn_ids, min(hymn_sample, len(hymn_ids))))
+    books = list(
+        DenominationHymn.objects.filter(hymn__slug__startswith=f'{prefix}-hymn-')
+        .values('denomination', 'hymn_period')
+        .annotate(last=Max('number'), count=Count('id'))
+        .order_by('denomination', 'hymn_period')
+    )
+    users = list(User.objects.filter(username__startswith=f'{prefix}-user-').order_by('pk')[:user_count])
+    webhook_count = max(len(users) // 10, 1) if len(users) > 1 else 0
+    login_users = users[:len(users) - webhook_count]
+    webhook_users = [user.pk for user in users[len(users) - webhook_count:]]
+    return LoadData(hymn_ids, books, [], webhook_users), login_users
+
+
+class LoadClient:
+    """
+    One keep-alive connection that records latency and status per endpoint
+    label, plus the first request per label for ``count_queries``.
+    """
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.recording = True
+        self.latencies = {}
+        self.statuses = {}
+        self.samples = {}
+
+    def request(self, label, method, path, body=None, token=None, headers=None):
+        """Send a request and return ``(status, parsed JSON or None)``; status 0 means no response"""
+        headers = {'Host': self.host, 'Accept': 'application/json', **(headers or {})}
+        payload = None
+        if body is not None:
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, self.base_path + path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            status, content = 0, b''
+        elapsed = (time.perf_counter() - started) * 1000
+
+        if self.recording:
+            self.latencies.setdefault(label, []).append(elapsed)
+            statuses = self.statuses.setdefault(label, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            self.samples.setdefault(label, (method, path, payload, headers.get('Authorization')))
+        if status and status < 400 and content:
+            try:
+                return status, json.loads(content)
+            except ValueError:
+                pass
+        return status, None
+
+    def get(self, label, path, token=None):
+        return self.request(label, 'GET', path, token=token)
+
+    def close(self):
+        self.connection.close()
+
+
+def browse(client, data, rng):
+    """Anonymous browsing: a page of hymns, one hymn, sometimes the categories"""
+    client.get('hymns: list', f'{API}/hymns/?page={rng.randint(1, 5)}')
+    client.get('hymns: detail', f'{API}/hymns/{rng.choice(data.hymn_ids)}/')
+    if rng.random() < 0.3:
+        client.get('categories: list', f'{API}/categories/')
+
+
+def number_jump(client, data, rng):
+    """Jump to a hymn number in a book, then page through the book with verses"""
+    book = rng.choice(data.books)
+    number = rng.randint(1, book['last'])
+    cursor = base64.urlsafe_b64encode(f'{number}:0'.encode('ascii')).decode('ascii')
+    params = {'denomination': book['denomination'], 'ordering': 'number', 'cursor': cursor}
+    if book['hymn_period']:
+        params['hymn_period'] = book['hymn_period']
+    client.get('hymns: number jump', f'{API}/hymns/?{urlencode(params)}')
+
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    params = {'denomination': book['denomination'], 'verses': 'hashed', 'page': rng.randint(1, max(book['count'] // page_size, 1))}
+    if book['hymn_period']:
+        params['hymn_period'] = book['hymn_period']
+    client.get('denomination-hymns: book page', f'{API}/denomination-hymns/?{urlencode(params)}')
+
+
+def search(client, data, rng):
+    client.get('hymns: search', f'{API}/hymns/?{urlencode({"search": rng.choice(LYRIC_WORDS)})}')
+
+
+def favorites(client, data, rng):
+    """List favorites; premium users also remove one and add it back"""
+    user_id, is_premium, token = rng.choice(data.users)
+    status, page = client.get('favorites: list', f'{API}/favorites/', token=token)
+    if is_premium and page and page.get('results'):
+        hymn_id = rng.choice(page['results'])['hymn']['id']
+        client.request('favorites: remove', 'DELETE', f'{API}/favorites/remove/', {'hymn_id': hymn_id}, token)
+        client.request('favorites: add', 'POST', f'{API}/favorites/', {'hymn_id': hymn_id}, token)
+
+
+def playlists(client, data, rng):
+    """List playlists, then add a hymn to one of the user's own and remove it again"""
+    user_id, is_premium, token = rng.choice(data.users)
+    status, page = client.get('playlists: list', f'{API}/playlists/', token=token)
+    own = [playlist for playlist in (page or {}).get('results', []) if playlist['user']['id'] == user_id]
+    if not own:
+        return
+    playlist = rng.choice(own)
+    in_playlist = {entry['hymn']['id'] for entry in playlist['hymns']}
+    hymn_id = rng.choice(data.hymn_ids)
+    if hymn_id in in_playlist:
+        return
+    path = f'{API}/playlists/{playlist["id"]}'
+    client.request('playlists: add hymn', 'POST', f'{path}/add_hymn/', {'hymn_id': hymn_id}, token)
+    client.request('playlists: remove hymn', 'DELETE', f'{path}/remove_hymn/', {'hymn_id': hymn_id}, token)
+
+
+def webhooks(client, data, rng):
+    """A burst of RevenueCat events sent back to back, as after an outage on their side"""
+    now_ms = int(time.time() * 1000)
+    for _ in range(WEBHOOK_BURST):
+        user_id = rng.choice(data.webhook_users)
+        event_type = rng.choice(['INITIAL_PURCHASE', 'RENEWAL', 'RENEWAL', 'CANCELLATION', 'EXPIRATION'])
+        body = json.dumps({'event': {
+            'id': f'{WEBHOOK_TRANSACTION_PREFIX}{rng.randrange(10 ** 12)}',
+            'type': event_type,
+            'app_user_id': str(user_id),
+            'product_id': 'com.novahymnal.premium.monthly',
+            'purchased_at_ms': now_ms,
+            'expires_at_ms': now_ms + 30 * 24 * 3600 * 1000,
+            'environment': 'SANDBOX',
+            'entitlement_ids': ['premium'],
+            # One subscription per user, so renewals and cancellations find it
+            'transaction_id': f'{WEBHOOK_TRANSACTION_PREFIX}{user_id}',
+            'original_transaction_id': f'{WEBHOOK_TRANSACTION_PREFIX}{user_id}',
+        }}).encode()
+        headers = {'Authorization': f'Bearer {webhook_signature(body)}'} if REVENUECAT_WEBHOOK_SECRET else None
+        client.request('webhooks: revenuecat', 'POST', f'{API}/webhooks/revenuecat/', body, headers=headers)
+
+
+def webhook_signature(body):
+    """The signature webhooks.verify_webhook_signature expects"""
+    return hmac.new(REVENUECAT_WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+# name: (scenario, default weight, needs logged-in users)
+SCENARIOS = {
+    'browse': (browse, 40, False),
+    'number-jump': (number_jump, 15, False),
+    'search': (search, 15, False),
+    'favorites': (favorites, 12, True),
+    'playlists': (playlists, 10, True),
+    'webhooks': (webhooks, 2, False),
+}
+
+
+def run_load(url, data, scenarios, duration=30, concurrency=8, warmup=5, seed=1):
+    """
+    Run ``concurrency`` closed-loop workers for ``warmup + duration`` seconds
+    and return ``(clients, measured seconds)``. Requests during the warmup are
+    not recorded.
+    """
+    names = list(scenarios)
+    weights = [scenarios[name] for name in names]
+    started = time.perf_counter()
+    record_from = started + warmup
+    stop_at = record_from + duration
+    clients = [LoadClient(url) for _ in range(concurrency)]
+    finished = []
+
+    def worker(n):
+        rng = random.Random(seed * 1000 + n)
+        client = clients[n]
+        while time.perf_counter() < stop_at:
+            client.recording = time.perf_counter() >= record_from
+            name = rng.choices(names, weights)[0]
+            SCENARIOS[name][0](client, data, rng)
+        finished.append(time.perf_counter())
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients, max(finished) - record_from
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    # The smallest value with at least pct% of the values at or below it
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def latency_stats(latencies, seconds):
+    latencies = sorted(latencies)
+    stats = {'requests': len(latencies), 'throughput_rps': round(len(latencies) / seconds, 2) if seconds else 0}
+    for pct in PERCENTILES:
+        value = percentile(latencies, pct)
+        stats[f'p{pct}_ms'] = round(value, 2) if value is not None else None
+    stats['max_ms'] = round(latencies[-1], 2) if latencies else None
+    return stats
+
+
+def summarize(clients, seconds):
+    """Per-endpoint and overall latency, throughput and error counts"""
+    latencies = {}
+    statuses = {}
+    for client in clients:
+        for label, values in client.latencies.items():
+            latencies.setdefault(label, []).extend(values)
+        for label, counts in client.statuses.items():
+            merged = statuses.setdefault(label, {})
+            for status, count in counts.items():
+                merged[status] = merged.get(status, 0) + count
+
+    endpoints = {}
+    for label in sorted(latencies):
+        endpoints[label] = {
+            **latency_stats(latencies[label], seconds),
+            'errors': sum(count for status, count in statuses[label].items() if not status or status >= 400),
+            'statuses': {str(status): count for status, count in sorted(statuses[label].items())},
+        }
+    total = latency_stats([value for values in latencies.values() for value in values], seconds)
+    total['errors'] = sum(endpoint['errors'] for endpoint in endpoints.values())
+    return {'total': total, 'endpoints': endpoints}
+
+
+def count_queries(clients):
+    """
+    Database queries per endpoint. Each client's first request per label is
+    replayed through the test client, in the order it was sent, inside one
+    transaction that is rolled back; replaying in order keeps pairs such as
+    remove-then-add valid.
+    """
+    host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '')), 'localhost').lstrip('.')
+    test_client = Client(HTTP_HOST=host, raise_request_exception=False)
+    counts = {}
+    # Replayed errors were already recorded over HTTP; don't log them a second time
+    logging.disable(logging.CRITICAL)
+    try:
+        for client in clients:
+            if not set(client.samples) - set(counts):
+                continue
+            with transaction.atomic():
+                for label, (method, path, payload, authorization) in client.samples.items():
+                    extra = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+                    with ExitStack() as stack:
+                        contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                        test_client.generic(method, path, payload or b'', content_type='application/json', **extra)
+                    counts.setdefault(label, sum(len(context) for context in contexts))
+                transaction.set_rollback(True)
+    finally:
+        logging.disable(logging.NOTSET)
+    return dict(sorted(counts.items()))
+
+
+def compare_results(baseline, current):
+    """Per-endpoint ``{'endpoint': label, key: (before, after)}`` rows for p95, throughput and queries"""
+    rows = []
+    labels = sorted(set(baseline['endpoints']) | set(current['endpoints']))
+    for label in ['total'] + labels:
+        old = baseline['total'] if label == 'total' else baseline['endpoints'].get(label)
+        new = current['total'] if label == 'total' else current['endpoints'].get(label)
+        row = {'endpoint': label}
+        for key in ('p95_ms', 'throughput_rps', 'queries'):
+            before = old.get(key) if old else None
+            after = new.get(key) if new else None
+            row[key] = (before, after)
+        rows.append(row)
+    return rows
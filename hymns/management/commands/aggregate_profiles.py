@@ -0,0 +1,106 @@
+"""
+Management command to combine request profiles into flame-graph-ready output.
+Usage: python manage.py aggregate_profiles [--dir profiles] [--view 'HymnViewSet.*'] [--by-view]
+           [--output aggregate.collapsed] [--pstats-output aggregate.prof] [--top 15]
+
+Reads the profiles ProfilingMiddleware saved under PROFILING_DIR (see
+hymns.profiling). Collapsed-stack files are summed into --output, which
+flamegraph.pl, speedscope and inferno read directly. pstats files are merged
+into --pstats-output (open it with snakeviz or ``python -m pstats``). A summary
+per view and the functions with the most samples are printed.
+"""
+import fnmatch
+import os
+import pstats
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from hymns.profiling import FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Aggregate saved request profiles per view into collapsed stacks and merged pstats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', type=str, default=str(settings.PROFILING_DIR), help='Profiles directory')
+        parser.add_argument(
+            '--view',
+            action='append',
+            help='Only views matching this pattern, e.g. "HymnViewSet.*" (repeatable)',
+        )
+        parser.add_argument(
+            '--by-view',
+            action='store_true',
+            help='Start every stack with its view name so each view gets its own tower in the flame graph',
+        )
+        parser.add_argument('--output', type=str, default='aggregate.collapsed', help='Collapsed stacks output file')
+        parser.add_argument('--pstats-output', type=str, default='aggregate.prof', help='Merged pstats output file')
+        parser.add_argument('--top', type=int, default=15, help='Functions to list by samples or cumulative time')
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        if not os.path.isdir(directory):
+            raise CommandError(f'No profiles directory at {directory}')
+        views = sorted(
+            name for name in os.listdir(directory)
+            if os.path.isdir(os.path.join(directory, name))
+            and (not options['view'] or any(fnmatch.fnmatchcase(name, pattern) for pattern in options['view']))
+        )
+
+        stacks = Counter()
+        leaves = Counter()
+        stats = None
+        for view in views:
+            view_dir = os.path.join(directory, view)
+            files = sorted(os.listdir(view_dir))
+            view_samples = 0
+            view_files = 0
+            for name in files:
+                path = os.path.join(view_dir, name)
+                if name.endswith(FORMATS['collapsed']):
+                    view_files += 1
+                    for stack, count in self._read_collapsed(path):
+                        view_samples += count
+                        stacks[f'{view};{stack}' if options['by_view'] else stack] += count
+                        leaves[stack.rsplit(';', 1)[-1]] += count
+                elif name.endswith(FORMATS['pstats']):
+                    view_files += 1
+                    if stats is None:
+                        stats = pstats.Stats(path)
+                    else:
+                        stats.add(path)
+            if view_files:
+                samples = f', {view_samples} samples' if view_samples else ''
+                self.stdout.write(f'{view}: {view_files} profiles{samples}')
+
+        if not stacks and stats is None:
+            raise CommandError(f'No profiles found in {directory}')
+
+        if stacks:
+            with open(options['output'], 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            total = sum(leaves.values())
+            self.stdout.write(self.style.SUCCESS(f'{total} samples, {len(stacks)} distinct stacks written to {options["output"]}'))
+            self.stdout.write('Functions with the most samples (self):')
+            for label, count in leaves.most_common(options['top']):
+                self.stdout.write(f'{count / total:>7.1%}  {label}')
+
+        if stats is not None:
+            stats.dump_stats(options['pstats_output'])
+            self.stdout.write(self.style.SUCCESS(f'Merged pstats written to {options["pstats_output"]}'))
+            stats.sort_stats('cumulative')
+            self.stdout.write(f'{"calls":>9} {"tottime":>9} {"cumtime":>9}  function')
+            for func in stats.fcn_list[:options['top']]:
+                _, calls, tottime, cumtime, _ = stats.stats[func]
+                filename, line, name = func
+                self.stdout.write(f'{calls:>9} {tottime:>9.3f} {cumtime:>9.3f}  {name} ({filename}:{line})')
+
+    def _read_collapsed(self, path):
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    yield stack, int(count)
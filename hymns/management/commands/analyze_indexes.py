@@ -0,0 +1,108 @@
+"""
+Management command to check index coverage for the API query mix.
+Usage: python manage.py analyze_indexes [--repeat 5] [--json before.json] [--compare before.json]
+
+Replays the querysets the list endpoints evaluate, runs EXPLAIN on each one and
+reports sequential scans and explicit sorts. Timings can be saved before a
+migration and compared afterwards to measure the effect of new indexes.
+"""
+import json
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+
+from hymns.benchmarks import endpoint_queries, time_call
+
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT = re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b', re.MULTILINE)
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)( USING)?')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|DISTINCT)')
+
+
+def analyze_plan(vendor, plan):
+    """Return (tables scanned sequentially, whether an explicit sort is needed)"""
+    if vendor == 'postgresql':
+        return sorted(set(POSTGRES_SEQ_SCAN.findall(plan))), bool(POSTGRES_SORT.search(plan))
+    if vendor == 'sqlite':
+        # "SCAN t USING INDEX ..." walks an index; a bare "SCAN t" reads the whole table
+        scans = [table for table, using in SQLITE_SCAN.findall(plan) if not using]
+        return sorted(set(scans)), bool(SQLITE_SORT.search(plan))
+    return [], False
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the endpoint query mix and report sequential scans and sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed executions per query (0 to skip timing)',
+        )
+        parser.add_argument(
+            '--json',
+            type=str,
+            help='Write results to this JSON file (e.g. before applying index migrations)',
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Compare timings against a JSON file written by a previous run',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full query plan for every query',
+        )
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options.get('compare'):
+            with open(options['compare']) as f:
+                baseline = {row['label']: row for row in json.load(f)['queries']}
+
+        results = []
+        for label, queryset in endpoint_queries():
+            alias = queryset.db or router.db_for_read(queryset.model)
+            vendor = connections[alias].vendor
+            plan = queryset.explain()
+            seq_scans, needs_sort = analyze_plan(vendor, plan)
+            row = {
+                'label': label,
+                'vendor': vendor,
+                'seq_scans': seq_scans,
+                'sort': needs_sort,
+            }
+            if options['repeat'] > 0:
+                row.update(time_call(lambda: list(queryset.all()), repeat=options['repeat']))
+            results.append(row)
+            self._report(row, baseline.get(label))
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+
+        flagged = [row for row in results if row['seq_scans']]
+        self.stdout.write('')
+        if flagged:
+            self.stdout.write(self.style.WARNING(
+                f'{len(flagged)} of {len(results)} queries use sequential scans'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {len(results)} queries are index-driven'))
+
+        if options.get('json'):
+            with open(options['json'], 'w') as f:
+                json.dump({'queries': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["json"]}'))
+
+    def _report(self, row, before=None):
+        scans = ', '.join(row['seq_scans']) or '-'
+        line = f"{row['label']:<36} seq scans: {scans:<28} sort: {'yes' if row['sort'] else 'no ':<4}"
+        if 'median_ms' in row:
+            line += f" {row['median_ms']:>9.2f} ms"
+            if before and before.get('median_ms'):
+                change = (row['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+                line += f" (before {before['median_ms']:.2f} ms, {change:+.0f}%)"
+        style = self.style.WARNING if row['seq_scans'] else self.style.SUCCESS
+        self.stdout.write(style(line))
@@ -0,0 +1,68 @@
+"""
+Management command to run a benchmark suite.
+Usage: python manage.py benchmark <suite> [--sizes 1000,5000,20000] [--repeat 5] [--json results.json]
+
+Available suites are listed in hymns.benchmarks.SUITES. Synthetic data created
+by a suite is rolled back when it finishes.
+"""
+import inspect
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hymns.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark suite and print timing results'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'suite',
+            choices=sorted(SUITES),
+            help='Benchmark suite to run',
+        )
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            help='Comma-separated catalogue sizes (number of hymns), for suites that scale with size',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed executions per measurement',
+        )
+        parser.add_argument(
+            '--json',
+            type=str,
+            help='Write raw results to this JSON file',
+        )
+
+    def handle(self, *args, **options):
+        suite = SUITES[options['suite']]
+        parameters = inspect.signature(suite).parameters
+        kwargs = {}
+        if 'repeat' in parameters:
+            kwargs['repeat'] = options['repeat']
+        if options.get('sizes'):
+            if 'sizes' not in parameters:
+                raise CommandError(f'Suite {options["suite"]} does not take --sizes')
+            try:
+                kwargs['sizes'] = [int(size) for size in options['sizes'].split(',')]
+            except ValueError:
+                raise CommandError('--sizes must be a comma-separated list of integers')
+
+        self.stdout.write(self.style.SUCCESS(f'Running {options["suite"]}...'))
+        results = suite(**kwargs)
+
+        for row in results:
+            timing = {key: row[key] for key in ('min_ms', 'median_ms', 'max_ms') if key in row}
+            labels = '  '.join(f'{key}={value}' for key, value in row.items() if key not in timing)
+            stats = '  '.join(f'{key}={value:.2f}' for key, value in timing.items())
+            self.stdout.write(f'{labels:<60} {stats}')
+
+        if options.get('json'):
+            with open(options['json'], 'w') as f:
+                json.dump({'suite': options['suite'], 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["json"]}'))
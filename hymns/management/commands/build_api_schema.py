@@ -0,0 +1,36 @@
+"""
+Management command to generate the OpenAPI schema once per deploy.
+Usage: python manage.py build_api_schema [--output-dir api_schema]
+
+Writes swagger.json and swagger.yaml, each with a gzipped copy, to
+API_SCHEMA_DIR (or --output-dir). /swagger.json and /swagger.yaml serve these
+files, so API workers never introspect the views to build the schema. Run it in
+the build step, after code changes and before the workers start.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema files served at /swagger.json and /swagger.yaml'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=str(settings.API_SCHEMA_DIR),
+            help='Directory to write to (default: API_SCHEMA_DIR)',
+        )
+
+    def handle(self, *args, **options):
+        # drf_yasg is only imported here and when API_DOCS_ENABLED serves the docs
+        from hymns.api_docs import write_schema_files
+
+        started = time.perf_counter()
+        written = write_schema_files(options['output_dir'])
+        elapsed = time.perf_counter() - started
+        for path, size, compressed_size in written:
+            self.stdout.write(f'{path}: {size} bytes, {compressed_size} gzipped')
+        self.stdout.write(self.style.SUCCESS(f'API schema built in {elapsed:.1f}s'))
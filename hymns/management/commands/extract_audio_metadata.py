@@ -0,0 +1,49 @@
+"""
+Management command to fill in duration, bitrate and waveform for existing audio files.
+Usage: python manage.py extract_audio_metadata [--all] [--queue]
+
+Uploads through the admin and seed_media are processed automatically; this
+backfills files added before that, or all files with --all. With --queue the
+files are sent to the Celery workers instead of being read here.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from config.celery import check_task_queue
+
+from hymns.audio_metadata import UnsupportedAudio, update_audio_file
+from hymns.models import AudioFile
+from hymns.tasks import extract_audio_metadata
+
+
+class Command(BaseCommand):
+    help = 'Read duration, bitrate and waveform from audio file headers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-read files that already have metadata')
+        parser.add_argument('--queue', action='store_true', help='Queue a Celery task per file')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            check_task_queue()
+        audio_files = AudioFile.objects.exclude(file='').order_by('pk')
+        if not options['all']:
+            audio_files = audio_files.filter(Q(duration__isnull=True) | Q(bitrate__isnull=True) | Q(waveform__isnull=True))
+
+        done = failed = 0
+        for audio_file in audio_files.iterator():
+            if options['queue']:
+                extract_audio_metadata.delay(audio_file.pk)
+                done += 1
+                continue
+            try:
+                info = update_audio_file(audio_file)
+            except (UnsupportedAudio, OSError) as e:
+                self.stdout.write(self.style.WARNING(f'{audio_file.file.name}: {e}'))
+                failed += 1
+                continue
+            self.stdout.write(f'{audio_file.file.name}: {info.format}, {audio_file.duration}s, {audio_file.bitrate} kbps')
+            done += 1
+
+        verb = 'Queued' if options['queue'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {done} audio files ({failed} unreadable)'))
@@ -0,0 +1,88 @@
+"""
+Management command to generate a large synthetic catalogue for load and benchmark testing.
+Usage: python manage.py generate_catalogue [--hymns 100000] [--denominations 3] [--verses-per-hymn 4]
+           [--audio-ratio 0.5] [--sheet-music-ratio 0.3] [--users 1000] [--favorites-per-user 20]
+           [--playlists-per-user 2] [--notes-per-user 5] [--prefix synthetic] [--seed 1]
+           [--separate-catholic]
+
+The same options always generate the same rows. Generated users can log in with
+the password in ``hymns.catalogue.SYNTHETIC_PASSWORD``.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from hymns.catalogue import SYNTHETIC_PASSWORD, generate_catalogue
+from hymns.models import Denomination, Hymn
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic catalogue of hymns, media and users with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hymns', type=int, default=10000, help='Number of hymns')
+        parser.add_argument('--denominations', type=int, default=3, help='Number of denominations, including Catholic')
+        parser.add_argument('--verses-per-hymn', type=int, default=4, help='Verses per hymn in each book')
+        parser.add_argument('--audio-ratio', type=float, default=0.5, help='Share of hymns with audio files')
+        parser.add_argument('--sheet-music-ratio', type=float, default=0.3, help='Share of hymns with sheet music')
+        parser.add_argument('--users', type=int, default=1000, help='Number of users')
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--playlists-per-user', type=int, default=2)
+        parser.add_argument('--hymns-per-playlist', type=int, default=10)
+        parser.add_argument('--notes-per-user', type=int, default=5)
+        parser.add_argument('--prefix', type=str, default='synthetic', help='Prefix for generated names and slugs')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed')
+        parser.add_argument(
+            '--separate-catholic',
+            action='store_true',
+            help='Create a prefixed Catholic-style book instead of appending to the "catholic" denomination',
+        )
+
+    def handle(self, *args, **options):
+        if options['hymns'] < 1 or options['denominations'] < 1:
+            raise CommandError('--hymns and --denominations must be at least 1')
+        prefix = slugify(options['prefix'])
+        if not prefix:
+            raise CommandError('--prefix must contain letters or digits')
+        if Hymn.objects.filter(slug__startswith=f'{prefix}-hymn-').exists():
+            raise CommandError(f'A catalogue with prefix "{prefix}" already exists; choose another --prefix')
+
+        catholic = None
+        if not options['separate_catholic']:
+            catholic, created = Denomination.objects.get_or_create(slug='catholic', defaults={'name': 'Catholic'})
+            if created:
+                self.stdout.write('Created denomination: Catholic')
+
+        started = time.perf_counter()
+
+        def progress(label, done, total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{done}/{total} {label} ({elapsed:.1f}s)')
+
+        with transaction.atomic():
+            catalogue = generate_catalogue(
+                options['hymns'],
+                denomination_count=options['denominations'],
+                verses_per_hymn=options['verses_per_hymn'],
+                audio_ratio=options['audio_ratio'],
+                sheet_music_ratio=options['sheet_music_ratio'],
+                user_count=options['users'],
+                favorites_per_user=options['favorites_per_user'],
+                playlists_per_user=options['playlists_per_user'],
+                hymns_per_playlist=options['hymns_per_playlist'],
+                notes_per_user=options['notes_per_user'],
+                prefix=prefix,
+                catholic=catholic,
+                seed=options['seed'],
+                progress=progress,
+            )
+
+        elapsed = time.perf_counter() - started
+        for denomination in catalogue.denominations:
+            self.stdout.write(f'Denomination: {denomination.name} (id {denomination.pk})')
+        counts = ', '.join(f'{count} {model}' for model, count in catalogue.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Generated in {elapsed:.1f}s: {counts}'))
+        if options['users']:
+            self.stdout.write(f'Users {prefix}-user-0 to {prefix}-user-{options["users"] - 1}, password "{SYNTHETIC_PASSWORD}"')
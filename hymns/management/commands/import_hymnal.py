@@ -0,0 +1,227 @@
+"""
+Management command to import a hymnal file into one denomination/period.
+Usage: python manage.py import_hymnal <file> --denomination catholic [--hymn-period new]
+           [--format json|jsonl|docx|txt] [--batch-size 500] [--start-number 1]
+           [--category Worship] [--author "John Newton"] [--premium]
+       python manage.py import_hymnal --resume <job id>
+
+The file is read as a stream and written in batches. Each batch is committed
+together with the progress of the command's ImportJob, so an interrupted import
+can be resumed from the last committed batch.
+"""
+import itertools
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from hymns.hymnal_parser import iter_docx_paragraphs, iter_hymns, iter_json_items, iter_json_lines, iter_text_lines
+from hymns.importers import HymnalImport, normalize_verses
+from hymns.models import Author, Category, Denomination, ImportJob
+
+FORMATS = {
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.docx': 'docx',
+    '.txt': 'txt',
+    '.text': 'txt',
+}
+
+
+def iter_hymnal(file, file_format):
+    """Hymn dicts from an open binary hymnal file, read as a stream"""
+    if file_format == 'docx':
+        return iter_hymns(iter_docx_paragraphs(file))
+    if file_format == 'txt':
+        return iter_hymns(iter_text_lines(file))
+    items = iter_json_items(file) if file_format == 'json' else iter_json_lines(file)
+    return _json_hymns(items)
+
+
+def _json_hymns(items):
+    for index, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise ValueError(f'Hymn {index} is not a JSON object')
+        # Verses may be plain strings or objects
+        yield {**item, 'verses': normalize_verses(item.get('verses', []))}
+
+
+class Command(BaseCommand):
+    help = 'Import a JSON, JSON Lines, Word or text hymnal into a denomination in committed batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Hymnal file to import')
+        parser.add_argument('--denomination', type=str, help='Denomination slug or id')
+        parser.add_argument('--hymn-period', choices=['new', 'old'], help='Hymn period (Catholic only)')
+        parser.add_argument(
+            '--format',
+            choices=sorted(set(FORMATS.values())),
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Hymns written per transaction')
+        parser.add_argument('--start-number', type=int, help='Number for the first hymn without one')
+        parser.add_argument('--category', type=str, help='Category name for new hymns')
+        parser.add_argument('--author', type=str, help='Author name for new hymns')
+        parser.add_argument('--premium', action='store_true', help='Mark new hymns as premium')
+        parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Resume an interrupted import job')
+
+    def handle(self, *args, **options):
+        job = self._resume_job(options['resume']) if options['resume'] else self._create_job(options)
+        job_options = job.options
+        try:
+            importer = HymnalImport(
+                Denomination.objects.get(pk=job_options['denomination']),
+                job_options['hymn_period'],
+                category=Category.objects.get(pk=job_options['category']) if job_options['category'] else None,
+                author=Author.objects.get(pk=job_options['author']) if job_options['author'] else None,
+                is_premium=job_options['is_premium'],
+                start_number=job_options.get('next_number') or job_options['start_number'],
+            )
+        except ValidationError as e:
+            self._fail(job, ' '.join(e.messages))
+            raise CommandError(' '.join(e.messages))
+
+        if job.processed:
+            self.stdout.write(f'Resuming import job {job.pk} after {job.processed} committed hymns')
+        else:
+            self.stdout.write(f'Import job {job.pk}: importing {job_options["path"]}')
+
+        started = time.perf_counter()
+        imported = 0
+        try:
+            with open(job_options['path'], 'rb') as f:
+                # Hymns already committed by an earlier run are parsed again but skipped
+                hymns = itertools.islice(iter_hymnal(f, job_options['format']), job.processed, None)
+                while True:
+                    batch = list(itertools.islice(hymns, job_options['batch_size']))
+                    if not batch:
+                        break
+                    plan = importer.plan(batch, skip_empty=job_options['format'] != 'json')
+                    with transaction.atomic():
+                        importer.apply(plan)
+                        self._record_batch(job, plan, len(batch))
+                    importer.start_number = plan.next_number
+                    imported += len(batch)
+                    self._report(plan, options['verbosity'])
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'{job.processed} hymns committed ({imported / elapsed:.0f} hymns/sec)')
+        except KeyboardInterrupt:
+            self._fail(job, 'Interrupted')
+            raise CommandError(
+                f'Interrupted after {job.processed} committed hymns. '
+                f'Resume with: python manage.py import_hymnal --resume {job.pk}'
+            )
+        except Exception as e:
+            self._fail(job, str(e))
+            raise CommandError(
+                f'{e}\n{job.processed} hymns were committed. '
+                f'Resume with: python manage.py import_hymnal --resume {job.pk}'
+            )
+
+        elapsed = time.perf_counter() - started
+        job.status = ImportJob.STATUS_SUCCEEDED
+        job.total = job.processed
+        job.finished_at = timezone.now()
+        job.add_message(
+            'success', f'Successfully created {job.created_count} denomination hymns with verses. {job.error_count} errors.'
+        )
+        job.save()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} hymns in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} hymns/sec). '
+            f'Import job {job.pk}: {job.processed} hymns, {job.created_count} created, {job.error_count} errors'
+        ))
+
+    def _create_job(self, options):
+        path = options['path']
+        if not path or not options['denomination']:
+            raise CommandError('A file and --denomination are required (or --resume JOB_ID)')
+        if not os.path.isfile(path):
+            raise CommandError(f'File not found: {path}')
+        file_format = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if not file_format:
+            raise CommandError(f'Unknown file format for {path}; pass --format')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        lookup = {'pk': options['denomination']} if options['denomination'].isdigit() else {'slug': options['denomination']}
+        try:
+            denomination = Denomination.objects.get(**lookup)
+        except Denomination.DoesNotExist:
+            raise CommandError(f'Denomination not found: {options["denomination"]}')
+        category = author = None
+        try:
+            if options['category']:
+                category = Category.objects.get(name=options['category'])
+            if options['author']:
+                author = Author.objects.filter(name=options['author']).earliest('id')
+        except (Category.DoesNotExist, Author.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        return ImportJob.objects.create(
+            kind=ImportJob.KIND_HYMNAL_FILE,
+            status=ImportJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            options={
+                'path': os.path.abspath(path),
+                'format': file_format,
+                'denomination': denomination.pk,
+                'hymn_period': options['hymn_period'],
+                'category': category.pk if category else None,
+                'author': author.pk if author else None,
+                'is_premium': options['premium'],
+                'start_number': options['start_number'],
+                'batch_size': options['batch_size'],
+                # Auto-increment number to continue from, saved with each batch
+                'next_number': None,
+            },
+            files=[{'name': os.path.basename(path), 'path': os.path.abspath(path)}],
+        )
+
+    def _resume_job(self, job_id):
+        try:
+            job = ImportJob.objects.get(pk=job_id, kind=ImportJob.KIND_HYMNAL_FILE)
+        except ImportJob.DoesNotExist:
+            raise CommandError(f'No import_hymnal job with id {job_id}')
+        if job.status == ImportJob.STATUS_SUCCEEDED:
+            raise CommandError(f'Import job {job.pk} has already finished')
+        if job.status == ImportJob.STATUS_RUNNING:
+            self.stdout.write(self.style.WARNING(
+                f'Import job {job.pk} is marked as running; make sure no other import_hymnal is working on it'
+            ))
+        job.status = ImportJob.STATUS_RUNNING
+        job.error = ''
+        job.finished_at = None
+        job.save()
+        return job
+
+    def _record_batch(self, job, plan, count):
+        """Save progress in the batch's transaction, so it always matches what was committed"""
+        job.processed += count
+        job.created_count += plan.created_count
+        job.error_count += plan.error_count
+        # Per-hymn success messages would grow the job without bound on large files
+        job.messages.extend([level, text] for level, text in plan.messages if level in ('warning', 'error'))
+        job.options['next_number'] = plan.next_number
+        job.save(update_fields=['processed', 'created_count', 'error_count', 'messages', 'options', 'updated_at'])
+
+    def _report(self, plan, verbosity):
+        for level, text in plan.messages:
+            if level == 'error':
+                self.stdout.write(self.style.ERROR(text))
+            elif level == 'warning' and verbosity >= 2:
+                self.stdout.write(self.style.WARNING(text))
+            elif verbosity >= 3:
+                self.stdout.write(text)
+
+    def _fail(self, job, error):
+        # Drop counts from a batch that was rolled back
+        job.refresh_from_db(fields=['processed', 'created_count', 'error_count', 'messages', 'options'])
+        job.status = ImportJob.STATUS_FAILED
+        job.error = error
+        job.finished_at = timezone.now()
+        job.add_message('error', f'Import stopped after {job.processed} committed hymns: {error}')
+        job.save()
@@ -0,0 +1,128 @@
+"""
+Management command to measure and check worker startup import time.
+Usage: python manage.py importtime [--module config.wsgi] [--repeat 5] [--top 20]
+           [--budget-ms 1500] [--no-urls] [--json results.json]
+
+Imports --module (and by default the URLconf, which gunicorn workers load on
+their first request) in fresh interpreters. Reports the median wall time and,
+from a ``python -X importtime`` run, the import time per top-level package.
+Exits with an error when the median exceeds --budget-ms or when a module that
+should only load on demand (LAZY_MODULES, plus drf_yasg without
+API_DOCS_ENABLED) was imported, so it can run as a CI check.
+"""
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Loaded by the code that needs them (import jobs, Celery tasks), never on boot
+LAZY_MODULES = ('celery', 'hymns.hymnal_parser', 'concurrent.futures.process')
+
+CHILD_SCRIPT = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+started = time.perf_counter()
+import {module}
+if {load_urls!r}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+\d+ \| *(\S+)')
+
+
+class Command(BaseCommand):
+    help = 'Measure startup import time of the WSGI application and check it against a budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', type=str, default='config.wsgi', help='Module a worker imports on boot')
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters to time')
+        parser.add_argument('--top', type=int, default=20, help='Slowest top-level packages to list')
+        parser.add_argument(
+            '--budget-ms',
+            type=float,
+            default=settings.IMPORT_TIME_BUDGET_MS,
+            help='Fail when the median import time exceeds this (default: IMPORT_TIME_BUDGET_MS; 0 to skip)',
+        )
+        parser.add_argument('--no-urls', action='store_true', help='Do not load the URLconf after the module')
+        parser.add_argument('--json', type=str, help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        script = CHILD_SCRIPT.format(
+            settings_module=settings.SETTINGS_MODULE,
+            module=options['module'],
+            load_urls=not options['no_urls'],
+        )
+
+        runs = [self._run(script) for _ in range(options['repeat'])]
+        median_ms = statistics.median(run['seconds'] for run in runs) * 1000
+        modules = set(runs[0]['modules'])
+        packages = self._slowest_packages(script)
+
+        self.stdout.write(
+            f'{options["module"]}{"" if options["no_urls"] else " + URLconf"}: median {median_ms:.0f} ms '
+            f'over {len(runs)} runs, {len(modules)} modules loaded'
+        )
+        self.stdout.write(f'{"package":<32} {"modules":>7} {"ms":>8}')
+        for name, count, microseconds in packages[:options['top']]:
+            self.stdout.write(f'{name:<32} {count:>7} {microseconds / 1000:>8.1f}')
+
+        lazy = LAZY_MODULES if settings.API_DOCS_ENABLED else LAZY_MODULES + ('drf_yasg',)
+        loaded_lazy = sorted(name for name in lazy if name in modules)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump({
+                    'module': options['module'],
+                    'urls': not options['no_urls'],
+                    'median_ms': round(median_ms, 1),
+                    'runs_ms': [round(run['seconds'] * 1000, 1) for run in runs],
+                    'packages': [
+                        {'name': name, 'modules': count, 'ms': round(microseconds / 1000, 1)}
+                        for name, count, microseconds in packages
+                    ],
+                    'lazy_modules_loaded': loaded_lazy,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["json"]}'))
+
+        problems = []
+        if loaded_lazy:
+            problems.append(f'modules that should load on demand were imported on boot: {", ".join(loaded_lazy)}')
+        if options['budget_ms'] and median_ms > options['budget_ms']:
+            problems.append(f'median {median_ms:.0f} ms is over the {options["budget_ms"]:.0f} ms budget')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Startup import time is within budget'))
+
+    def _run(self, script, *flags):
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True
+        )
+        if result.returncode:
+            raise CommandError(f'Importing failed:\n{result.stderr.strip()}')
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        run['stderr'] = result.stderr
+        return run
+
+    def _slowest_packages(self, script):
+        """(top-level package, modules imported, microseconds) from ``-X importtime``, slowest first"""
+        run = self._run(script, '-X', 'importtime')
+        counts = {}
+        totals = {}
+        for line in run['stderr'].splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                # Self times, so time spent importing a dependency counts towards the dependency
+                package = match[2].split('.')[0]
+                counts[package] = counts.get(package, 0) + 1
+                totals[package] = totals.get(package, 0) + int(match[1])
+        return sorted(
+            ((name, counts[name], totals[name]) for name in totals), key=lambda item: item[2], reverse=True
+        )
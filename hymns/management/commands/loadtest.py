@@ -0,0 +1,222 @@
+"""
+Management command to load test the API against a synthetic catalogue.
+Usage: python manage.py loadtest [--duration 30] [--warmup 5] [--concurrency 8] [--users 50]
+           [--scenarios browse=40,search=15,...] [--prefix synthetic] [--seed 1]
+           [--url http://127.0.0.1:8000] [--port 8765] [--server-workers 2]
+           [--json results.json] [--compare baseline.json]
+
+Generate the catalogue first with ``python manage.py generate_catalogue``. Unless
+--url points at a running server, gunicorn (or runserver where gunicorn is not
+installed) is started on --port with the current settings and stopped afterwards.
+Results per endpoint: p50/p95/p99 latency, throughput, errors and database
+queries. Save them with --json and compare two runs with --compare.
+"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from hymns.catalogue import SYNTHETIC_PASSWORD
+from hymns.loadtest import (
+    API, SCENARIOS, WEBHOOK_TRANSACTION_PREFIX, LoadClient, compare_results, count_queries,
+    run_load, sample_load_data, summarize
+)
+from hymns.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = 'Drive realistic HTTP traffic at the API and report latency percentiles per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=int, default=30, help='Measured seconds')
+        parser.add_argument('--warmup', type=int, default=5, help='Seconds of unrecorded traffic first')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent virtual users')
+        parser.add_argument('--users', type=int, default=50, help='Synthetic users to log in')
+        parser.add_argument(
+            '--scenarios',
+            type=str,
+            help=f'Comma-separated scenarios, optionally name=weight (default: {", ".join(SCENARIOS)})',
+        )
+        parser.add_argument('--prefix', type=str, default='synthetic', help='Prefix given to generate_catalogue')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed')
+        parser.add_argument('--url', type=str, help='Base URL of a running server (default: start one)')
+        parser.add_argument('--port', type=int, default=8765, help='Port for the server started by this command')
+        parser.add_argument('--server-workers', type=int, help='gunicorn workers (default: gunicorn\'s own default)')
+        parser.add_argument('--json', type=str, help='Write results to this JSON file')
+        parser.add_argument('--compare', type=str, help='Compare with results from an earlier --json run')
+
+    def handle(self, *args, **options):
+        if options['duration'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--duration and --concurrency must be at least 1')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        data, login_users = sample_load_data(options['prefix'], options['users'], seed=options['seed'])
+        if data is None:
+            raise CommandError(
+                f'No catalogue with prefix "{options["prefix"]}". '
+                f'Run: python manage.py generate_catalogue --prefix {options["prefix"]}'
+            )
+        scenarios = self._scenarios(options['scenarios'], has_users=bool(login_users), has_webhook_users=bool(data.webhook_users))
+
+        server = None
+        url = options['url']
+        if not url:
+            url = f'http://127.0.0.1:{options["port"]}'
+            server = self._start_server(options['port'], options['server_workers'], url)
+        premium_state = list(
+            User.objects.filter(pk__in=data.webhook_users).values_list('pk', 'is_premium', 'premium_expires_at')
+        )
+        try:
+            data.users = self._log_in(url, login_users)
+            self.stdout.write(
+                f'Running {", ".join(f"{name}={weight:g}" for name, weight in scenarios.items())} '
+                f'with {options["concurrency"]} virtual users for {options["warmup"]}s warmup + {options["duration"]}s'
+            )
+            clients, seconds = run_load(
+                url, data, scenarios,
+                duration=options['duration'],
+                concurrency=options['concurrency'],
+                warmup=options['warmup'],
+                seed=options['seed'],
+            )
+        finally:
+            self._restore_webhook_users(premium_state)
+            if server:
+                server.terminate()
+                server.wait(timeout=10)
+
+        results = {
+            'meta': {
+                'commit': self._git_commit(),
+                'finished_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                'url': url,
+                'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+                'duration': options['duration'],
+                'warmup': options['warmup'],
+                'concurrency': options['concurrency'],
+                'users': len(data.users),
+                'scenarios': scenarios,
+                'seed': options['seed'],
+            },
+            **summarize(clients, seconds),
+        }
+        for label, queries in count_queries(clients).items():
+            results['endpoints'][label]['queries'] = queries
+        self._print_results(results)
+
+        if baseline:
+            self._print_comparison(compare_results(baseline, results), baseline['meta'].get('commit'))
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["json"]}'))
+
+    def _scenarios(self, spec, has_users, has_webhook_users):
+        scenarios = {}
+        for item in (spec.split(',') if spec else SCENARIOS):
+            name, _, weight = item.strip().partition('=')
+            if name not in SCENARIOS:
+                raise CommandError(f'Unknown scenario "{name}"; choose from {", ".join(SCENARIOS)}')
+            try:
+                scenarios[name] = float(weight) if weight else SCENARIOS[name][1]
+            except ValueError:
+                raise CommandError(f'Invalid weight for scenario "{name}": {weight}')
+        for name in list(scenarios):
+            if (SCENARIOS[name][2] and not has_users) or (name == 'webhooks' and not has_webhook_users):
+                self.stdout.write(self.style.WARNING(f'Skipping {name}: the catalogue has no synthetic users'))
+                del scenarios[name]
+        if not scenarios:
+            raise CommandError('No scenarios to run')
+        return scenarios
+
+    def _start_server(self, port, workers, url):
+        if importlib.util.find_spec('gunicorn'):
+            command = [sys.executable, '-m', 'gunicorn', 'config.wsgi:application', '--bind', f'127.0.0.1:{port}']
+            if workers:
+                command += ['--workers', str(workers)]
+        else:
+            command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+        log = tempfile.NamedTemporaryFile(prefix='loadtest-server-', suffix='.log', delete=False)
+        self.stdout.write(f'Starting {" ".join(command[1:])} (log: {log.name})')
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT, env=os.environ.copy())
+
+        client = LoadClient(url, timeout=5)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'The server exited with code {server.returncode}; see {log.name}')
+            status, _ = client.get('ready', f'{API}/categories/')
+            if status == 200:
+                client.close()
+                return server
+            time.sleep(0.5)
+        server.terminate()
+        raise CommandError(f'The server did not answer on {url} within 30 seconds; see {log.name}')
+
+    def _log_in(self, url, users):
+        """Log in through the API; returns (user id, has premium, access token) per user"""
+        client = LoadClient(url)
+        client.recording = False
+        logged_in = []
+        for user in users:
+            status, body = client.request(
+                'login', 'POST', f'{API}/auth/login/', {'username': user.username, 'password': SYNTHETIC_PASSWORD}
+            )
+            if status != 200:
+                raise CommandError(f'Could not log in as {user.username} (HTTP {status})')
+            logged_in.append((user.pk, user.has_active_premium, body['access']))
+        client.close()
+        return logged_in
+
+    def _restore_webhook_users(self, premium_state):
+        """Remove webhook subscriptions and put back the premium status they changed"""
+        Subscription.objects.filter(transaction_id__startswith=WEBHOOK_TRANSACTION_PREFIX).delete()
+        for pk, is_premium, premium_expires_at in premium_state:
+            User.objects.filter(pk=pk).update(is_premium=is_premium, premium_expires_at=premium_expires_at)
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _print_results(self, results):
+        self.stdout.write(
+            f'{"endpoint":<36} {"requests":>8} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+            f'{"errors":>6} {"queries":>7}'
+        )
+        rows = list(results['endpoints'].items()) + [('total', results['total'])]
+        for label, stats in rows:
+            self.stdout.write(
+                f'{label:<36} {stats["requests"]:>8} {stats["throughput_rps"]:>8.1f} {stats["p50_ms"]:>9.1f} '
+                f'{stats["p95_ms"]:>9.1f} {stats["p99_ms"]:>9.1f} {stats["errors"]:>6} {stats.get("queries", ""):>7}'
+            )
+        if results['total']['errors']:
+            self.stdout.write(self.style.WARNING(f'{results["total"]["errors"]} requests failed; see "statuses" in --json output'))
+
+    def _print_comparison(self, rows, baseline_commit):
+        self.stdout.write(self.style.SUCCESS(f'Compared with {baseline_commit or "baseline"}:'))
+        for row in rows:
+            changes = []
+            for key in ('p95_ms', 'throughput_rps', 'queries'):
+                before, after = row[key]
+                if before is None or after is None:
+                    continue
+                change = f' ({(after - before) / before:+.0%})' if before else ''
+                changes.append(f'{key} {before} -> {after}{change}')
+            self.stdout.write(f'{row["endpoint"]:<36} {"  ".join(changes) or "only in one run"}')
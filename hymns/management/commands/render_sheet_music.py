@@ -0,0 +1,50 @@
+"""
+Management command to render page images for existing sheet music.
+Usage: python manage.py render_sheet_music [--all] [--queue]
+
+Uploads through the admin and seed_media are rendered automatically; this
+backfills sheet music added before that, or all of it with --all (e.g. after
+changing SHEET_MUSIC_IMAGE_WIDTHS). With --queue the files are sent to the
+Celery workers instead of being rendered here.
+"""
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from config.celery import check_task_queue
+
+from hymns.models import SheetMusic
+from hymns.sheet_music_pages import render_pages
+from hymns.tasks import render_sheet_music_pages
+
+
+class Command(BaseCommand):
+    help = 'Render sheet music pages as JPEG and WebP images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render sheet music that already has page images')
+        parser.add_argument('--queue', action='store_true', help='Queue a Celery task per file')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            check_task_queue()
+        sheet_music = SheetMusic.objects.exclude(file='').order_by('pk')
+        if not options['all']:
+            sheet_music = sheet_music.filter(pages__isnull=True)
+
+        done = failed = 0
+        for item in sheet_music.iterator():
+            if options['queue']:
+                render_sheet_music_pages.delay(item.pk)
+                done += 1
+                continue
+            try:
+                pages = render_pages(item)
+            except (UnidentifiedImageError, RuntimeError, OSError) as e:
+                self.stdout.write(self.style.WARNING(f'{item.file.name}: {e}'))
+                failed += 1
+                continue
+            self.stdout.write(f'{item.file.name}: {item.page_count} pages, {len(pages)} images')
+            done += 1
+
+        verb = 'Queued' if options['queue'] else 'Rendered'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {done} sheet music files ({failed} failed)'))
@@ -1,9 +1,9 @@
 """
 Management command to seed the database with sample hymn data.
-Usage: python manage.py seed_data
+Usage: python manage.py seed_data [--denomination methodist] [--clear]
 """
-from django.core.management.base import BaseCommand
-from hymns.models import Category, Author, Hymn, Verse, SheetMusic, AudioFile
+from django.core.management.base import BaseCommand, CommandError
+from hymns.models import Category, Author, Denomination, DenominationHymn, Hymn, Verse, SheetMusic, AudioFile, verse_text_hash
 import os
 from django.conf import settings
 
@@ -17,6 +17,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing data before seeding',
         )
+        parser.add_argument(
+            '--denomination',
+            type=str,
+            default='methodist',
+            help='Slug of the denomination whose book the sample hymns are numbered and versed in',
+        )
 
     def handle(self, *args, **options):
         if options['clear']:
@@ -26,6 +32,13 @@ class Command(BaseCommand):
             Author.objects.all().delete()
             self.stdout.write(self.style.SUCCESS('Existing data cleared.'))
 
+        try:
+            denomination = Denomination.objects.get(slug=options['denomination'])
+        except Denomination.DoesNotExist:
+            raise CommandError(f'Denomination not found: {options["denomination"]}')
+        # Catholic books are split by period; the samples go in the new one
+        hymn_period = 'new' if denomination.slug == 'catholic' else None
+
         self.stdout.write(self.style.SUCCESS('Starting to seed data...'))
 
         # Create Categories
@@ -174,25 +187,35 @@ class Command(BaseCommand):
             verses_data = hymn_data.pop('verses')
             author_name = hymn_data.pop('author')
             category_name = hymn_data.pop('category')
+            # Numbers are denomination-specific
+            number = hymn_data.pop('number')
             
-            hymn, created = Hymn.objects.get_or_create(
-                number=hymn_data['number'],
+            hymn, _ = Hymn.objects.get_or_create(
+                title=hymn_data['title'],
                 defaults={
                     **hymn_data,
                     'author': authors.get(author_name),
                     'category': categories.get(category_name),
                 }
             )
+            book = DenominationHymn.objects.filter(denomination=denomination, hymn_period=hymn_period)
             
-            if created:
-                self.stdout.write(self.style.SUCCESS(f'Created hymn: {hymn.number}. {hymn.title}'))
+            if book.filter(hymn=hymn).exists():
+                self.stdout.write(self.style.WARNING(f'Hymn "{hymn.title}" already exists in {denomination.name}, skipping...'))
+            elif book.filter(number=number).exists():
+                self.stdout.write(self.style.WARNING(f'Hymn number {number} is already used in {denomination.name}, skipping "{hymn.title}"'))
+            else:
+                entry = DenominationHymn.objects.create(
+                    hymn=hymn, denomination=denomination, hymn_period=hymn_period, number=number
+                )
+                self.stdout.write(self.style.SUCCESS(f'Created hymn: {entry.number}. {hymn.title}'))
                 
                 # Create Verses
-                for verse_data in verses_data:
-                    Verse.objects.create(hymn=hymn, **verse_data)
-                    self.stdout.write(self.style.SUCCESS(f'  - Created verse {verse_data["verse_number"]}'))
-            else:
-                self.stdout.write(self.style.WARNING(f'Hymn {hymn.number} already exists, skipping...'))
+                Verse.objects.bulk_create([
+                    Verse(denomination_hymn=entry, text_hash=verse_text_hash(verse_data['text']), **verse_data)
+                    for verse_data in verses_data
+                ])
+                self.stdout.write(self.style.SUCCESS(f'  - Created {len(verses_data)} verses'))
 
         self.stdout.write(self.style.SUCCESS('\nData seeding completed!'))
         self.stdout.write(self.style.SUCCESS(f'Created {Category.objects.count()} categories'))
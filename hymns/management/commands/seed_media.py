@@ -4,6 +4,8 @@ Usage: python manage.py seed_media --hymn-id <hymn_id> --type <sheet_music|audio
 """
 from django.core.management.base import BaseCommand
 from hymns.models import Hymn, SheetMusic, AudioFile
+from hymns.tasks import extract_audio_metadata, render_sheet_music_pages
+from config.celery import check_task_queue
 import os
 from django.conf import settings
 
@@ -42,6 +44,7 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        check_task_queue()
         hymn_id = options.get('hymn_id')
         media_type = options.get('type')
         file_path = options.get('file_path')
@@ -95,6 +98,8 @@ class Command(BaseCommand):
                     File(f),
                     save=True
                 )
+        # Page images and page count (runs here with CELERY_TASK_ALWAYS_EAGER)
+        render_sheet_music_pages.delay(sheet_music.pk)
 
         if created:
             self.stdout.write(self.style.SUCCESS(f'Created sheet music for hymn {hymn.number}: {hymn.title}'))
@@ -117,6 +122,8 @@ class Command(BaseCommand):
                 File(f),
                 save=True
             )
+        # Duration, bitrate and waveform (runs here with CELERY_TASK_ALWAYS_EAGER)
+        extract_audio_metadata.delay(audio_file.pk)
 
         if created:
             self.stdout.write(self.style.SUCCESS(
@@ -0,0 +1,94 @@
+"""
+Writing media uploads to storage concurrently.
+
+Bulk sheet music and audio uploads (hymns.import_jobs) save every file under
+the import prefix when the form is submitted, then copy it to its model's
+upload_to path. ``save_files`` and ``copy_files`` do either MEDIA_UPLOAD_WORKERS
+files at a time in a thread pool. That work is spent waiting on the disk or
+the network, so threads overlap it despite the GIL. Each file is streamed in
+chunks rather than read into memory. On S3 (django-storages), each file is
+sent with boto3's managed transfer, which switches to a multipart upload for
+large files, and every thread uses its own connection. Copies on S3 are made
+inside the bucket (CopyObject), so a file is only uploaded once.
+
+The pool only touches storage. Callers write the database rows afterwards,
+in bulk, from their own thread.
+
+``hymn_id_from_filename`` reads the hymn id that bulk uploads are named by.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+_HYMN_ID = re.compile(r'\d+')
+
+
+def hymn_id_from_filename(filename):
+    """The first number in a filename ("hymn_101_piano.mp3" is hymn 101), or None"""
+    # Not the extension's: "piano.mp3" has no hymn id
+    match = _HYMN_ID.search(os.path.splitext(os.path.basename(filename))[0])
+    return int(match[0]) if match else None
+
+
+def _run_concurrently(function, items, workers=None, progress=None):
+    """
+    ``function(*item)`` for every item in a thread pool. Returns the results in
+    item order, with the exception in place of the result for items that
+    raised. ``progress(done)`` is called in the calling thread as items finish.
+    """
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=workers or settings.MEDIA_UPLOAD_WORKERS) as pool:
+        futures = {pool.submit(function, *item): index for index, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+            if progress:
+                progress(done)
+    return results
+
+
+def save_files(files, storage=None, workers=None, progress=None):
+    """
+    Save ``(name, content)`` pairs, where content is a File or an uploaded
+    file. Returns the name each was stored under (the storage may change it to
+    keep it unique), or the exception that stopped it.
+    """
+    storage = storage or default_storage
+    return _run_concurrently(storage.save, files, workers, progress)
+
+
+def _copy_object(storage, source, target):
+    """Copy within an S3 storage's bucket, without downloading the file"""
+    from storages.utils import clean_name
+
+    name = storage.get_available_name(target)
+    bucket = storage.bucket
+    bucket.Object(storage._normalize_name(clean_name(name))).copy(
+        {'Bucket': bucket.name, 'Key': storage._normalize_name(clean_name(source))},
+        Config=storage.transfer_config,
+    )
+    return name
+
+
+def copy_files(copies, storage=None, workers=None, progress=None):
+    """
+    Copy ``(source, target)`` files within a storage. Returns the name each
+    was stored under, or the exception that stopped it.
+    """
+    storage = storage or default_storage
+
+    def copy(source, target):
+        with storage.open(source, 'rb') as f:
+            return storage.save(target, File(f, name=os.path.basename(target)))
+
+    # S3Storage (django-storages) has a boto3 bucket; checked on the class so the
+    # module and its connection aren't loaded for other storages
+    if hasattr(type(storage), 'bucket'):
+        return _run_concurrently(lambda source, target: _copy_object(storage, source, target), copies, workers, progress)
+    return _run_concurrently(copy, copies, workers, progress)
@@ -0,0 +1,208 @@
+"""
+Serving media files with range requests.
+
+``serve_file`` answers ``Range`` requests with ``206 Partial Content`` (one
+range per request, which is what audio players and PDF viewers send), honours
+``If-Range`` and ``If-None-Match`` against the file's ETag, and hands the file
+to the WSGI server as a FileResponse. Gunicorn then sends the requested bytes
+with ``sendfile()`` rather than copying them through Python. Seeking in a
+recording fetches only the bytes after the new position.
+
+With MEDIA_SENDFILE_HEADER, the app only checks access and tells the front
+proxy which file to send:
+
+- ``X-Accel-Redirect`` (nginx): the file is at MEDIA_ACCEL_REDIRECT_PREFIX +
+  its storage name, an ``internal`` location aliased to MEDIA_ROOT;
+- ``X-Sendfile`` (Apache mod_xsendfile, lighttpd): its absolute path.
+
+The proxy then handles ranges itself. Files on other storages (S3 through
+django-storages) are redirected to, and the storage handles ranges.
+
+``audio_file_media`` and ``sheet_music_media`` serve an AudioFile's or
+SheetMusic's file by id. Premium files need a premium user, checked from the
+cached entitlement (hymns.entitlements).
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .entitlements import has_active_premium, request_user_id
+from .models import AudioFile, SheetMusic
+
+_BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileRange:
+    """
+    ``length`` bytes of an open file from its current position. ``fileno()`` is
+    the file's own, so Gunicorn's sendfile sends the range (Content-Length bytes
+    from the current offset) straight from the file.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    (first, last) byte of a ``Range`` header for a file of ``size`` bytes, or
+    None to send the whole file. Several ranges, other units and malformed
+    headers get the whole file too. Raises RangeNotSatisfiable.
+    """
+    match = _BYTE_RANGE.match(header.replace(' ', ''))
+    if not match or match[1] == match[2] == '':
+        return None
+    if match[1] == '':
+        # bytes=-500 is the last 500 bytes
+        suffix = int(match[2])
+        if not suffix or not size:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+    first = int(match[1])
+    last = int(match[2]) if match[2] else size - 1
+    if match[2] and last < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    return first, min(last, size - 1)
+
+
+def file_etag(file_stat):
+    return f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+
+
+def _range_applies(request, etag, last_modified):
+    """``If-Range``: only send a range of the representation the client already has part of"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Weak validators never match (RFC 9110 13.1.5)
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def storage_redirect(storage, name):
+    try:
+        url = storage.url(name, expire=getattr(settings, 'MEDIA_URL_TTL', 3600))
+    except TypeError:
+        url = storage.url(name)
+    return HttpResponseRedirect(url)
+
+
+def serve_file(request, name, storage=None):
+    """Response for a stored file: ranges, conditional requests and proxy offload"""
+    storage = storage or default_storage
+    if not isinstance(storage, FileSystemStorage):
+        return storage_redirect(storage, name)
+
+    path = storage.path(name)
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('Media file not found')
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404('Media file not found')
+
+    etag = file_etag(file_stat)
+    last_modified = int(file_stat.st_mtime)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    size = file_stat.st_size
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', '')
+    if sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        if sendfile_header.lower() == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(name)
+        else:
+            response[sendfile_header] = path
+    else:
+        requested = None
+        if request.headers.get('Range') and _range_applies(request, etag, last_modified):
+            try:
+                requested = byte_range(request.headers['Range'], size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        first, last = requested or (0, size - 1)
+        length = last - first + 1 if size else 0
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type, status=206 if requested else 200)
+        else:
+            file = open(path, 'rb')
+            if requested:
+                file.seek(first)
+                response = FileResponse(FileRange(file, length), content_type=content_type, status=206)
+            else:
+                response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = length
+        if requested:
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _serve_media(request, model, pk):
+    row = model.objects.filter(pk=pk).values_list('file', 'is_premium').first()
+    if row is None or not row[0]:
+        raise Http404('Media file not found')
+    name, is_premium = row
+    if is_premium and not has_active_premium(request_user_id(request)):
+        return JsonResponse({'detail': 'Premium subscription required to access this file'}, status=403)
+
+    response = serve_file(request, name)
+    if response.status_code == 416:
+        return response
+    if is_premium:
+        patch_cache_control(response, private=True, max_age=settings.MEDIA_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
+
+
+@require_safe
+def audio_file_media(request, pk):
+    """An AudioFile's audio, with range requests for seeking"""
+    return _serve_media(request, AudioFile, pk)
+
+
+@require_safe
+def sheet_music_media(request, pk):
+    """A SheetMusic's file"""
+    return _serve_media(request, SheetMusic, pk)
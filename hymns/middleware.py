@@ -0,0 +1,178 @@
+"""
+Custom middleware for the hymns app
+"""
+import logging
+import os
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+
+from . import instrumentation, profiling, routers
+from .query_detector import NPlusOneError, QueryRecorder
+
+performance_logger = logging.getLogger('hymns.performance')
+query_logger = logging.getLogger('hymns.queries')
+profiling_logger = logging.getLogger('hymns.profiling')
+
+PIN_COOKIE_NAME = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for the replica router.
+
+    Unsafe requests are pinned to the primary from the start. Any request that
+    writes sets a short-lived cookie so the client's following requests also read
+    from the primary until replicas have had time to catch up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pin = request.method not in SAFE_METHODS or PIN_COOKIE_NAME in request.COOKIES
+
+        with routers.pinned(pin):
+            response = self.get_response(request)
+            wrote = routers.is_pinned() and not pin
+
+        if wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+                secure=not settings.DEBUG,
+            )
+        return response
+
+
+class PerformanceMiddleware:
+    """
+    Records each request's view, SQL query count and time, serializer time,
+    render time and response size (see hymns.instrumentation).
+
+    Results go to the ``hymns.performance`` logger (INFO at or above
+    PERFORMANCE_SLOW_REQUEST_MS, DEBUG otherwise), to a ``Server-Timing``
+    header with PERFORMANCE_SERVER_TIMING, and to the ``/metrics`` histograms
+    with PERFORMANCE_METRICS. Put it first in MIDDLEWARE so it covers the rest.
+
+    A QUERY_DETECTOR_SAMPLE_RATE share of requests also goes through the N+1
+    and slow query detector (hymns.query_detector); its reports are logged at
+    WARNING on ``hymns.queries``, or raised with QUERY_DETECTOR_RAISE.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERFORMANCE_SERVER_TIMING', settings.DEBUG)
+        self.aggregate = getattr(settings, 'PERFORMANCE_METRICS', False)
+        self.slow_request_ms = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500)
+        self.detector_sample_rate = getattr(settings, 'QUERY_DETECTOR_SAMPLE_RATE', 0)
+        self.detector_raise = getattr(settings, 'QUERY_DETECTOR_RAISE', False)
+
+    def __call__(self, request):
+        metrics, token = instrumentation.start_request()
+        recorder = None
+        if self.detector_sample_rate and random.random() < self.detector_sample_rate:
+            recorder = QueryRecorder()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute_wrapper))
+                if recorder:
+                    stack.enter_context(recorder.record())
+                response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        total = metrics.elapsed()
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        size = None if response.streaming else len(response.content)
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(total)
+        if self.aggregate:
+            instrumentation.REGISTRY.observe(view, request.method, response.status_code, metrics, total, size)
+        if recorder:
+            report = recorder.report(f'{request.method} {request.path} ({view})')
+            if report:
+                query_logger.warning(report)
+                if self.detector_raise and recorder.n_plus_one():
+                    raise NPlusOneError(report)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 1),
+            'sql_queries': metrics.sql_count,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'serialize_ms': round(metrics.serialize_time * 1000, 1),
+            'render_ms': round(metrics.render_time * 1000, 1),
+            'response_bytes': size,
+        }
+        level = logging.INFO if record['duration_ms'] >= self.slow_request_ms else logging.DEBUG
+        if performance_logger.isEnabledFor(level):
+            performance_logger.log(
+                level, ' '.join(f'{key}={value}' for key, value in record.items()), extra={'performance': record}
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF responses render after the view returns; time it with a post-render callback"""
+        metrics = instrumentation.current_metrics()
+        if metrics is not None:
+            metrics.start_render()
+            response.add_post_render_callback(metrics.finish_render)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a PROFILING_SAMPLE_RATE share of requests and requests signed with
+    PROFILING_SECRET (see hymns.profiling), saving one file per request under
+    PROFILING_DIR keyed by view. Signed requests get the saved file's name back
+    in an ``X-Profile`` header. Not loaded unless one of the two is set.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.secret = getattr(settings, 'PROFILING_SECRET', '')
+        if not self.sample_rate and not self.secret:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.format = getattr(settings, 'PROFILING_FORMAT', 'collapsed')
+        if self.format not in profiling.FORMATS:
+            raise ImproperlyConfigured(f'PROFILING_FORMAT must be one of: {", ".join(profiling.FORMATS)}')
+        self.interval = getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000
+        self.directory = str(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+    def __call__(self, request):
+        signed = profiling.has_valid_signature(request, self.secret)
+        if not signed and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        profiler = profiling.RequestProfiler(self.format, self.interval)
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        try:
+            path = profiler.save(self.directory, getattr(request, 'profile_view', '<unresolved>'))
+        except OSError:
+            profiling_logger.exception('Could not save the profile of %s %s', request.method, request.path)
+            path = None
+        if signed and path:
+            response['X-Profile'] = os.path.relpath(path, self.directory)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile_view = profiling.view_key(view_func, request.method)
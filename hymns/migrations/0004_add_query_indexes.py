@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0003_seed_denominations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(fields=['category', 'title'], name='hymns_hymn_categor_307d41_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(fields=['author', 'title'], name='hymns_hymn_author__548791_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(fields=['language', 'title'], name='hymns_hymn_languag_bf6ed0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(fields=['is_premium', 'title'], name='hymns_hymn_is_prem_05d4e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['title'], name='hymn_featured_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(fields=['-created_at'], name='hymns_hymn_created_91d0da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymn',
+            index=models.Index(fields=['-view_count'], name='hymns_hymn_view_co_36e889_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymnnote',
+            index=models.Index(fields=['user', '-updated_at'], name='hymns_hymnn_user_id_d0c209_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hymnnote',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-updated_at'], name='hymnnote_public_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at'], name='playlist_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlisthymn',
+            index=models.Index(fields=['playlist', 'order', 'added_at'], name='hymns_playl_playlis_d14cd5_idx'),
+        ),
+    ]
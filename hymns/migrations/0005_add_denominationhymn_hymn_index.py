@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0004_add_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='denominationhymn',
+            index=models.Index(fields=['hymn', 'denomination', 'hymn_period'], name='hymns_denom_hymn_id_e024de_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0005_add_denominationhymn_hymn_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='denominationhymn',
+            index=models.Index(fields=['denomination', 'number', 'id'], name='dh_denomination_number_idx'),
+        ),
+    ]
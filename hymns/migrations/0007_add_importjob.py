@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0006_add_denominationhymn_number_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('denomination_hymn_files', 'Denomination hymns (Word/text files)'), ('denomination_hymn_json', 'Denomination hymns (JSON)'), ('hymn_files', 'Hymns (Word/text files)'), ('sheet_music', 'Sheet music'), ('audio', 'Audio files')], max_length=30)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('options', models.JSONField(blank=True, default=dict, help_text='Form options the upload was submitted with')),
+                ('files', models.JSONField(blank=True, default=list, help_text='Uploaded files persisted to storage: [{name, path}]')),
+                ('total', models.IntegerField(default=0, help_text='Items to process (hymns or files)')),
+                ('processed', models.IntegerField(default=0)),
+                ('created_count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('messages', models.JSONField(blank=True, default=list, help_text='[level, text] pairs reported to the admin')),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0007_add_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='report',
+            field=models.JSONField(blank=True, help_text='Changes a dry run would make (see ImportPlan.report)', null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:50
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def backfill_text_hash(apps, schema_editor):
+    """Hash existing verse text (same as hymns.models.verse_text_hash)"""
+    Verse = apps.get_model('hymns', 'Verse')
+    batch = []
+    for verse in Verse.objects.only('id', 'text').iterator(chunk_size=BATCH_SIZE):
+        verse.text_hash = hashlib.sha256(verse.text.encode('utf-8')).hexdigest()[:32]
+        batch.append(verse)
+        if len(batch) >= BATCH_SIZE:
+            Verse.objects.bulk_update(batch, ['text_hash'])
+            batch = []
+    Verse.objects.bulk_update(batch, ['text_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0008_add_importjob_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='verse',
+            name='text_hash',
+            field=models.CharField(default='', editable=False, help_text='verse_text_hash(text), kept in sync on save (bulk writes must set it)', max_length=32),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_text_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='verse',
+            name='text_hash',
+            field=models.CharField(db_index=True, editable=False, help_text='verse_text_hash(text), kept in sync on save (bulk writes must set it)', max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0009_add_verse_text_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('denomination_hymn_files', 'Denomination hymns (Word/text files)'), ('denomination_hymn_json', 'Denomination hymns (JSON)'), ('hymn_files', 'Hymns (Word/text files)'), ('sheet_music', 'Sheet music'), ('audio', 'Audio files'), ('hymnal_file', 'Hymnal file (import_hymnal command)')], max_length=30),
+        ),
+    ]
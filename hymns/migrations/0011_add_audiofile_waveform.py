@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0010_alter_importjob_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiofile',
+            name='waveform',
+            field=models.TextField(blank=True, editable=False, help_text='Base64 loudness summary, one byte (0-255) per point (see hymns.audio_metadata)', null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0011_add_audiofile_waveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quality', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium')], max_length=10)),
+                ('codec', models.CharField(help_text='e.g. aac', max_length=20)),
+                ('bitrate', models.IntegerField(help_text='Bitrate in kbps')),
+                ('file', models.FileField(upload_to='audio/renditions/%Y/%m/%d/')),
+                ('size', models.BigIntegerField(default=0, help_text='File size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('audio_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='hymns.audiofile')),
+            ],
+            options={
+                'ordering': ['audio_file', 'bitrate'],
+                'unique_together': {('audio_file', 'quality')},
+            },
+        ),
+    ]
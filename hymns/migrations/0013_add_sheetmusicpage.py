@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0012_add_audiorendition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetMusicPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('size', models.CharField(help_text='Size name from SHEET_MUSIC_IMAGE_WIDTHS, e.g. thumbnail', max_length=20)),
+                ('format', models.CharField(choices=[('jpeg', 'JPEG'), ('webp', 'WebP')], max_length=10)),
+                ('image', models.ImageField(upload_to='sheet_music/pages/%Y/%m/%d/')),
+                ('width', models.IntegerField(default=0)),
+                ('height', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sheet_music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='hymns.sheetmusic')),
+            ],
+            options={
+                'ordering': ['sheet_music', 'page_number', 'width', 'format'],
+                'unique_together': {('sheet_music', 'page_number', 'size', 'format')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 04:39
+
+import hymns.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hymns', '0013_add_sheetmusicpage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='audiorendition',
+            name='quality',
+            field=models.CharField(choices=hymns.models.rendition_quality_choices, max_length=10),
+        ),
+    ]
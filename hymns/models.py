@@ -1,3 +1,6 @@
+import hashlib
+
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
@@ -98,6 +101,10 @@ class DenominationHymn(models.Model):
         indexes = [
             models.Index(fields=['denomination', 'hymn_period', 'number']),
             models.Index(fields=['denomination', 'hymn_period']),
+            # Per-hymn lookups (EXISTS filters, denomination numbers in serializers)
+            models.Index(fields=['hymn', 'denomination', 'hymn_period']),
+            # Keyset paging by number across all of a denomination's periods
+            models.Index(fields=['denomination', 'number', 'id'], name='dh_denomination_number_idx'),
         ]
         verbose_name = "Denomination Hymn"
         verbose_name_plural = "Denomination Hymns"
@@ -157,6 +164,15 @@ class Hymn(models.Model):
         indexes = [
             models.Index(fields=['category']),
             models.Index(fields=['title']),
+            # Filter + default title ordering served from one index
+            models.Index(fields=['category', 'title']),
+            models.Index(fields=['author', 'title']),
+            models.Index(fields=['language', 'title']),
+            models.Index(fields=['is_premium', 'title']),
+            models.Index(fields=['title'], condition=models.Q(is_featured=True), name='hymn_featured_title_idx'),
+            # Alternative orderings (newest, most viewed)
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['-view_count']),
         ]
 
     def save(self, *args, **kwargs):
@@ -168,6 +184,11 @@ class Hymn(models.Model):
         return self.title
 
 
+def verse_text_hash(text):
+    """Content hash of verse text; identical lyrics have the same hash in every denomination"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
 class Verse(models.Model):
     """Verse model for hymn verses - lyrics are denomination-specific!"""
     denomination_hymn = models.ForeignKey(
@@ -179,12 +200,23 @@ class Verse(models.Model):
     verse_number = models.IntegerField(validators=[MinValueValidator(1)])
     is_chorus = models.BooleanField(default=False)
     text = models.TextField(help_text="Lyrics can vary by denomination (e.g., 'You' vs 'Thou')")
+    text_hash = models.CharField(
+        max_length=32, db_index=True, editable=False,
+        help_text="verse_text_hash(text), kept in sync on save (bulk writes must set it)"
+    )
     order = models.IntegerField(default=0, help_text="Order of verse in hymn")
     
     class Meta:
         ordering = ['order', 'verse_number']
         unique_together = ['denomination_hymn', 'verse_number', 'is_chorus']
     
+    def save(self, *args, **kwargs):
+        self.text_hash = verse_text_hash(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'text_hash'}
+        super().save(*args, **kwargs)
+    
     @property
     def hymn(self):
         """Convenience property to access the hymn"""
@@ -230,6 +262,30 @@ class SheetMusic(models.Model):
         return f"Sheet Music - {self.hymn.title}"
 
 
+class SheetMusicPage(models.Model):
+    """One page of a sheet music file rendered at one size and format (see hymns.sheet_music_pages)"""
+    FORMAT_CHOICES = [
+        ('jpeg', 'JPEG'),
+        ('webp', 'WebP'),
+    ]
+
+    sheet_music = models.ForeignKey(SheetMusic, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    size = models.CharField(max_length=20, help_text="Size name from SHEET_MUSIC_IMAGE_WIDTHS, e.g. thumbnail")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    image = models.ImageField(upload_to='sheet_music/pages/%Y/%m/%d/')
+    width = models.IntegerField(default=0)
+    height = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['sheet_music', 'page_number', 'size', 'format']
+        ordering = ['sheet_music', 'page_number', 'width', 'format']
+
+    def __str__(self):
+        return f"{self.sheet_music} - page {self.page_number} ({self.size}, {self.format})"
+
+
 class AudioFile(models.Model):
     """Audio file model for hymn audio"""
     AUDIO_TYPES = [
@@ -246,6 +302,10 @@ class AudioFile(models.Model):
     file = models.FileField(upload_to='audio/%Y/%m/%d/')
     duration = models.IntegerField(blank=True, null=True, help_text="Duration in seconds")
     bitrate = models.IntegerField(blank=True, null=True, help_text="Bitrate in kbps")
+    waveform = models.TextField(
+        blank=True, null=True, editable=False,
+        help_text="Base64 loudness summary, one byte (0-255) per point (see hymns.audio_metadata)"
+    )
     is_premium = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -258,6 +318,32 @@ class AudioFile(models.Model):
         return f"{self.hymn.title} - {self.get_audio_type_display()}"
 
 
+def rendition_quality_choices():
+    """The qualities configured in AUDIO_RENDITIONS, lowest bitrate first"""
+    qualities = sorted(settings.AUDIO_RENDITIONS.items(), key=lambda item: item[1])
+    return [(quality, quality.capitalize()) for quality, kbps in qualities]
+
+
+class AudioRendition(models.Model):
+    """Lower-bitrate encoding of an AudioFile for slow or metered connections (see hymns.renditions)"""
+    audio_file = models.ForeignKey(AudioFile, on_delete=models.CASCADE, related_name='renditions')
+    # A callable, so changing AUDIO_RENDITIONS doesn't need a migration
+    quality = models.CharField(max_length=10, choices=rendition_quality_choices)
+    codec = models.CharField(max_length=20, help_text="e.g. aac")
+    bitrate = models.IntegerField(help_text="Bitrate in kbps")
+    file = models.FileField(upload_to='audio/renditions/%Y/%m/%d/')
+    size = models.BigIntegerField(default=0, help_text="File size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['audio_file', 'quality']
+        ordering = ['audio_file', 'bitrate']
+
+    def __str__(self):
+        return f"{self.audio_file} ({self.get_quality_display()}, {self.bitrate} kbps)"
+
+
 # User and Subscription Models
 
 class User(AbstractUser):
@@ -279,6 +365,12 @@ class User(AbstractUser):
     
     def __str__(self):
         return self.username or self.email
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Media requests check premium access from a cache (see hymns.entitlements)
+        from .entitlements import forget_entitlement
+        forget_entitlement(self.pk)
     
     @property
     def has_active_premium(self):
@@ -396,6 +488,7 @@ class Playlist(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['-created_at'], condition=models.Q(is_public=True), name='playlist_public_created_idx'),
         ]
     
     def __str__(self):
@@ -412,6 +505,9 @@ class PlaylistHymn(models.Model):
     class Meta:
         unique_together = ['playlist', 'hymn']
         ordering = ['order', 'added_at']
+        indexes = [
+            models.Index(fields=['playlist', 'order', 'added_at']),
+        ]
     
     def __str__(self):
         return f"{self.playlist.name} - {self.hymn.title}"
@@ -431,6 +527,8 @@ class HymnNote(models.Model):
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['user', 'hymn']),
+            models.Index(fields=['user', '-updated_at']),
+            models.Index(fields=['-updated_at'], condition=models.Q(is_public=True), name='hymnnote_public_updated_idx'),
         ]
     
     def __str__(self):
@@ -438,3 +536,73 @@ class HymnNote(models.Model):
 
 
 
+
+
+class ImportJob(models.Model):
+    """Admin upload processed in the background (see hymns.import_jobs)"""
+    KIND_DENOMINATION_HYMN_FILES = 'denomination_hymn_files'
+    KIND_DENOMINATION_HYMN_JSON = 'denomination_hymn_json'
+    KIND_HYMN_FILES = 'hymn_files'
+    KIND_SHEET_MUSIC = 'sheet_music'
+    KIND_AUDIO = 'audio'
+    KIND_HYMNAL_FILE = 'hymnal_file'
+    KIND_CHOICES = [
+        (KIND_DENOMINATION_HYMN_FILES, 'Denomination hymns (Word/text files)'),
+        (KIND_DENOMINATION_HYMN_JSON, 'Denomination hymns (JSON)'),
+        (KIND_HYMN_FILES, 'Hymns (Word/text files)'),
+        (KIND_SHEET_MUSIC, 'Sheet music'),
+        (KIND_AUDIO, 'Audio files'),
+        (KIND_HYMNAL_FILE, 'Hymnal file (import_hymnal command)'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    options = models.JSONField(default=dict, blank=True, help_text="Form options the upload was submitted with")
+    files = models.JSONField(default=list, blank=True, help_text="Uploaded files persisted to storage: [{name, path}]")
+    total = models.IntegerField(default=0, help_text="Items to process (hymns or files)")
+    processed = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    messages = models.JSONField(default=list, blank=True, help_text="[level, text] pairs reported to the admin")
+    error = models.TextField(blank=True, default='')
+    report = models.JSONField(blank=True, null=True, help_text="Changes a dry run would make (see ImportPlan.report)")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    @property
+    def is_dry_run(self):
+        return bool(self.options.get('dry_run'))
+
+    @property
+    def progress(self):
+        """Percentage of items processed"""
+        if self.is_finished:
+            return 100
+        return int(self.processed * 100 / self.total) if self.total else 0
+
+    def add_message(self, level, text):
+        self.messages.append([level, text])
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,79 @@
+"""
+Custom pagination for the hymns API
+"""
+import base64
+import binascii
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class BookKeysetPagination(BasePagination):
+    """
+    Keyset pagination through one hymnal in book order.
+
+    Pages over a DenominationHymn queryset ordered by ``(number, id)``. Each page
+    continues from the last entry of the previous one with ``number >= n``, so
+    the (denomination, hymn_period, number) index is walked as a range scan no
+    matter how deep the client pages - unlike OFFSET, which reads and discards
+    every earlier row.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None, descending=False):
+        self.request = request
+        self.descending = descending
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('-number', '-id') if descending else queryset.order_by('number', 'id')
+        if position is not None:
+            number, entry_id = position
+            if descending:
+                queryset = queryset.filter(number__lte=number).exclude(number=number, id__gte=entry_id)
+            else:
+                queryset = queryset.filter(number__gte=number).exclude(number=number, id__lte=entry_id)
+
+        entries = list(queryset[:self.page_size + 1])
+        self.has_next = len(entries) > self.page_size
+        entries = entries[:self.page_size]
+        self.last_position = (entries[-1].number, entries[-1].id) if entries else None
+        return entries
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            number, entry_id = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split(':')
+            return int(number), int(entry_id)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(f'{position[0]}:{position[1]}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,151 @@
+"""
+Request profiling for production traffic.
+
+ProfilingMiddleware (hymns.middleware) profiles a PROFILING_SAMPLE_RATE share
+of requests, plus any request that carries a valid ``X-Profile-Signature``
+header: the hex HMAC-SHA256 of ``"<METHOD> <path>"`` keyed with
+PROFILING_SECRET, e.g.
+
+    python -c "import hmac, hashlib; print(hmac.new(b'<secret>', b'GET /api/v1/hymns/', hashlib.sha256).hexdigest())"
+
+The default ``collapsed`` format uses ``StackSampler``: a thread that reads the
+request thread's stack every PROFILING_INTERVAL_MS, so the request runs at
+full speed between samples. ``pstats`` uses cProfile instead. It is exact, but
+much slower while it runs.
+
+Profiles are written to ``PROFILING_DIR/<view>/``, where ``<view>`` is e.g.
+``HymnViewSet.list`` or ``DenominationHymnAdmin.bulk_upload_view``. Combine
+them with ``python manage.py aggregate_profiles``.
+"""
+import cProfile
+import hashlib
+import hmac
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+PROFILE_HEADER = 'X-Profile-Signature'
+FORMATS = {'collapsed': '.collapsed', 'pstats': '.prof'}
+
+_LIBRARY_DIRS = sorted({sysconfig.get_paths()['purelib'], sysconfig.get_paths()['stdlib']}, key=len, reverse=True)
+_UNSAFE_FILENAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def request_signature(secret, method, path):
+    return hmac.new(secret.encode('utf-8'), f'{method} {path}'.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def has_valid_signature(request, secret):
+    """Whether the request asks to be profiled with a valid PROFILE_HEADER"""
+    signature = request.headers.get(PROFILE_HEADER)
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(signature, request_signature(secret, request.method, request.path))
+
+
+def view_key(view_func, method):
+    """``HymnViewSet.list`` for viewset actions, the qualified function name otherwise"""
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return view_func.__qualname__
+    actions = getattr(view_func, 'actions', None)
+    action = actions.get(method.lower()) if actions else method.lower()
+    return f'{cls.__name__}.{action}'
+
+
+def frame_label(code):
+    filename = code.co_filename
+    for directory in _LIBRARY_DIRS:
+        if filename.startswith(directory):
+            filename = os.path.relpath(filename, directory)
+            break
+    else:
+        if filename.startswith(str(settings.BASE_DIR)):
+            filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f'{code.co_qualname} ({filename}:{code.co_firstlineno})'
+
+
+def collapse_stack(frame):
+    """``outermost;...;innermost`` frame labels, as flame graph tools expect"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples another thread's stack from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='hymns-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = collapse_stack(frame)
+            # Once stop() has been called the thread is only waiting for this one
+            if not self._stopped.is_set():
+                self.stacks[stack] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class RequestProfiler:
+    """Profiles the current thread in the given format until ``stop()``"""
+
+    def __init__(self, profile_format, interval):
+        self.format = profile_format
+        if profile_format == 'pstats':
+            self.profiler = cProfile.Profile()
+        else:
+            self.profiler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        if self.format == 'pstats':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        if self.format == 'pstats':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    def save(self, directory, view):
+        """Write the profile under ``directory/<view>/``; returns its path, or None without samples"""
+        if self.format == 'collapsed' and not self.profiler.stacks:
+            return None
+        view_dir = os.path.join(directory, _UNSAFE_FILENAME.sub('_', view))
+        os.makedirs(view_dir, exist_ok=True)
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{uuid.uuid4().hex[:8]}{FORMATS[self.format]}'
+        path = os.path.join(view_dir, name)
+        if self.format == 'pstats':
+            self.profiler.dump_stats(path)
+        else:
+            self.profiler.write(path)
+        return path
@@ -0,0 +1,165 @@
+"""
+N+1 and slow query detection.
+
+``QueryRecorder`` hooks ``connection.execute_wrapper`` and groups a request's
+queries by shape: the SQL with literals, placeholders and ``IN`` lists
+normalised. A shape that runs ``threshold`` times or more is an N+1 candidate.
+Each query is attributed to the innermost frame in this package that caused
+it, e.g. ``hymns/serializers.py:121 in HymnListSerializer.get_number``. If the
+query came from DRF or Django code working for one of our serializers (a
+``source='hymn.title'`` field, say), the serializer is named instead.
+
+PerformanceMiddleware records a sample of requests (QUERY_DETECTOR_SAMPLE_RATE)
+and logs a ranked report on ``hymns.queries``. In tests, use
+``detect_queries()`` to fail when a block of code has N+1 patterns:
+
+    with detect_queries(threshold=5):
+        client.get('/api/v1/favorites/')
+"""
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_PACKAGE = __name__.rpartition('.')[0]
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Our own instrumentation is never the cause of a query
+_SKIPPED_FILES = {
+    os.path.join(_PACKAGE_DIR, name) for name in ('query_detector.py', 'instrumentation.py', 'middleware.py')
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class NPlusOneError(AssertionError):
+    """Raised by ``detect_queries`` (and with QUERY_DETECTOR_RAISE) when N+1 patterns exceed the threshold"""
+
+
+def query_shape(sql):
+    """SQL with values replaced by ``?``, so the same query with other parameters has the same shape"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """Where in this package the query being executed comes from"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename in _SKIPPED_FILES:
+            frame = frame.f_back
+            continue
+        if filename.startswith(_PACKAGE_DIR):
+            return f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {code.co_qualname}'
+        if code.co_argcount and code.co_varnames[0] == 'self':
+            owner = type(frame.f_locals.get('self'))
+            if owner.__module__.startswith(f'{_PACKAGE}.'):
+                library = os.path.basename(os.path.dirname(filename))
+                return f'{owner.__qualname__}.{code.co_name} ({library}/{os.path.basename(filename)})'
+        frame = frame.f_back
+    return '<outside hymns>'
+
+
+class QueryShape:
+    """Executions of one query shape within a recording"""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.time = 0.0
+        self.params = set()
+        self.origins = {}
+
+    @property
+    def duplicates(self):
+        """Executions that repeated both the SQL and its parameters exactly"""
+        return self.count - len(self.params)
+
+
+class QueryRecorder:
+    """Records queries by shape and origin; use ``execute_wrapper`` or ``record()``"""
+
+    def __init__(self, threshold=None, slow_query_ms=None):
+        self.threshold = threshold or getattr(settings, 'QUERY_DETECTOR_THRESHOLD', 5)
+        slow_query_ms = slow_query_ms if slow_query_ms is not None else getattr(settings, 'SLOW_QUERY_MS', 100)
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.shapes = {}
+        self.slow_queries = []
+        self.count = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self._add(sql, params, time.perf_counter() - started)
+
+    def _add(self, sql, params, duration):
+        self.count += 1
+        shape = query_shape(sql)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = QueryShape(shape)
+        origin = query_origin()
+        entry.count += 1
+        entry.time += duration
+        entry.params.add(repr((sql, params)))
+        entry.origins[origin] = entry.origins.get(origin, 0) + 1
+        if duration >= self.slow_query_seconds:
+            self.slow_queries.append((duration, shape, origin))
+
+    @contextmanager
+    def record(self):
+        """Record queries on every database alias for the duration of the block"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.execute_wrapper))
+            yield self
+
+    def n_plus_one(self):
+        """Shapes executed ``threshold`` times or more, most expensive first"""
+        repeated = [entry for entry in self.shapes.values() if entry.count >= self.threshold]
+        return sorted(repeated, key=lambda entry: (entry.time, entry.count), reverse=True)
+
+    def report(self, label=''):
+        """Ranked text report of N+1 shapes and slow queries, or '' when there is nothing to report"""
+        repeated = self.n_plus_one()
+        if not repeated and not self.slow_queries:
+            return ''
+        lines = [
+            f'{label + ": " if label else ""}{self.count} queries, {len(self.shapes)} shapes, '
+            f'{len(repeated)} repeated {self.threshold}+ times, {len(self.slow_queries)} slow'
+        ]
+        for rank, entry in enumerate(repeated, 1):
+            duplicates = f', {entry.duplicates} exact duplicates' if entry.duplicates else ''
+            lines.append(f'#{rank} {entry.count}x in {entry.time * 1000:.1f}ms{duplicates}: {entry.shape}')
+            for origin, count in sorted(entry.origins.items(), key=lambda item: item[1], reverse=True):
+                lines.append(f'    {count}x {origin}')
+        for duration, shape, origin in sorted(self.slow_queries, reverse=True):
+            lines.append(f'slow {duration * 1000:.1f}ms {origin}: {shape}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect_queries(threshold=None, slow_query_ms=None, raise_on_n_plus_one=True):
+    """
+    Record the queries run inside the block. Raises NPlusOneError on exit if a
+    shape ran ``threshold`` times or more, unless ``raise_on_n_plus_one`` is False.
+    """
+    recorder = QueryRecorder(threshold=threshold, slow_query_ms=slow_query_ms)
+    with recorder.record():
+        yield recorder
+    if raise_on_n_plus_one and recorder.n_plus_one():
+        raise NPlusOneError(recorder.report('N+1 queries detected'))
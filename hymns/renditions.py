@@ -0,0 +1,114 @@
+"""
+Lower-bitrate audio renditions and choosing one per request.
+
+Every AudioFile can have an AudioRendition per quality in AUDIO_RENDITIONS
+(``low`` and ``medium`` by default, as AAC in MP4 at 48 and 96 kbps, which
+every iOS and Android player decodes). The hymns.tasks encode_audio_renditions
+task encodes them with ffmpeg after an upload's metadata has been read. A
+quality is skipped when the original isn't at least a third larger, so files
+that are already small aren't re-encoded for nothing. Without ffmpeg only the
+original is served.
+
+``select_rendition`` picks what to send:
+
+- ``?quality=low`` (any quality in AUDIO_RENDITIONS) picks that rendition, or the nearest lower one;
+  ``?quality=high`` (or ``original``) picks the original.
+- Otherwise ``Save-Data: on`` (sent by browsers and data-saver modes) picks
+  the lowest rendition.
+- Otherwise the original is sent.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import AudioRendition
+
+logger = logging.getLogger(__name__)
+
+ORIGINAL_QUALITIES = ('high', 'original')
+RENDITION_CODEC = 'aac'
+# A rendition must save at least this share of the original's bitrate to be worth keeping
+MIN_SAVING = 0.25
+
+
+def encoder_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def wanted_renditions(audio_file):
+    """(quality, kbps) to encode for an AudioFile, lowest first"""
+    qualities = sorted(settings.AUDIO_RENDITIONS.items(), key=lambda item: item[1])
+    if not audio_file.bitrate:
+        return qualities
+    return [(quality, kbps) for quality, kbps in qualities if kbps <= audio_file.bitrate * (1 - MIN_SAVING)]
+
+
+def _encode(source, target, kbps):
+    command = [
+        shutil.which('ffmpeg'), '-v', 'error', '-y', '-i', source, '-vn', '-map_metadata', '-1',
+        '-c:a', RENDITION_CODEC, '-b:a', f'{kbps}k',
+        # Mono below 64 kbps: two channels of a choir recording aren't worth the bits
+        *(['-ac', '1'] if kbps < 64 else []),
+        # moov first, so playback can start before the whole file has arrived
+        '-movflags', '+faststart', '-f', 'mp4', target,
+    ]
+    result = subprocess.run(command, capture_output=True, timeout=settings.MEDIA_TOOL_TIMEOUT)
+    if result.returncode:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or 'ffmpeg failed')
+
+
+def encode_renditions(audio_file):
+    """Encode the missing renditions of an AudioFile; returns the AudioRenditions created"""
+    if not encoder_available():
+        logger.info(f'ffmpeg is not installed; no renditions for audio file {audio_file.pk}')
+        return []
+    existing = set(audio_file.renditions.values_list('quality', flat=True))
+    wanted = [(quality, kbps) for quality, kbps in wanted_renditions(audio_file) if quality not in existing]
+    if not wanted:
+        return []
+
+    created = []
+    with tempfile.TemporaryDirectory(prefix='hymns-renditions-') as directory:
+        # ffmpeg needs a path; copy the original out of storage (S3) once for all qualities
+        source = os.path.join(directory, 'source' + os.path.splitext(audio_file.file.name)[1])
+        with audio_file.file.open('rb') as original, open(source, 'wb') as f:
+            shutil.copyfileobj(original, f)
+
+        stem = os.path.splitext(os.path.basename(audio_file.file.name))[0]
+        for quality, kbps in wanted:
+            target = os.path.join(directory, f'{stem}-{quality}.m4a')
+            _encode(source, target, kbps)
+            with open(target, 'rb') as f:
+                rendition = AudioRendition(
+                    audio_file=audio_file, quality=quality, codec=RENDITION_CODEC, bitrate=kbps,
+                    size=os.path.getsize(target),
+                )
+                rendition.file.save(os.path.basename(target), File(f), save=True)
+            created.append(rendition)
+    return created
+
+
+def select_rendition(request, audio_file):
+    """The AudioRendition to send for this request, or None for the original"""
+    quality = request.query_params.get('quality', '').lower()
+    if quality in ORIGINAL_QUALITIES:
+        return None
+    save_data = request.headers.get('Save-Data', '').lower() == 'on'
+    if not quality and not save_data:
+        return None
+
+    renditions = list(audio_file.renditions.all())  # lowest bitrate first
+    if not renditions:
+        return None
+    if not quality:
+        return renditions[0]
+    limit = settings.AUDIO_RENDITIONS.get(quality)
+    if limit is None:
+        return None
+    fitting = [rendition for rendition in renditions if rendition.bitrate <= limit]
+    return fitting[-1] if fitting else renditions[0]
@@ -0,0 +1,159 @@
+"""
+Database router that sends read-only catalogue traffic to read replicas.
+
+Catalogue models (hymns, verses, denominations, media metadata...) are read far
+more often than they are written, so their reads are spread across the replica
+aliases configured in settings (``replica_1``, ``replica_2``...). Everything
+else - users, favorites, playlists, notes, subscriptions - stays on ``default``.
+
+Read-your-writes: as soon as a request writes anything it is pinned to the
+primary for the rest of the request, and ``ReplicaPinningMiddleware`` keeps the
+client pinned for a few seconds afterwards so replica lag is never visible.
+Replicas that are lagging (or unreachable) are skipped until they catch up.
+
+Outside requests, every Celery task gets a pinning scope of its own (see
+config.celery), so one task's writes don't send the rest of the worker's
+reads to the primary. A management command is one scope: after its first
+write it reads from the primary until it exits.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_MODELS = {
+    'category', 'author', 'denomination', 'denominationhymn', 'hymn',
+    'verse', 'sheetmusic', 'audiofile',
+}
+
+_pinned = ContextVar('replica_router_pinned', default=False)
+_pin_exempt = ContextVar('replica_router_pin_exempt', default=False)
+
+_lag_cache = {}
+_lag_lock = threading.Lock()
+
+
+def replica_aliases():
+    """Database aliases configured as read replicas"""
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def pin_to_primary():
+    """Send all further reads in this request/context to the primary"""
+    if not _pin_exempt.get():
+        _pinned.set(True)
+
+
+@contextmanager
+def pinned(value=True):
+    """Set the pinning state for the duration of a block (used per request)"""
+    token = _pinned.set(value)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def begin_scope(pin=False):
+    """Start a pinning scope outside the request cycle; returns a token for end_scope"""
+    return _pinned.set(pin)
+
+
+def end_scope(token):
+    """Restore the pinning state from before begin_scope"""
+    _pinned.reset(token)
+
+
+@contextmanager
+def without_pinning():
+    """
+    Perform writes that must not pin the request to the primary, e.g. view
+    counters whose exact value is not read back by the client.
+    """
+    token = _pin_exempt.set(True)
+    try:
+        yield
+    finally:
+        _pin_exempt.reset(token)
+
+
+def _measure_lag(alias):
+    """Return replica lag in seconds, or None if the replica is unusable"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        # Local/test replicas (e.g. SQLite mirrors) have no replication lag
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+            row = cursor.fetchone()
+        return float(row[0] or 0)
+    except Exception as e:
+        logger.warning(f"Replica {alias} health check failed: {e}")
+        return None
+
+
+def replica_is_healthy(alias):
+    """Check (and cache for a short interval) whether a replica is within the lag budget"""
+    now = time.monotonic()
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+
+    with _lag_lock:
+        cached = _lag_cache.get(alias)
+    if cached and now - cached[0] < interval:
+        return cached[1]
+
+    lag = _measure_lag(alias)
+    healthy = lag is not None and lag <= max_lag
+    if lag is not None and not healthy:
+        logger.warning(f"Replica {alias} lagging by {lag:.1f}s, falling back to primary")
+    with _lag_lock:
+        _lag_cache[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    """Pick a healthy replica at random, or the primary if none is available"""
+    candidates = [alias for alias in replica_aliases() if replica_is_healthy(alias)]
+    if not candidates:
+        return DEFAULT_DB_ALIAS
+    return random.choice(candidates)
+
+
+class CatalogueReplicaRouter:
+    """Route catalogue reads to replicas and every write to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'hymns' or model._meta.model_name not in CATALOGUE_MODELS:
+            return DEFAULT_DB_ALIAS
+        if is_pinned() or not replica_aliases():
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
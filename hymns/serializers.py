@@ -2,13 +2,20 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import (
-    Category, Author, Hymn, Verse, SheetMusic, AudioFile,
+    Category, Author, Hymn, Verse, SheetMusic, SheetMusicPage, AudioFile, AudioRendition,
     User, Subscription, Favorite, Playlist, PlaylistHymn, HymnNote,
     Denomination, DenominationHymn
 )
+from .audio_metadata import decode_waveform
+from .instrumentation import TimedSerializerMixin
+from .signed_media import media_url
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class TimedModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Model serializer whose output time is recorded by PerformanceMiddleware"""
+
+
+class CategorySerializer(TimedModelSerializer):
     hymn_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -20,7 +27,7 @@ class CategorySerializer(serializers.ModelSerializer):
         return obj.hymns.count()
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(TimedModelSerializer):
     hymn_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -32,7 +39,7 @@ class AuthorSerializer(serializers.ModelSerializer):
         return obj.hymns.count()
 
 
-class DenominationSerializer(serializers.ModelSerializer):
+class DenominationSerializer(TimedModelSerializer):
     """Denomination serializer"""
     hymn_count = serializers.SerializerMethodField()
     
@@ -45,7 +52,7 @@ class DenominationSerializer(serializers.ModelSerializer):
         return obj.hymns.count()
 
 
-class DenominationHymnSerializer(serializers.ModelSerializer):
+class DenominationHymnSerializer(TimedModelSerializer):
     """DenominationHymn serializer with hymn details"""
     hymn_title = serializers.CharField(source='hymn.title', read_only=True)
     denomination_name = serializers.CharField(source='denomination.name', read_only=True)
@@ -60,18 +67,29 @@ class DenominationHymnSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
     
     def get_verses(self, obj):
-        verses = obj.verses.all().order_by('order', 'verse_number')
+        # Verse ordering is ('order', 'verse_number'), so prefetched verses are already in order
+        verses = obj.verses.all()
+        if self.context.get('hashed_verses'):
+            return HashedVerseSerializer(verses, many=True).data
         return VerseSerializer(verses, many=True).data
 
 
-class VerseSerializer(serializers.ModelSerializer):
+class VerseSerializer(TimedModelSerializer):
+    class Meta:
+        model = Verse
+        fields = ['id', 'verse_number', 'is_chorus', 'text', 'text_hash', 'order']
+        read_only_fields = ['id', 'text_hash']
+
+
+class HashedVerseSerializer(TimedModelSerializer):
+    """Verse without its text; the text is sent once per response, keyed by text_hash"""
     class Meta:
         model = Verse
-        fields = ['id', 'verse_number', 'is_chorus', 'text', 'order']
-        read_only_fields = ['id']
+        fields = ['id', 'verse_number', 'is_chorus', 'text_hash', 'order']
+        read_only_fields = fields
 
 
-class HymnListSerializer(serializers.ModelSerializer):
+class HymnListSerializer(TimedModelSerializer):
     """Lightweight serializer for list views"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     author_name = serializers.CharField(source='author.name', read_only=True)
@@ -90,6 +108,10 @@ class HymnListSerializer(serializers.ModelSerializer):
     
     def get_number(self, obj):
         """Get denomination-specific number if denomination is provided in context"""
+        # Annotated by HymnViewSet when listing a single denomination
+        number = getattr(obj, 'denomination_number', None)
+        if number is not None:
+            return number
         request = self.context.get('request')
         if request:
             denomination_id = request.query_params.get('denomination')
@@ -122,7 +144,7 @@ class HymnListSerializer(serializers.ModelSerializer):
         ]
 
 
-class HymnDetailSerializer(serializers.ModelSerializer):
+class HymnDetailSerializer(TimedModelSerializer):
     """Detailed serializer for hymn detail view"""
     verses = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -210,12 +232,9 @@ class HymnDetailSerializer(serializers.ModelSerializer):
                 # Check if URL is provided (external link)
                 if sheet_music.url:
                     return sheet_music.url
-                # Otherwise use file URL
+                # Otherwise use file URL, signed for premium sheet music
                 if sheet_music.file:
-                    request = self.context.get('request')
-                    if request:
-                        return request.build_absolute_uri(sheet_music.file.url)
-                    return sheet_music.file.url
+                    return media_url(sheet_music.file, self.context.get('request'), signed=sheet_music.is_premium)
         except SheetMusic.DoesNotExist:
             pass
         return None
@@ -227,12 +246,9 @@ class HymnDetailSerializer(serializers.ModelSerializer):
                 # Check if thumbnail URL is provided (external link)
                 if sheet_music.thumbnail_url:
                     return sheet_music.thumbnail_url
-                # Otherwise use file thumbnail
+                # Otherwise use file thumbnail, signed for premium sheet music
                 if sheet_music.thumbnail:
-                    request = self.context.get('request')
-                    if request:
-                        return request.build_absolute_uri(sheet_music.thumbnail.url)
-                    return sheet_music.thumbnail.url
+                    return media_url(sheet_music.thumbnail, self.context.get('request'), signed=sheet_music.is_premium)
         except SheetMusic.DoesNotExist:
             pass
         return None
@@ -244,78 +260,113 @@ class HymnDetailSerializer(serializers.ModelSerializer):
         
         for audio_file in audio_files:
             if audio_file.file:
-                url = request.build_absolute_uri(audio_file.file.url) if request else audio_file.file.url
-                audio_urls[audio_file.audio_type] = url
+                audio_urls[audio_file.audio_type] = media_url(audio_file.file, request, signed=audio_file.is_premium)
         
         return audio_urls if audio_urls else None
 
 
-class SheetMusicSerializer(serializers.ModelSerializer):
+class SheetMusicSerializer(TimedModelSerializer):
     hymn_title = serializers.CharField(source='hymn.title', read_only=True)
     hymn_number = serializers.IntegerField(source='hymn.number', read_only=True)
     file_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
     url = serializers.URLField(required=False, allow_blank=True, help_text="External URL for sheet music")
+    pages = serializers.SerializerMethodField()
 
     class Meta:
         model = SheetMusic
         fields = [
             'id', 'hymn', 'hymn_title', 'hymn_number', 'file', 'url', 'file_url',
-            'thumbnail', 'thumbnail_url', 'page_count', 'is_premium',
+            'thumbnail', 'thumbnail_url', 'page_count', 'pages', 'is_premium',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        # Stored files are only linked through file_url/thumbnail_url, which sign premium media
+        extra_kwargs = {'file': {'write_only': True}, 'thumbnail': {'write_only': True}}
+
+    def get_pages(self, obj):
+        """
+        Rendered page images in page order:
+        [{"page": 1, "images": {"thumbnail": {"width", "height", "jpeg", "webp"}, ...}}, ...]
+        """
+        request = self.context.get('request')
+        pages = {}
+        for page in obj.pages.all():
+            images = pages.setdefault(page.page_number, {})
+            image = images.setdefault(page.size, {'width': page.width, 'height': page.height})
+            image[page.format] = media_url(page.image, request, signed=obj.is_premium)
+        return [{'page': number, 'images': images} for number, images in sorted(pages.items())]
 
     def get_file_url(self, obj):
         # Return URL if provided, otherwise return file URL
         if obj.url:
             return obj.url
-        if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
+        return media_url(obj.file, self.context.get('request'), signed=obj.is_premium)
 
     def get_thumbnail_url(self, obj):
         # Return thumbnail URL if provided, otherwise return file thumbnail
         if obj.thumbnail_url:
             return obj.thumbnail_url
-        if obj.thumbnail:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.thumbnail.url)
-            return obj.thumbnail.url
-        return None
+        # Page 1 of premium sheet music is premium too
+        return media_url(obj.thumbnail, self.context.get('request'), signed=obj.is_premium)
+
 
+class AudioRenditionSerializer(TimedModelSerializer):
+    file_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AudioRendition
+        fields = ['quality', 'codec', 'bitrate', 'size', 'file_url']
+
+    def get_file_url(self, obj):
+        return media_url(obj.file, self.context.get('request'), signed=obj.audio_file.is_premium)
 
-class AudioFileSerializer(serializers.ModelSerializer):
+
+class AudioFileSerializer(TimedModelSerializer):
+    """
+    With a ``rendition`` in the context (see hymns.renditions.select_rendition),
+    file_url and quality describe that rendition instead of the original.
+    """
     hymn_title = serializers.CharField(source='hymn.title', read_only=True)
     hymn_number = serializers.IntegerField(source='hymn.number', read_only=True)
     file_url = serializers.SerializerMethodField()
+    quality = serializers.SerializerMethodField()
     audio_type_display = serializers.CharField(source='get_audio_type_display', read_only=True)
+    waveform = serializers.SerializerMethodField()
+    renditions = AudioRenditionSerializer(many=True, read_only=True)
 
     class Meta:
         model = AudioFile
         fields = [
             'id', 'hymn', 'hymn_title', 'hymn_number', 'audio_type',
-            'audio_type_display', 'file', 'file_url', 'duration', 'bitrate',
-            'is_premium', 'created_at', 'updated_at'
+            'audio_type_display', 'file', 'file_url', 'quality', 'duration', 'bitrate',
+            'waveform', 'renditions', 'is_premium', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        # The stored file is only linked through file_url, which signs premium media
+        extra_kwargs = {'file': {'write_only': True}}
+
+    def _rendition(self, obj):
+        rendition = self.context.get('rendition')
+        return rendition if rendition is not None and rendition.audio_file_id == obj.pk else None
 
     def get_file_url(self, obj):
-        if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
+        rendition = self._rendition(obj)
+        file = rendition.file if rendition else obj.file
+        return media_url(file, self.context.get('request'), signed=obj.is_premium)
+
+    def get_quality(self, obj):
+        rendition = self._rendition(obj)
+        return rendition.quality if rendition else 'original'
+
+    def get_waveform(self, obj):
+        """Loudness from 0 to 255 at evenly spaced points, for drawing before playback"""
+        return decode_waveform(obj.waveform)
 
 
 # User and Subscription Serializers
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedModelSerializer):
     """User serializer"""
     has_active_premium = serializers.BooleanField(read_only=True)
     
@@ -329,7 +380,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'is_premium', 'has_active_premium', 'premium_expires_at', 'date_joined', 'last_login']
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedModelSerializer):
     """Serializer for user registration"""
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True, label='Confirm Password')
@@ -363,7 +414,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(TimedModelSerializer):
     """Subscription serializer"""
     user = UserSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True, required=False)
@@ -379,7 +430,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'started_at', 'created_at', 'updated_at']
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(TimedModelSerializer):
     """Favorite serializer"""
     user = UserSerializer(read_only=True)
     hymn = HymnListSerializer(read_only=True)
@@ -391,7 +442,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at']
 
 
-class PlaylistHymnSerializer(serializers.ModelSerializer):
+class PlaylistHymnSerializer(TimedModelSerializer):
     """Playlist hymn through model serializer"""
     hymn = HymnListSerializer(read_only=True)
     hymn_id = serializers.IntegerField(write_only=True)
@@ -402,7 +453,7 @@ class PlaylistHymnSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'added_at']
 
 
-class PlaylistSerializer(serializers.ModelSerializer):
+class PlaylistSerializer(TimedModelSerializer):
     """Playlist serializer"""
     user = UserSerializer(read_only=True)
     hymns = PlaylistHymnSerializer(source='playlisthymn_set', many=True, read_only=True)
@@ -420,7 +471,7 @@ class PlaylistSerializer(serializers.ModelSerializer):
         return obj.hymns.count()
 
 
-class HymnNoteSerializer(serializers.ModelSerializer):
+class HymnNoteSerializer(TimedModelSerializer):
     """Hymn note/annotation serializer"""
     user = UserSerializer(read_only=True)
     hymn = HymnListSerializer(read_only=True)
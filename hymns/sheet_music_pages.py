@@ -0,0 +1,180 @@
+"""
+Page images for sheet music.
+
+``render_pages`` rasterises a SheetMusic file into SheetMusicPage images. It
+covers every page, or only the first with SHEET_MUSIC_RENDER_PAGES=first. Each
+page gets one image per size in SHEET_MUSIC_IMAGE_WIDTHS, as a progressive
+JPEG and a WebP. Apps can show the first page's thumbnail while the rest load
+lazily, instead of downloading the whole PDF. The first page's smallest JPEG
+also becomes SheetMusic.thumbnail, unless one was uploaded or linked.
+
+PDFs are rasterised once per page at the largest width with ``pdftoppm``
+(poppler-utils); Pillow scales and encodes the rest. Without pdftoppm, PDFs
+get no images, but ``pdf_page_count`` still fills in page_count by reading
+the page tree. That works in pure Python, including page trees inside
+compressed object streams. Sheet music uploaded as an image is handled by
+Pillow alone.
+
+The hymns.tasks render_sheet_music_pages task runs this after uploads.
+"""
+import glob
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+from .models import SheetMusicPage
+
+logger = logging.getLogger(__name__)
+
+_PAGES_COUNT = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b', re.S)
+_OBJECT_STREAM = re.compile(rb'/Type\s*/ObjStm\b')
+
+
+def pdf_page_count(data):
+    """Pages in a PDF from its page tree's root /Count, or None if it can't be found"""
+    chunks = [data]
+    # PDF 1.5+ may keep the page tree in compressed object streams
+    for match in _OBJECT_STREAM.finditer(data):
+        start = data.find(b'stream', match.end())
+        end = data.find(b'endstream', start)
+        if start < 0 or end < 0:
+            continue
+        start += len(b'stream')
+        start += 2 if data[start:start + 2] == b'\r\n' else 1
+        try:
+            chunks.append(zlib.decompressobj().decompress(data[start:end]))
+        except zlib.error:
+            continue
+    counts = [
+        int(first or second)
+        for chunk in chunks
+        for first, second in _PAGES_COUNT.findall(chunk)
+    ]
+    # The root of the page tree counts every page, intermediate nodes only their own
+    return max(counts) if counts else None
+
+
+def _image_widths():
+    return sorted(settings.SHEET_MUSIC_IMAGE_WIDTHS.items(), key=lambda item: item[1])
+
+
+def _formats():
+    formats = ['jpeg']
+    if features.check('webp'):
+        formats.append('webp')
+    return formats
+
+
+def _encode(image, image_format):
+    output = io.BytesIO()
+    if image_format == 'jpeg':
+        # Progressive, so a first pass of the whole page shows up early on slow connections
+        image.save(output, 'JPEG', quality=settings.SHEET_MUSIC_IMAGE_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(output, 'WEBP', quality=settings.SHEET_MUSIC_IMAGE_QUALITY, method=6)
+    return output.getvalue()
+
+
+def _rasterise_pdf(path, directory, width, first_only):
+    command = [
+        shutil.which('pdftoppm'), '-png', '-scale-to-x', str(width), '-scale-to-y', '-1',
+        *(['-f', '1', '-l', '1'] if first_only else []),
+        path, os.path.join(directory, 'page'),
+    ]
+    result = subprocess.run(command, capture_output=True, timeout=settings.MEDIA_TOOL_TIMEOUT)
+    if result.returncode:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or 'pdftoppm failed')
+    # page-1.png, page-2.png ... (zero-padded to the page count's digits)
+    return sorted(
+        glob.glob(os.path.join(directory, 'page-*.png')),
+        key=lambda name: int(re.search(r'-(\d+)\.png$', name)[1]),
+    )
+
+
+def _page_sources(sheet_music, directory, data, largest, first_only):
+    """
+    Files to open the pages to render from, at the largest width (PNGs on
+    disk for a PDF), and the page count
+    """
+    if data[:5] != b'%PDF-':
+        return [io.BytesIO(data)], 1
+
+    page_count = pdf_page_count(data)
+    if shutil.which('pdftoppm') is None:
+        logger.info(f'pdftoppm is not installed; no page images for sheet music {sheet_music.pk}')
+        return [], page_count
+    path = os.path.join(directory, 'source.pdf')
+    with open(path, 'wb') as f:
+        f.write(data)
+    sources = _rasterise_pdf(path, directory, largest, first_only)
+    if not first_only:
+        page_count = len(sources) or page_count
+    return sources, page_count
+
+
+def _save_page(sheet_music, stem, page_number, page, widths):
+    """Encode and save one page at every size and format; returns the SheetMusicPages"""
+    created = []
+    for size, width in widths:
+        image = page
+        if page.width > width:
+            image = page.resize((width, round(page.height * width / page.width)), Image.LANCZOS)
+        for image_format in _formats():
+            rendered = SheetMusicPage(
+                sheet_music=sheet_music, page_number=page_number, size=size, format=image_format,
+                width=image.width, height=image.height,
+            )
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            rendered.image.save(
+                f'{stem}-p{page_number}-{size}.{extension}', ContentFile(_encode(image, image_format)), save=True
+            )
+            created.append(rendered)
+    return created
+
+
+def render_pages(sheet_music):
+    """Render a SheetMusic's page images and fill in page_count; returns the SheetMusicPages created"""
+    widths = _image_widths()
+    first_only = settings.SHEET_MUSIC_RENDER_PAGES == 'first'
+    with sheet_music.file.open('rb') as f:
+        data = f.read()
+
+    created = []
+    stem = os.path.splitext(os.path.basename(sheet_music.file.name))[0]
+    with tempfile.TemporaryDirectory(prefix='hymns-sheet-music-') as directory:
+        sources, page_count = _page_sources(sheet_music, directory, data, widths[-1][1], first_only)
+        # Opened before the old images are deleted, so a file Pillow can't read keeps them
+        first = Image.open(sources[0]) if sources else None
+
+        for old in sheet_music.pages.all():
+            old.image.delete(save=False)
+            old.delete()
+
+        # One full-size page in memory at a time: each is encoded, saved and closed before the next
+        for page_number, source in enumerate(sources, 1):
+            with first if page_number == 1 else Image.open(source) as image:
+                page = image.convert('RGB')
+            created.extend(_save_page(sheet_music, stem, page_number, page, widths))
+            del page
+
+    fields = []
+    if page_count and page_count != sheet_music.page_count:
+        sheet_music.page_count = page_count
+        fields.append('page_count')
+    if created and not sheet_music.thumbnail and not sheet_music.thumbnail_url:
+        thumbnail = created[0]
+        with thumbnail.image.open('rb') as f:
+            sheet_music.thumbnail.save(os.path.basename(thumbnail.image.name), ContentFile(f.read()), save=False)
+        fields.append('thumbnail')
+    if fields:
+        sheet_music.save(update_fields=fields + ['updated_at'])
+    return created
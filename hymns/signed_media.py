@@ -0,0 +1,122 @@
+"""
+Signed, expiring URLs for premium media.
+
+Premium sheet music and audio are linked as
+
+    /signed-media/<expires>/<signature>/<storage name>
+
+where ``signature`` is an HMAC of the storage name and ``expires`` keyed with
+MEDIA_SIGNING_KEY. ``expires`` is rounded up to a MEDIA_URL_WINDOW boundary,
+so every link to a file issued within one window is the same URL and a CDN
+in front of the app can cache it until it expires. A link stays valid for
+between MEDIA_URL_TTL and MEDIA_URL_TTL + MEDIA_URL_WINDOW seconds.
+
+``signed_media`` checks the signature and expiry without touching the
+database. Files on local storage are served by hymns.media_serving, with
+range requests and proxy offload. For other storages (S3 through
+django-storages) it redirects to the storage URL, which S3Storage presigns for
+the rest of the link's lifetime when AWS_QUERYSTRING_AUTH is on. With MEDIA_CDN_URL set, links point at the CDN
+instead of this app; the CDN has to check the same signature (or pull from
+this app as its origin).
+
+Free media on local storage is linked to the app too, since /media/ is only
+served in DEBUG: AudioFile and SheetMusic files to their serving views
+(/api/v1/media/audio/<id>/ and /api/v1/media/sheet-music/<id>/), other files
+(renditions, page images, thumbnails) through a signed link. Free media on
+other storages is linked to the storage's own URL.
+"""
+import hmac
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import salted_hmac
+from django.views.decorators.http import require_safe
+
+from .media_serving import serve_file
+from .models import AudioFile, SheetMusic
+
+_KEY_SALT = 'hymns.signed_media'
+
+# Files with a serving view of their own (hymns.media_serving), by model and field
+_SERVING_VIEWS = {
+    (AudioFile, 'file'): 'audio-media',
+    (SheetMusic, 'file'): 'sheet-music-media',
+}
+
+
+def media_signature(name, expires):
+    key = getattr(settings, 'MEDIA_SIGNING_KEY', '') or settings.SECRET_KEY
+    return salted_hmac(_KEY_SALT, f'{name}:{expires}', secret=key, algorithm='sha256').hexdigest()[:32]
+
+
+def link_expiry(now=None):
+    """When links issued now expire: MEDIA_URL_TTL from now, rounded up to a MEDIA_URL_WINDOW boundary"""
+    now = int(time.time() if now is None else now)
+    window = max(getattr(settings, 'MEDIA_URL_WINDOW', 900), 1)
+    expires = now + getattr(settings, 'MEDIA_URL_TTL', 3600)
+    return -(-expires // window) * window
+
+
+def signed_path(name, expires=None):
+    expires = link_expiry() if expires is None else expires
+    return reverse('signed-media', kwargs={
+        'expires': expires, 'signature': media_signature(name, expires), 'name': name,
+    })
+
+
+def _serving_path(file):
+    view = _SERVING_VIEWS.get((type(file.instance), file.field.name))
+    if view and file.instance.pk:
+        return reverse(view, kwargs={'pk': file.instance.pk})
+    return signed_path(file.name)
+
+
+def media_url(file, request=None, signed=True):
+    """
+    Absolute URL for a FieldFile: a signed link when ``signed`` (premium media),
+    otherwise its serving view on local storage or the storage's own URL.
+    Returns None for an empty field.
+    """
+    if not file:
+        return None
+    if signed:
+        url = signed_path(file.name)
+    elif isinstance(file.storage, FileSystemStorage):
+        url = _serving_path(file)
+    else:
+        return file.url
+    cdn_url = getattr(settings, 'MEDIA_CDN_URL', '')
+    if cdn_url:
+        return cdn_url.rstrip('/') + url
+    return request.build_absolute_uri(url) if request else url
+
+
+def is_valid_signature(name, expires, signature, now=None):
+    now = time.time() if now is None else now
+    return expires > now and hmac.compare_digest(signature, media_signature(name, expires))
+
+
+@require_safe
+def signed_media(request, expires, signature, name):
+    """Serve (or redirect to) a media file for a valid, unexpired signed link"""
+    if not is_valid_signature(name, expires, signature):
+        return HttpResponseForbidden('Invalid or expired media link')
+
+    if isinstance(default_storage, FileSystemStorage):
+        response = serve_file(request, name)
+    else:
+        lifetime = max(int(expires - time.time()), 1)
+        try:
+            url = default_storage.url(name, expire=lifetime)
+        except TypeError:
+            url = default_storage.url(name)
+        response = HttpResponseRedirect(url)
+
+    # The URL changes every window and media files are never rewritten in place,
+    # so shared caches may keep the response until the link expires
+    patch_cache_control(response, public=True, max_age=max(int(expires - time.time()), 0))
+    return response
@@ -0,0 +1,58 @@
+"""
+Celery tasks for the hymns app
+"""
+import logging
+
+from PIL import UnidentifiedImageError
+
+from config.celery import app
+
+from . import audio_metadata, import_jobs, renditions, sheet_music_pages
+from .models import AudioFile, SheetMusic
+
+logger = logging.getLogger(__name__)
+
+
+@app.task
+def run_import_job(job_id):
+    """Process an admin upload queued as an ImportJob"""
+    import_jobs.run_job(job_id)
+
+
+@app.task
+def extract_audio_metadata(audio_file_id):
+    """Fill in an uploaded AudioFile's duration, bitrate and waveform from its headers"""
+    audio_file = AudioFile.objects.filter(pk=audio_file_id).first()
+    if audio_file is None or not audio_file.file:
+        return
+    try:
+        audio_metadata.update_audio_file(audio_file)
+    except audio_metadata.UnsupportedAudio as e:
+        logger.warning(f'Could not read audio file {audio_file_id}: {e}')
+    # Renditions depend on the bitrate read above
+    if renditions.encoder_available() and renditions.wanted_renditions(audio_file):
+        encode_audio_renditions.delay(audio_file_id)
+
+
+@app.task
+def encode_audio_renditions(audio_file_id):
+    """Encode the lower-bitrate renditions of an AudioFile"""
+    audio_file = AudioFile.objects.filter(pk=audio_file_id).first()
+    if audio_file is None or not audio_file.file:
+        return
+    for rendition in renditions.encode_renditions(audio_file):
+        logger.info(f'Encoded {rendition}')
+
+
+@app.task
+def render_sheet_music_pages(sheet_music_id):
+    """Render an uploaded SheetMusic's page images and fill in its page count"""
+    sheet_music = SheetMusic.objects.filter(pk=sheet_music_id).first()
+    if sheet_music is None or not sheet_music.file:
+        return
+    try:
+        pages = sheet_music_pages.render_pages(sheet_music)
+    except (UnidentifiedImageError, RuntimeError) as e:
+        logger.warning(f'Could not render sheet music {sheet_music_id}: {e}')
+        return
+    logger.info(f'Rendered {len(pages)} page images for {sheet_music}')
@@ -0,0 +1,131 @@
+"""
+Tests for reading audio headers and waveforms (hymns.audio_metadata).
+"""
+import io
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from hymns import audio_metadata
+from hymns.audio_metadata import HEADER_BYTES, MP3Frame, UnsupportedAudio, read_audio_info
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo, no CRC: 417-byte frames
+MP3_HEADER = b'\xff\xfb\x90\x00'
+
+
+def _mp3(gains):
+    """An MP3 with one frame per gain, which the first granule's global_gain carries"""
+    frame = MP3Frame(MP3_HEADER)
+    frames = []
+    for gain in gains:
+        # Stereo MPEG-1 side info: 9 + 3 + 8 bits, part2_3_length (12) and big_values (9), then global_gain
+        side_info = (gain << (frame.side_info_size * 8 - 41 - 8)).to_bytes(frame.side_info_size, 'big')
+        frames.append(MP3_HEADER + side_info + bytes(frame.length - 4 - frame.side_info_size))
+    return b''.join(frames)
+
+
+def _xing_mp3(frames, audio_bytes):
+    """A VBR MP3: a first frame carrying a Xing header with frame and byte counts, then one audio frame"""
+    first = bytearray(_mp3([0]))
+    xing = 4 + MP3Frame(MP3_HEADER).side_info_size
+    first[xing:xing + 16] = b'Xing' + (3).to_bytes(4, 'big') + frames.to_bytes(4, 'big') + audio_bytes.to_bytes(4, 'big')
+    return bytes(first) + _mp3([0])
+
+
+def _box(box_type, payload):
+    return (8 + len(payload)).to_bytes(4, 'big') + box_type + payload
+
+
+def _mvhd(timescale, duration, version=0):
+    if version == 1:
+        return bytes([1, 0, 0, 0]) + bytes(16) + timescale.to_bytes(4, 'big') + duration.to_bytes(8, 'big')
+    return bytes(4) + bytes(8) + timescale.to_bytes(4, 'big') + duration.to_bytes(4, 'big')
+
+
+def _mp4(mvhd, media_bytes):
+    return _box(b'ftyp', b'M4A \x00\x00\x00\x00') + _box(b'moov', _box(b'mvhd', mvhd)) + _box(b'mdat', bytes(media_bytes))
+
+
+def _ogg_page(packet, granule, serial=b'\x01\x00\x00\x00'):
+    return (
+        b'OggS\x00\x02' + granule.to_bytes(8, 'little') + serial + bytes(8)
+        + bytes([1, len(packet)]) + packet
+    )
+
+
+class ReadAudioInfoTests(SimpleTestCase):
+    def _read(self, data):
+        return read_audio_info(io.BytesIO(data))
+
+    def test_cbr_mp3(self):
+        # 100 frames of 417 bytes at 128 kbps
+        info = self._read(b'ID3\x03\x00\x00\x00\x00\x00\x0a' + bytes(10) + _mp3([0] * 100))
+        self.assertEqual((info.format, info.bitrate, info.sample_rate, info.channels), ('mp3', 128, 44100, 2))
+        self.assertAlmostEqual(info.duration, 41700 * 8 / 128000)
+
+    def test_xing_mp3(self):
+        info = self._read(_xing_mp3(frames=1000, audio_bytes=200000))
+        self.assertAlmostEqual(info.duration, 1000 * 1152 / 44100)
+        self.assertEqual(info.bitrate, round(200000 * 8 / (1000 * 1152 / 44100) / 1000))
+
+    def test_mp4(self):
+        for version in (0, 1):
+            with self.subTest(version=version):
+                info = self._read(_mp4(_mvhd(1000, 5000, version), 80000))
+                self.assertEqual((info.format, info.duration, info.bitrate), ('mp4', 5.0, 128))
+
+    def test_truncated_mp4_is_unsupported(self):
+        for mvhd in (b'', _mvhd(1000, 5000)[:18], _mvhd(1000, 5000, version=1)[:28]):
+            with self.subTest(mvhd=mvhd), self.assertRaises(UnsupportedAudio):
+                self._read(_box(b'ftyp', b'M4A \x00\x00\x00\x00') + _box(b'moov', _box(b'mvhd', mvhd)))
+
+    def test_vorbis(self):
+        identification = (
+            b'\x01vorbis' + bytes(4) + bytes([2]) + (44100).to_bytes(4, 'little')
+            + bytes(4) + (160000).to_bytes(4, 'little') + bytes(6)
+        )
+        info = self._read(_ogg_page(identification, 0) + _ogg_page(b'audio', 44100 * 10))
+        self.assertEqual(
+            (info.format, info.duration, info.bitrate, info.sample_rate, info.channels), ('vorbis', 10.0, 160, 44100, 2)
+        )
+
+    def test_opus(self):
+        # Granule positions count 48 kHz samples including the 312-sample pre-skip
+        identification = b'OpusHead' + bytes([1, 1]) + (312).to_bytes(2, 'little') + bytes(7)
+        data = _ogg_page(identification, 0) + _ogg_page(b'audio', 48000 * 3 + 312)
+        info = self._read(data)
+        self.assertEqual((info.format, info.duration, info.sample_rate, info.channels), ('opus', 3.0, 48000, 1))
+        self.assertEqual(info.bitrate, round(len(data) * 8 / 3 / 1000))
+
+    def test_last_page_of_another_stream_is_skipped(self):
+        identification = b'OpusHead' + bytes([1, 2]) + bytes(9)
+        data = (
+            _ogg_page(identification, 0) + _ogg_page(b'audio', 48000 * 2)
+            + _ogg_page(b'other', 48000 * 9, serial=b'\x02\x00\x00\x00')
+        )
+        self.assertEqual(self._read(data).duration, 2.0)
+
+
+class Mp3GainEnvelopeTests(SimpleTestCase):
+    def test_reads_frames_across_chunks(self):
+        # Several HEADER_BYTES chunks, so frames straddle the refills
+        gains = [i % 200 for i in range(3 * HEADER_BYTES // 417 + 7)]
+        data = _mp3(gains)
+        self.assertGreater(len(data), 3 * HEADER_BYTES)
+        f = io.BytesIO(data)
+        with mock.patch.object(f, 'read', wraps=f.read) as read:
+            peaks = audio_metadata._mp3_gain_envelope(f, len(gains))
+        self.assertEqual(list(peaks), list(audio_metadata._scale(gains)))
+        self.assertTrue(all(call.args and call.args[0] <= HEADER_BYTES for call in read.call_args_list))
+
+
+class OggTests(SimpleTestCase):
+    def test_truncated_page_is_unsupported(self):
+        for data in (b'OggS\x00\x02', b'OggS' + bytes(22) + b'\x05\x01'):
+            with self.subTest(data=data), self.assertRaises(UnsupportedAudio):
+                read_audio_info(io.BytesIO(data))
+
+    def test_truncated_identification_header_is_unsupported(self):
+        page = b'OggS' + bytes(22) + b'\x01\x1e' + b'\x01vorbis\x00'
+        with self.assertRaises(UnsupportedAudio):
+            read_audio_info(io.BytesIO(page))
@@ -0,0 +1,81 @@
+"""
+Golden-output tests for the shared hymnal parser (hymns.hymnal_parser).
+
+Each file in fixtures/hymnal_parser has a ``<name>.json`` next to it holding
+what the parsers it replaced (``parse_word_document`` and ``parse_text_file``
+in hymns/admin_actions.py before the shared parser) returned for it. The
+fixtures cover the header line, prefixed (NCH 1), "N. Title" and number-only
+starts, repeated numbers, blank-line separation, untitled and unnumbered
+verses, choruses and refrains, CRLF line endings, non-ASCII text, Word runs,
+tabs, line breaks and tables, plus a synthetic hymnal from
+hymns.benchmarks.sample_hymnal_lines.
+"""
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from hymns.hymnal_parser import parse_files, parse_text_file, parse_upload, parse_word_document
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'hymnal_parser'
+
+
+def _fixtures(extension):
+    return sorted(path for path in FIXTURES.glob(f'*.{extension}'))
+
+
+def _golden(path):
+    return json.loads(path.with_name(path.name + '.json').read_text(encoding='utf-8'))
+
+
+class HymnalParserGoldenTests(SimpleTestCase):
+    def test_text_files(self):
+        for path in _fixtures('txt'):
+            with self.subTest(path.name):
+                self.assertEqual(parse_text_file(io.BytesIO(path.read_bytes())), _golden(path))
+
+    def test_word_documents(self):
+        for path in _fixtures('docx'):
+            with self.subTest(path.name):
+                self.assertEqual(parse_word_document(io.BytesIO(path.read_bytes())), _golden(path))
+
+    def test_parallel_parsing_matches(self):
+        paths = _fixtures('txt') + _fixtures('docx')
+        files = [(path.name, path.read_bytes()) for path in paths]
+        expected = [parse_upload(name, content) for name, content in files]
+        self.assertEqual(list(parse_files(files, workers=2)), expected)
+        for path, (hymns, error) in zip(paths, expected):
+            golden = _golden(path)
+            self.assertIsNone(error)
+            self.assertEqual(hymns, golden if isinstance(golden, list) else [golden])
+
+    def test_paths_are_streamed_by_the_workers(self):
+        paths = _fixtures('txt') + _fixtures('docx')
+        expected = [parse_upload(path.name, path.read_bytes()) for path in paths]
+        self.assertEqual(list(parse_files([(path.name, str(path)) for path in paths], workers=2)), expected)
+        self.assertEqual(parse_upload('missing.txt', str(FIXTURES / 'missing.txt'))[0], [])
+
+    def test_pool_processes_are_not_forked(self):
+        # Forking a threaded worker would copy locks other threads hold
+        files = [(path.name, path.read_bytes()) for path in _fixtures('txt')]
+        with mock.patch('hymns.hymnal_parser.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as executor:
+            list(parse_files(files, workers=2))
+        self.assertIn(executor.call_args.kwargs['mp_context'].get_start_method(), ('forkserver', 'spawn'))
+
+    def test_daemonic_process_parses_in_process(self):
+        # As in a Celery prefork worker, which can't start the pool
+        files = [(path.name, path.read_bytes()) for path in _fixtures('txt')]
+        expected = [parse_upload(name, content) for name, content in files]
+        with mock.patch('multiprocessing.current_process') as current_process, \
+                mock.patch('hymns.hymnal_parser.ProcessPoolExecutor') as executor, \
+                self.assertLogs('hymns.hymnal_parser', 'WARNING') as logs:
+            current_process.return_value.daemon = True
+            self.assertEqual(list(parse_files(files, workers=2)), expected)
+        executor.assert_not_called()
+        self.assertIn('--pool=threads', logs.output[0])
+
+    def test_unsupported_file(self):
+        self.assertEqual(parse_upload('hymns.pdf', b'%PDF-'), ([], 'Unsupported file format: pdf'))
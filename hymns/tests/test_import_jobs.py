@@ -0,0 +1,51 @@
+"""
+Tests for queueing and parsing admin import jobs (hymns.import_jobs).
+"""
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from hymns import hymnal_parser
+from hymns.import_jobs import _parse_uploads, create_import_job
+from hymns.models import ImportJob
+
+
+class CreateImportJobTests(TestCase):
+    @override_settings(CELERY_BROKER_URL='', CELERY_TASK_ALWAYS_EAGER=False)
+    def test_without_a_broker_or_eager_mode(self):
+        upload = SimpleUploadedFile('hymn-1.mp3', b'ID3')
+        with self.assertRaises(ImproperlyConfigured):
+            create_import_job(ImportJob.KIND_AUDIO, files=[upload], options={'audio_type': 'piano'})
+        self.assertFalse(ImportJob.objects.exists())
+
+
+class ParseUploadsTests(SimpleTestCase):
+    NAMES = ('hymnal.txt', 'hymnal.docx')
+
+    def _parse(self, storage):
+        fixtures = Path(__file__).resolve().parent / 'fixtures' / 'hymnal_parser'
+        uploads = [
+            {'name': name, 'path': storage.save(f'imports/job/{name}', ContentFile((fixtures / name).read_bytes()))}
+            for name in self.NAMES
+        ]
+        with mock.patch('hymns.import_jobs.default_storage', storage), \
+                mock.patch('hymns.hymnal_parser.parse_files', wraps=hymnal_parser.parse_files) as parse_files, \
+                override_settings(IMPORT_PARSE_WORKERS=1):
+            results = [(hymns, error) for upload, hymns, error in _parse_uploads(uploads)]
+        # The parser opens each file itself rather than being handed its bytes
+        self.assertTrue(all(isinstance(content, str) for name, content in parse_files.call_args.args[0]))
+        self.assertEqual(results, [hymnal_parser.parse_upload(name, (fixtures / name).read_bytes()) for name in self.NAMES])
+
+    def test_local_storage_paths(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._parse(FileSystemStorage(location=root))
+
+    def test_remote_storage_is_streamed_to_local_files(self):
+        # Not on the local disk, like S3
+        self._parse(InMemoryStorage())
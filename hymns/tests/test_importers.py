@@ -0,0 +1,50 @@
+"""
+Tests for the bulk hymnal import's number handling (hymns.importers).
+"""
+from django.test import TestCase
+
+from hymns.importers import HymnalImport
+from hymns.models import Denomination, DenominationHymn, Hymn
+
+
+class HymnalImportNumberTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.denomination = Denomination.objects.create(name='Test Hymnal', slug='test-hymnal')
+
+    def _import(self, hymns_data):
+        return HymnalImport(self.denomination).run(hymns_data)
+
+    def test_string_and_int_numbers_conflict(self):
+        plan = self._import([
+            {'number': '5', 'title': 'Amazing Grace', 'verses': [{'verse_number': 1, 'text': 'Amazing grace'}]},
+            {'number': 5, 'title': 'Abide With Me', 'verses': [{'verse_number': 1, 'text': 'Abide with me'}]},
+        ])
+        numbers = dict(DenominationHymn.objects.values_list('hymn__title', 'number'))
+        self.assertEqual(numbers['Amazing Grace'], 5)
+        self.assertNotEqual(numbers['Abide With Me'], 5)
+        self.assertEqual(len(plan.conflicts), 1)
+
+    def test_number_conflicts_with_existing_entry(self):
+        self._import([{'number': 5, 'title': 'Amazing Grace', 'verses': [{'verse_number': 1, 'text': 'Amazing grace'}]}])
+        self._import([{'number': '5', 'title': 'Abide With Me', 'verses': [{'verse_number': '1', 'text': 'Abide with me'}]}])
+        self.assertEqual(
+            sorted(DenominationHymn.objects.values_list('number', flat=True)), [5, 6]
+        )
+
+    def test_invalid_number_is_an_error_and_writes_nothing(self):
+        plan = self._import([
+            {'number': 'five', 'title': 'Amazing Grace', 'verses': [{'verse_number': 1, 'text': 'Amazing grace'}]},
+            {'number': 2, 'title': 'Abide With Me', 'verses': [{'verse_number': 'x', 'text': 'Abide with me'}]},
+            {'number': 3, 'title': 'Be Thou My Vision', 'verses': [{'verse_number': 1, 'text': 'Be thou my vision'}]},
+        ])
+        self.assertEqual(plan.error_count, 2)
+        self.assertEqual(plan.created_count, 1)
+        self.assertEqual(list(Hymn.objects.values_list('title', flat=True)), ['Be Thou My Vision'])
+        self.assertEqual(list(DenominationHymn.objects.values_list('number', flat=True)), [3])
+
+    def test_verse_numbers_as_strings_update_existing_verses(self):
+        self._import([{'number': 1, 'title': 'Amazing Grace', 'verses': [{'verse_number': 1, 'text': 'Amazing grace'}]}])
+        plan = self._import([{'number': 1, 'title': 'Amazing Grace', 'verses': [{'verse_number': '1', 'text': 'Amazing grace'}]}])
+        self.assertEqual(plan.unchanged_count, 1)
+        self.assertEqual(plan.verses, {})
@@ -0,0 +1,37 @@
+"""
+Regression test for worker startup import time (manage.py importtime).
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+
+
+class StartupImportTimeTests(SimpleTestCase):
+    def _importtime(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'importtime.json')
+            # Raises CommandError when over budget or a lazy module was imported
+            call_command('importtime', repeat=3, json=path, stdout=StringIO())
+            with open(path) as f:
+                return json.load(f)
+
+    # The workers import config.wsgi in fresh interpreters, which read these from the environment
+    @mock.patch.dict(os.environ, {'API_DOCS_ENABLED': 'False', 'DEBUG': 'False'})
+    @override_settings(API_DOCS_ENABLED=False)
+    def test_config_wsgi_within_budget(self):
+        results = self._importtime()
+        self.assertEqual(results['module'], 'config.wsgi')
+        self.assertLessEqual(results['median_ms'], settings.IMPORT_TIME_BUDGET_MS)
+        self.assertEqual(results['lazy_modules_loaded'], [])
+
+    def test_importing_a_lazy_module_fails(self):
+        with self.assertRaisesMessage(CommandError, 'hymns.hymnal_parser'):
+            call_command(
+                'importtime', module='hymns.hymnal_parser', no_urls=True, repeat=1, budget_ms=0, stdout=StringIO()
+            )
@@ -0,0 +1,19 @@
+"""
+Tests for the load test's latency statistics (hymns.loadtest).
+"""
+from django.test import SimpleTestCase
+
+from hymns.loadtest import percentile
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(
+            [percentile(values, pct) for pct in (0, 50, 90, 95, 99, 100)], [1, 50, 90, 95, 99, 100]
+        )
+
+    def test_small_samples(self):
+        self.assertEqual([percentile([10, 20, 30, 40], pct) for pct in (25, 50, 75, 99)], [10, 20, 30, 40])
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
@@ -0,0 +1,43 @@
+"""
+Tests for copying bulk-uploaded media to its final path (hymns.media_ingest).
+"""
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase
+from storages.backends.s3 import S3Storage
+
+from hymns.media_ingest import copy_files, hymn_id_from_filename
+
+
+class CopyFilesTests(SimpleTestCase):
+    def test_filesystem_copy(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = FileSystemStorage(location=root)
+            storage.save('imports/job/hymn-1.mp3', ContentFile(b'ID3 audio'))
+            names = copy_files([('imports/job/hymn-1.mp3', 'audio/hymn-1.mp3')], storage=storage, workers=2)
+            self.assertEqual(names, ['audio/hymn-1.mp3'])
+            with storage.open('audio/hymn-1.mp3') as f:
+                self.assertEqual(f.read(), b'ID3 audio')
+
+    def test_s3_copies_inside_the_bucket(self):
+        storage = S3Storage(bucket_name='media', location='uploads', file_overwrite=True)
+        bucket = mock.Mock()
+        bucket.name = 'media'
+        with mock.patch.object(S3Storage, 'bucket', new_callable=mock.PropertyMock, return_value=bucket), \
+                mock.patch.object(S3Storage, 'open') as open_:
+            names = copy_files([('imports/job/hymn-1.mp3', 'audio/hymn-1.mp3')], storage=storage)
+        self.assertEqual(names, ['audio/hymn-1.mp3'])
+        open_.assert_not_called()
+        bucket.Object.assert_called_once_with('uploads/audio/hymn-1.mp3')
+        bucket.Object.return_value.copy.assert_called_once_with(
+            {'Bucket': 'media', 'Key': 'uploads/imports/job/hymn-1.mp3'}, Config=storage.transfer_config,
+        )
+
+
+class HymnIdFromFilenameTests(SimpleTestCase):
+    def test_first_number_in_the_stem(self):
+        self.assertEqual(hymn_id_from_filename('uploads/hymn_101_piano.mp3'), 101)
+        self.assertIsNone(hymn_id_from_filename('piano.mp3'))
@@ -0,0 +1,93 @@
+"""
+N+1 checks for the API views with hymns.query_detector.detect_queries.
+
+The catalogue views select and prefetch what their serializers read, so
+listing a page of hymns runs a fixed number of queries. The detector itself is
+checked against ``UnoptimizedHymnList``, a view defined here that loads each
+hymn's author and category one at a time.
+"""
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework import generics, serializers
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIClient, APIRequestFactory
+
+from hymns.models import (
+    AudioFile, Author, Category, Denomination, DenominationHymn, Hymn, SheetMusic, User, Verse,
+)
+from hymns.query_detector import NPlusOneError, detect_queries
+
+HYMNS = 10
+THRESHOLD = 5
+
+
+class UnoptimizedHymnSerializer(serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.name')
+    category_name = serializers.CharField(source='category.name')
+
+    class Meta:
+        model = Hymn
+        fields = ['id', 'title', 'author_name', 'category_name']
+
+
+class UnoptimizedHymnList(generics.ListAPIView):
+    """A known N+1: no select_related for the author and category each row reads"""
+    queryset = Hymn.objects.order_by('pk')
+    serializer_class = UnoptimizedHymnSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+
+
+class QueryDetectorViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='hymns')
+        cls.denomination = Denomination.objects.create(name='Test Hymnal', slug='test-hymnal')
+        for number in range(1, HYMNS + 1):
+            hymn = Hymn.objects.create(
+                title=f'Test Hymn {number}',
+                category=Category.objects.create(name=f'Test Category {number}'),
+                author=Author.objects.create(name=f'Test Author {number}'),
+            )
+            entry = DenominationHymn.objects.create(hymn=hymn, denomination=cls.denomination, number=number)
+            Verse.objects.create(denomination_hymn=entry, verse_number=1, text=f'Verse of hymn {number}')
+            SheetMusic.objects.create(hymn=hymn, file=f'sheet_music/hymn-{number}.pdf', is_premium=False)
+            AudioFile.objects.create(hymn=hymn, audio_type='piano', file=f'audio/hymn-{number}.mp3', is_premium=False)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_detects_an_n_plus_one(self):
+        view = UnoptimizedHymnList.as_view()
+        with self.assertRaises(NPlusOneError) as raised:
+            with detect_queries(threshold=THRESHOLD):
+                response = view(APIRequestFactory().get('/hymns/'))
+        self.assertEqual(len(response.data), HYMNS)
+        self.assertIn('hymns_author', str(raised.exception))
+        self.assertIn('hymns_category', str(raised.exception))
+
+        # The same rows with the relations selected stay under the threshold
+        with mock.patch.object(UnoptimizedHymnList, 'queryset', Hymn.objects.select_related('author', 'category')), \
+                detect_queries(threshold=THRESHOLD) as recorder:
+            view(APIRequestFactory().get('/hymns/'))
+        self.assertEqual(recorder.count, 1)
+
+    def test_catalogue_lists_stay_under_the_threshold(self):
+        for url in (
+            '/api/v1/hymns/',
+            f'/api/v1/hymns/?denomination={self.denomination.pk}',
+            f'/api/v1/denomination-hymns/?denomination={self.denomination.pk}',
+            '/api/v1/sheet-music/',
+            '/api/v1/audio/',
+        ):
+            with self.subTest(url), detect_queries(threshold=THRESHOLD) as recorder:
+                response = self._get(url)
+            self.assertGreaterEqual(len(response.data['results']), HYMNS, url)
+            self.assertEqual(recorder.n_plus_one(), [], url)
@@ -0,0 +1,132 @@
+"""
+Tests for the catalogue replica router and read-your-writes pinning.
+
+``replica_1`` is a second local SQLite alias mirroring the test database
+(see TESTING in config.settings), so reads routed to it see the same rows.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from config.celery import app
+from hymns import routers
+from hymns.middleware import PIN_COOKIE_NAME, ReplicaPinningMiddleware
+from hymns.models import Category
+
+
+@app.task
+def _create_category(name):
+    Category.objects.create(name=name, slug=name)
+    return routers.is_pinned()
+
+
+@override_settings(DATABASE_ROUTERS=['hymns.routers.CatalogueReplicaRouter'])
+class CatalogueReplicaRouterTests(TransactionTestCase):
+    databases = {'default', 'replica_1'}
+
+    def setUp(self):
+        # Earlier writes in this process would otherwise pin every test to the primary
+        self.enterContext(routers.pinned(False))
+        routers._lag_cache.clear()
+        self.addCleanup(routers._lag_cache.clear)
+
+    def test_catalogue_reads_go_to_replica(self):
+        with routers.pinned(True):
+            Category.objects.create(name='Praise', slug='praise')
+        queryset = Category.objects.all()
+        self.assertEqual(queryset.db, 'replica_1')
+        self.assertEqual(list(queryset.values_list('name', flat=True)), ['Praise'])
+
+    def test_other_reads_stay_on_primary(self):
+        self.assertEqual(get_user_model().objects.all().db, 'default')
+
+    def test_write_pins_to_primary(self):
+        Category.objects.create(name='Praise', slug='praise')
+        self.assertTrue(routers.is_pinned())
+        self.assertEqual(Category.objects.all().db, 'default')
+
+    def test_without_pinning(self):
+        with routers.without_pinning():
+            Category.objects.create(name='Praise', slug='praise')
+        self.assertFalse(routers.is_pinned())
+        self.assertEqual(Category.objects.all().db, 'replica_1')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(routers, '_measure_lag', return_value=60.0):
+            self.assertEqual(Category.objects.all().db, 'default')
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(routers, '_measure_lag', return_value=None):
+            self.assertEqual(Category.objects.all().db, 'default')
+
+    def test_task_writes_do_not_pin_the_worker(self):
+        self.assertTrue(_create_category.apply(args=['praise']).get())
+        self.assertFalse(routers.is_pinned())
+        self.assertEqual(Category.objects.all().db, 'replica_1')
+
+    def test_task_restores_the_callers_pinning(self):
+        with routers.pinned(True):
+            _create_category.apply(args=['praise'])
+            self.assertTrue(routers.is_pinned())
+
+
+@override_settings(DATABASE_ROUTERS=['hymns.routers.CatalogueReplicaRouter'])
+class ReplicaPinningMiddlewareTests(TransactionTestCase):
+    databases = {'default', 'replica_1'}
+
+    def setUp(self):
+        self.enterContext(routers.pinned(False))
+        self.factory = RequestFactory()
+
+    def _respond(self, request, view=None):
+        seen = {}
+
+        def get_response(request):
+            if view:
+                view()
+            seen['pinned'] = routers.is_pinned()
+            seen['db'] = Category.objects.all().db
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(get_response)(request)
+        return response, seen
+
+    def test_read_is_not_pinned(self):
+        response, seen = self._respond(self.factory.get('/'))
+        self.assertEqual(seen, {'pinned': False, 'db': 'replica_1'})
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_unsafe_request_is_pinned_and_sets_cookie(self):
+        response, seen = self._respond(self.factory.post('/'))
+        self.assertEqual(seen, {'pinned': True, 'db': 'default'})
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_write_in_safe_request_sets_cookie(self):
+        response, seen = self._respond(
+            self.factory.get('/'), lambda: Category.objects.create(name='Praise', slug='praise')
+        )
+        self.assertEqual(seen['db'], 'default')
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_cookie_pins_following_reads(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        response, seen = self._respond(request)
+        self.assertEqual(seen, {'pinned': True, 'db': 'default'})
+        # Already pinned by the cookie, which is left to expire
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_write_without_pinning_sets_no_cookie(self):
+        def view():
+            with routers.without_pinning():
+                Category.objects.create(name='Praise', slug='praise')
+
+        response, seen = self._respond(self.factory.get('/'), view)
+        self.assertEqual(seen, {'pinned': False, 'db': 'replica_1'})
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_pinning_ends_with_the_request(self):
+        self._respond(self.factory.post('/'))
+        self.assertFalse(routers.is_pinned())
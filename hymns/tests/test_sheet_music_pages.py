@@ -0,0 +1,70 @@
+"""
+Tests for sheet music page images (hymns.sheet_music_pages).
+"""
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from hymns import sheet_music_pages
+from hymns.models import Hymn, SheetMusic
+
+
+def _png(width, height, color='white'):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, 'PNG')
+    return output.getvalue()
+
+
+@override_settings(SHEET_MUSIC_IMAGE_WIDTHS={'thumbnail': 100, 'large': 400}, SHEET_MUSIC_RENDER_PAGES='all')
+class RenderPagesTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.sheet_music = SheetMusic(hymn=Hymn.objects.create(title='Amazing Grace'))
+
+    def _sizes(self, created):
+        return sorted({(page.page_number, page.size, page.width, page.height) for page in created})
+
+    def test_image_upload(self):
+        self.sheet_music.file.save('hymn-1.png', ContentFile(_png(800, 1000)))
+        created = sheet_music_pages.render_pages(self.sheet_music)
+        self.assertEqual(self._sizes(created), [(1, 'large', 400, 500), (1, 'thumbnail', 100, 125)])
+        self.assertEqual(self.sheet_music.page_count, 1)
+        self.assertTrue(self.sheet_music.thumbnail)
+
+    def test_pdf_pages_are_rendered_one_at_a_time(self):
+        self.sheet_music.file.save('hymn-1.pdf', ContentFile(b'%PDF-1.4\n<< /Type /Pages /Count 3 >>\n'))
+
+        def rasterise(path, directory, width, first_only):
+            names = []
+            for page in range(1, 4):
+                names.append(os.path.join(directory, f'page-{page}.png'))
+                with open(names[-1], 'wb') as f:
+                    f.write(_png(800, 1000))
+            return names
+
+        opened = []
+        open_image = Image.open
+
+        def track_open(source):
+            # Every earlier page is saved before the next one is opened
+            opened.append(self.sheet_music.pages.count())
+            return open_image(source)
+
+        with mock.patch('hymns.sheet_music_pages.shutil.which', return_value='/usr/bin/pdftoppm'), \
+                mock.patch('hymns.sheet_music_pages._rasterise_pdf', side_effect=rasterise), \
+                mock.patch('hymns.sheet_music_pages.Image.open', side_effect=track_open):
+            created = sheet_music_pages.render_pages(self.sheet_music)
+
+        per_page = 2 * len(sheet_music_pages._formats())
+        self.assertEqual(opened, [0, per_page, 2 * per_page])
+        self.assertEqual(len(created), 3 * per_page)
+        self.assertEqual({page.page_number for page in created}, {1, 2, 3})
+        self.assertEqual(self.sheet_music.page_count, 3)
@@ -8,6 +8,7 @@ from .views import (
     SubscriptionViewSet, FavoriteViewSet, PlaylistViewSet, HymnNoteViewSet,
     DenominationViewSet, DenominationHymnViewSet
 )
+from .media_serving import audio_file_media, sheet_music_media
 from .webhooks import revenuecat_webhook
 
 router = DefaultRouter()
@@ -30,6 +31,9 @@ urlpatterns = [
     path('auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/profile/', user_profile, name='user_profile'),
+    # Media files, with range requests (premium files need a premium user)
+    path('media/audio/<int:pk>/', audio_file_media, name='audio-media'),
+    path('media/sheet-music/<int:pk>/', sheet_music_media, name='sheet-music-media'),
     # Webhooks
     path('webhooks/revenuecat/', revenuecat_webhook, name='revenuecat_webhook'),
 ]
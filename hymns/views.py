@@ -1,3 +1,6 @@
+import copy
+import hmac
+import logging
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
@@ -5,17 +8,23 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticate
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import Q, Exists, Min, OuterRef, Subquery
+from django.http import Http404, HttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.core.exceptions import ValidationError
 from django_ratelimit.decorators import ratelimit
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
 from .models import (
     Category, Author, Hymn, Verse, SheetMusic, AudioFile,
     User, Subscription, Favorite, Playlist, PlaylistHymn, HymnNote,
     Denomination, DenominationHymn
 )
+from .filters import HymnOrderingFilter
+from .instrumentation import REGISTRY
+from .pagination import BookKeysetPagination
+from .renditions import select_rendition
+from .routers import without_pinning
 from .serializers import (
     CategorySerializer, AuthorSerializer, HymnListSerializer,
     HymnDetailSerializer, SheetMusicSerializer, AudioFileSerializer,
@@ -25,6 +34,8 @@ from .serializers import (
     DenominationSerializer, DenominationHymnSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -68,6 +79,8 @@ class DenominationViewSet(viewsets.ReadOnlyModelViewSet):
 class DenominationHymnViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing denomination-specific hymns.
+    With ``verses=hashed`` the list sends each distinct verse text once, in
+    ``verse_texts``, and verses carry only its ``text_hash``.
     """
     queryset = DenominationHymn.objects.select_related('hymn', 'denomination').prefetch_related('verses').all()
     serializer_class = DenominationHymnSerializer
@@ -78,17 +91,44 @@ class DenominationHymnViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['number', 'created_at']
     ordering = ['denomination', 'hymn_period', 'number']
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['hashed_verses'] = self.hashed_verses
+        return context
+
+    @property
+    def hashed_verses(self):
+        """``verses=hashed``: verses reference their text by hash, each distinct text is sent once"""
+        return self.action == 'list' and self.request.query_params.get('verses') == 'hashed'
+
+    def list(self, request, *args, **kwargs):
+        if not self.hashed_verses:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        entries = page if page is not None else list(queryset)
+        data = self.get_serializer(entries, many=True).data
+        verse_texts = {verse.text_hash: verse.text for entry in entries for verse in entry.verses.all()}
+        if page is not None:
+            response = self.get_paginated_response(data)
+            response.data['verse_texts'] = verse_texts
+            return response
+        return Response({'results': data, 'verse_texts': verse_texts})
+
 
 class HymnViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing hymns with premium content protection.
     Supports filtering by denomination and hymn_period.
+    With a denomination, ``ordering=number`` pages through the book by number
+    using a cursor instead of page numbers.
     """
     queryset = Hymn.objects.select_related('category', 'author').prefetch_related(
         'denomination_hymns__denomination', 'denomination_hymns__verses', 'audio_files'
     ).all()
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SearchFilter, HymnOrderingFilter]
     filterset_fields = ['category', 'author', 'language', 'is_premium', 'is_featured']
     search_fields = ['title', 'author__name', 'category__name', 'denomination_hymns__denomination__name']
     ordering_fields = ['title', 'created_at', 'view_count']
@@ -100,27 +140,70 @@ class HymnViewSet(viewsets.ReadOnlyModelViewSet):
         denomination_id = self.request.query_params.get('denomination')
         hymn_period = self.request.query_params.get('hymn_period')
         
-        # Debug logging
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"HymnViewSet: denomination_id={denomination_id}, hymn_period={hymn_period}, action={self.action}")
+        logger.debug(f"HymnViewSet: denomination_id={denomination_id}, hymn_period={hymn_period}, action={self.action}")
         
         # Only apply denomination filter for list views, not for retrieve (detail) views
         # This allows accessing hymns by ID even if they don't match the denomination filter
         if self.action == 'list' and denomination_id:
-            # Filter hymns that belong to this denomination
-            queryset = queryset.filter(denomination_hymns__denomination_id=denomination_id)
+            # Semi-join driven from the DenominationHymn (denomination, hymn_period) index
+            # instead of JOIN + DISTINCT: rows are never multiplied, so there is
+            # nothing to deduplicate before counting and paginating
+            book_entries = DenominationHymn.objects.filter(denomination_id=denomination_id)
             if hymn_period:
-                queryset = queryset.filter(denomination_hymns__hymn_period=hymn_period)
-            # Remove duplicates
-            queryset = queryset.distinct()
-            logger.info(f"Filtered queryset count: {queryset.count()}")
-        else:
-            # If no denomination specified or this is a retrieve action, return all hymns
-            logger.info(f"No denomination filter (action={self.action}), returning all hymns: {queryset.count()}")
+                book_entries = book_entries.filter(hymn_period=hymn_period)
+            # Book number per hymn, looked up through the (hymn, denomination, hymn_period) index
+            hymn_numbers = book_entries.filter(hymn=OuterRef('pk')).order_by().values('hymn').annotate(
+                number=Min('number')
+            ).values('number')
+            queryset = queryset.filter(pk__in=book_entries.values('hymn_id')).annotate(
+                denomination_number=Subquery(hymn_numbers)
+            )
         
         return queryset
 
+    # Query params that only select the book itself; anything else narrows the hymns
+    book_query_params = {'denomination', 'hymn_period', 'ordering', 'cursor', 'format'}
+
+    def list(self, request, *args, **kwargs):
+        ordering = request.query_params.get('ordering', '')
+        if request.query_params.get('denomination') and ordering.lstrip('-') == 'number':
+            return self.list_in_book_order(request, descending=ordering.startswith('-'))
+        return super().list(request, *args, **kwargs)
+
+    def list_in_book_order(self, request, descending=False):
+        """
+        List one denomination's hymns by number (``ordering=number``).
+
+        Pages through DenominationHymn with a keyset cursor over the
+        (denomination, hymn_period, number) index, then loads just that page of
+        hymns by primary key. Responses have ``next`` and ``results`` but no count.
+        """
+        entries = DenominationHymn.objects.filter(denomination_id=request.query_params['denomination'])
+        hymn_period = request.query_params.get('hymn_period')
+        if hymn_period:
+            entries = entries.filter(hymn_period=hymn_period)
+        if set(request.query_params) - self.book_query_params:
+            # Other filters or a search: check each book entry's hymn by primary key
+            hymns = self.filter_queryset(super().get_queryset())
+            entries = entries.filter(Exists(hymns.order_by().filter(pk=OuterRef('hymn_id'))))
+
+        paginator = BookKeysetPagination()
+        page = paginator.paginate_queryset(
+            entries.only('id', 'number', 'hymn_id'), request, view=self, descending=descending
+        )
+        hymns = super().get_queryset().in_bulk([entry.hymn_id for entry in page])
+
+        results = []
+        for entry in page:
+            if entry.hymn_id not in hymns:
+                continue
+            # A hymn can appear under both periods, so each entry gets its own copy
+            hymn = copy.copy(hymns[entry.hymn_id])
+            hymn.denomination_number = entry.number
+            results.append(hymn)
+        serializer = self.get_serializer(results, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return HymnDetailSerializer
@@ -136,7 +219,9 @@ class HymnViewSet(viewsets.ReadOnlyModelViewSet):
         """Increment view count when hymn is viewed"""
         instance = self.get_object()
         instance.view_count += 1
-        instance.save(update_fields=['view_count'])
+        # View counters are never read back, so don't pin the client to the primary
+        with without_pinning():
+            instance.save(update_fields=['view_count'])
         
         # Check premium access for premium content
         user = request.user if request.user.is_authenticated else None
@@ -148,7 +233,8 @@ class HymnViewSet(viewsets.ReadOnlyModelViewSet):
         # Hide premium content if user doesn't have premium
         if not has_premium:
             # Remove sheet music and audio URLs for premium hymns
-            if instance.is_premium or (instance.sheet_music and instance.sheet_music.is_premium):
+            sheet_music = getattr(instance, 'sheet_music', None)  # None when the hymn has no sheet music
+            if instance.is_premium or (sheet_music and sheet_music.is_premium):
                 data['sheet_music_url'] = None
                 data['sheet_music_thumbnail'] = None
             
@@ -239,15 +325,19 @@ class HymnViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         try:
-            audio_file = hymn.audio_files.get(audio_type=audio_type)
+            audio_file = hymn.audio_files.prefetch_related('renditions').get(audio_type=audio_type)
             # Check premium access
             if audio_file.is_premium and not has_premium:
                 return Response(
                     {'detail': 'Premium subscription required to access audio'},
                     status=status.HTTP_403_FORBIDDEN
                 )
-            serializer = AudioFileSerializer(audio_file, context={'request': request})
-            return Response(serializer.data)
+            # A lower-bitrate rendition for ?quality= or Save-Data clients
+            rendition = select_rendition(request, audio_file)
+            serializer = AudioFileSerializer(audio_file, context={'request': request, 'rendition': rendition})
+            response = Response(serializer.data)
+            patch_vary_headers(response, ['Save-Data'])
+            return response
         except AudioFile.DoesNotExist:
             return Response(
                 {'detail': f'{audio_type.capitalize()} audio not available for this hymn'},
@@ -259,7 +349,7 @@ class SheetMusicViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing sheet music library (premium protected).
     """
-    queryset = SheetMusic.objects.select_related('hymn').all()
+    queryset = SheetMusic.objects.select_related('hymn').prefetch_related('pages').all()
     serializer_class = SheetMusicSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -285,7 +375,7 @@ class AudioFileViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing audio files (premium protected).
     """
-    queryset = AudioFile.objects.select_related('hymn').all()
+    queryset = AudioFile.objects.select_related('hymn').prefetch_related('renditions').all()
     serializer_class = AudioFileSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -339,16 +429,6 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         }, status=status.HTTP_200_OK)
 
 
-@swagger_auto_schema(
-    method='post',
-    request_body=UserRegistrationSerializer,
-    responses={
-        201: openapi.Response('User created successfully', UserSerializer),
-        400: 'Bad request - validation errors'
-    },
-    operation_description='Register a new user account',
-    tags=['Authentication']
-)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -363,16 +443,6 @@ def register_user(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@swagger_auto_schema(
-    method='get',
-    responses={
-        200: openapi.Response('User profile', UserSerializer),
-        401: 'Unauthorized - authentication required'
-    },
-    operation_description='Get the current authenticated user profile',
-    tags=['Authentication'],
-    security=[{'Bearer': []}]
-)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_profile(request):
@@ -396,27 +466,6 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         """Create subscription for current user"""
         serializer.save(user=self.request.user)
     
-    @swagger_auto_schema(
-        method='post',
-        request_body=openapi.Schema(
-            type=openapi.TYPE_OBJECT,
-            required=['transaction_id', 'product_id', 'receipt_data', 'platform'],
-            properties={
-                'transaction_id': openapi.Schema(type=openapi.TYPE_STRING, description='Transaction ID from app store'),
-                'product_id': openapi.Schema(type=openapi.TYPE_STRING, description='Product ID (e.g., com.novahymnal.premium.monthly)'),
-                'receipt_data': openapi.Schema(type=openapi.TYPE_STRING, description='Receipt data from app store'),
-                'platform': openapi.Schema(type=openapi.TYPE_STRING, enum=['ios', 'android'], description='Platform (ios or android)'),
-            }
-        ),
-        responses={
-            200: openapi.Response('Subscription verified', SubscriptionSerializer),
-            201: openapi.Response('Subscription created', SubscriptionSerializer),
-            400: 'Bad request - missing required fields'
-        },
-        operation_description='Verify and create/update subscription from app store purchase receipt',
-        tags=['Subscriptions'],
-        security=[{'Bearer': []}]
-    )
     @action(detail=False, methods=['post'])
     def verify(self, request):
         """Verify subscription from app store receipt"""
@@ -452,21 +501,6 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(subscription)
         return Response(serializer.data, status=status.HTTP_200_OK if not created else status.HTTP_201_CREATED)
     
-    @swagger_auto_schema(
-        method='get',
-        responses={
-            200: openapi.Response('Subscription status', openapi.Schema(
-                type=openapi.TYPE_OBJECT,
-                properties={
-                    'has_premium': openapi.Schema(type=openapi.TYPE_BOOLEAN),
-                    'subscription': SubscriptionSerializer
-                }
-            ))
-        },
-        operation_description='Get the current user\'s subscription status',
-        tags=['Subscriptions'],
-        security=[{'Bearer': []}]
-    )
     @action(detail=False, methods=['get'])
     def status(self, request):
         """Get current subscription status"""
@@ -620,3 +654,12 @@ class HymnNoteViewSet(viewsets.ModelViewSet):
         """Create note for current user"""
         serializer.save(user=self.request.user)
 
+
+def metrics(request):
+    """Request metrics from PerformanceMiddleware in the Prometheus text format (PERFORMANCE_METRICS)"""
+    if not settings.PERFORMANCE_METRICS:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -16,7 +16,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 import hmac
 import hashlib
@@ -121,8 +121,8 @@ def revenuecat_webhook(request):
         # Handle different event types
         if event_type in ['INITIAL_PURCHASE', 'RENEWAL', 'UNCANCELLATION']:
             # Create or update active subscription
-            purchased_at = timezone.datetime.fromtimestamp(purchased_at_ms / 1000, tz=timezone.utc) if purchased_at_ms else timezone.now()
-            expires_at = timezone.datetime.fromtimestamp(expires_at_ms / 1000, tz=timezone.utc) if expires_at_ms else None
+            purchased_at = datetime.fromtimestamp(purchased_at_ms / 1000, tz=dt_timezone.utc) if purchased_at_ms else timezone.now()
+            expires_at = datetime.fromtimestamp(expires_at_ms / 1000, tz=dt_timezone.utc) if expires_at_ms else None
             
             # Determine subscription type from product_id
             subscription_type = 'monthly'